@@ -0,0 +1,270 @@
+import numpy as np
+from gpu_memory import get_gpu_memory
+
+# Vertices an arena has room for when it is created, and how much it grows by when full
+INITIAL_CAPACITY = 1 << 16
+GROWTH = 2
+
+
+# MeshRange class
+class MeshRange:
+
+    """
+    one mesh of a MeshArena, as drawn by one
+    program (and, for instanced meshes, with
+    one instance buffer). It stands in for a
+    vertex array: render draws the mesh's
+    indices out of the arena's shared vertex
+    array for the program, and vertices and
+    program work as they do on a VertexArray.
+    """
+
+    def __init__(self, arena, name, program, instance_buffer=None):
+        self.arena = arena
+        self.name = name
+        self.program = program
+        self.instance_buffer = instance_buffer
+
+    # Unique key of the range (like a vertex array's OpenGL name)
+    @property
+    def glo(self):
+        return id(self)
+
+    # Number of vertices drawn (indices) of the mesh
+    @property
+    def vertices(self):
+        return self.arena.get_index_range(self.name)[1]
+
+    # Method to draw the mesh (first and vertices select part of its indices, like VertexArray.render)
+    def render(self, mode=None, vertices=-1, first=0, instances=-1):
+        vertex_array = self.arena.get_vertex_array(self.program, self.instance_buffer)
+        offset, count = self.arena.get_index_range(self.name)
+        count = count - first if vertices < 0 else vertices
+        vertex_array.render(mode, vertices=count, first=offset + first, instances=instances)
+
+    # Method to drop the shared vertex array the range was drawn with (it is recreated on the next draw)
+    def release(self):
+        self.arena.release_vertex_array(self.program, self.instance_buffer)
+
+
+# MeshArena class
+class MeshArena:
+
+    """
+    a single vertex buffer that the meshes of one
+    vertex format are sub-allocated from. Here's
+    a summary of its key features:
+
+        * Sub-Allocation: allocate copies a mesh's vertices
+          into the first free block of the buffer large
+          enough to hold them and records its (first vertex,
+          vertex count) range. Free blocks are kept in a
+          sorted free list, and release merges a freed range
+          with its free neighbours.
+
+        * Growing and Defragmenting: When no free block is
+          large enough, but the free space would be, defragment
+          packs the meshes to the front of a new buffer (copied
+          on the GPU with copy_buffer), leaving one free block at
+          the end. Otherwise the buffer is replaced by one GROWTH
+          times larger. Ranges are looked up by name at draw time,
+          so nothing holding a mesh notices the move.
+
+        * Shared Index Buffer: Every mesh is drawn through
+          indices (a mesh allocated without any gets 0, 1, 2, ...).
+          The arena keeps each mesh's indices relative to its
+          first vertex, and packs them into one index buffer,
+          offset to where the meshes are, whenever meshes are
+          allocated, released or moved. The buffer only grows
+          when the indices no longer fit.
+
+        * Shared Vertex Arrays: Every program gets a single
+          vertex array over the whole buffer and the index
+          buffer (one per instance buffer for instanced draws),
+          created on first use and shared by all the meshes,
+          which are drawn with MeshRange by their first index
+          and index count. Switching between meshes no longer
+          switches buffers.
+
+        * Accounting: The buffers are recorded in the GPU memory
+          registry as they are replaced.
+    """
+
+    def __init__(self, ctx, format, attribs, stride, capacity=INITIAL_CAPACITY, index_capacity=None):
+
+        # Context, vertex layout and bytes per vertex
+        self.ctx = ctx
+        self.format = format
+        self.attribs = attribs
+        self.stride = stride
+
+        # Buffer, its capacity in vertices, the meshes' (first, count) ranges by name, and the free blocks
+        self.capacity = capacity
+        self.buffer = ctx.buffer(reserve=capacity * stride)
+        self.ranges = {}
+        self.free = [(0, capacity)]
+
+        # Indices of every mesh (relative to its first vertex), the index buffer they are packed into (room
+        # for as many indices as the arena has vertices, unless told otherwise), each mesh's (first, count)
+        # range of it, and whether it is behind the meshes
+        self.indices = {}
+        self.index_buffer = ctx.buffer(reserve=max(capacity if index_capacity is None else index_capacity, 1) * 4)
+        self.index_ranges = {}
+        self.indices_dirty = False
+
+        # Shared vertex arrays by (program, instance buffer) OpenGL names
+        self.vertex_arrays = {}
+        get_gpu_memory(ctx).add_buffer(f'mesh arena {format}', self.buffer)
+        get_gpu_memory(ctx).add_buffer(f'mesh arena {format} indices', self.index_buffer)
+
+    # Vertices in use
+    @property
+    def used(self):
+        return sum(count for first, count in self.ranges.values())
+
+    # Method to copy a mesh's vertex data (bytes or an array) into the arena under a name, with the indices
+    # of its triangles (every vertex in order, if none are given)
+    # Returns the first vertex of its range
+    def allocate(self, name, data, indices=None):
+        data = bytes(data)
+        count = len(data) // self.stride
+        if name in self.ranges:
+            self.release(name)
+        self.indices[name] = np.arange(count, dtype='u4') if indices is None else np.asarray(indices, dtype='u4')
+        self.indices_dirty = True
+        if not count:
+            self.ranges[name] = (0, 0)
+            return 0
+
+        block = self.find_block(count)
+        if block is None:
+            if self.capacity - self.used >= count:
+                self.defragment()
+            else:
+                self.resize(max(self.capacity * GROWTH, self.used + count))
+            block = self.find_block(count)
+
+        # Take the start of the block, and keep the rest free
+        first, size = self.free.pop(block)
+        if size > count:
+            self.free.insert(block, (first + count, size - count))
+        self.ranges[name] = (first, count)
+        self.buffer.write(data, offset=first * self.stride)
+        return first
+
+    # Method to find the first free block holding count vertices (its index in the free list, or None)
+    def find_block(self, count):
+        for index, (first, size) in enumerate(self.free):
+            if size >= count:
+                return index
+        return None
+
+    # Method to free a mesh's range (merging it with the free blocks next to it)
+    def release(self, name):
+        first, count = self.ranges.pop(name)
+        del self.indices[name]
+        self.indices_dirty = True
+        blocks = sorted(self.free + [(first, count)])
+        self.free = []
+        for start, size in blocks:
+            if self.free and self.free[-1][0] + self.free[-1][1] == start:
+                self.free[-1] = (self.free[-1][0], self.free[-1][1] + size)
+            elif size:
+                self.free.append((start, size))
+
+    # Method to read back a mesh's vertex data
+    def read(self, name):
+        first, count = self.ranges[name]
+        return self.buffer.read(size=count * self.stride, offset=first * self.stride)
+
+    # Method to pack the meshes to the front of the buffer (leaving a single free block at the end)
+    def defragment(self):
+        self.resize(self.capacity)
+
+    # Method to move the meshes, packed in their current order, into a new buffer of a capacity
+    def resize(self, capacity):
+        buffer = self.ctx.buffer(reserve=capacity * self.stride)
+        offset = 0
+        for name, (first, count) in sorted(self.ranges.items(), key=lambda item: item[1][0]):
+            if count:
+                self.ctx.copy_buffer(buffer, self.buffer, count * self.stride,
+                                     read_offset=first * self.stride, write_offset=offset * self.stride)
+            self.ranges[name] = (offset, count)
+            offset += count
+
+        # Swap the buffers (the vertex arrays over the old one are recreated on their next draw, and the
+        # indices are offset to the meshes' new ranges)
+        self.indices_dirty = True
+        memory = get_gpu_memory(self.ctx)
+        memory.remove(self.buffer)
+        self.release_vertex_arrays()
+        self.buffer.release()
+        self.buffer, self.capacity = buffer, capacity
+        self.free = [(offset, capacity - offset)] if capacity > offset else []
+        memory.add_buffer(f'mesh arena {self.format}', buffer)
+
+    # Method to get the (first, count) range of a mesh's indices in the index buffer
+    def get_index_range(self, name):
+        if self.indices_dirty:
+            self.pack_indices()
+        return self.index_ranges[name]
+
+    # Method to write every mesh's indices, offset by its first vertex, into the index buffer (replaced by
+    # a larger one if they no longer fit)
+    def pack_indices(self):
+        packed = [self.indices[name] + first for name, (first, count) in self.ranges.items()]
+        counts = [len(indices) for indices in packed]
+        starts = np.concatenate(([0], np.cumsum(counts, dtype=int)))
+        self.index_ranges = {name: (int(start), count) for name, start, count in zip(self.ranges, starts, counts)}
+        data = np.concatenate(packed).astype('u4') if packed else np.zeros(0, dtype='u4')
+
+        if data.nbytes > self.index_buffer.size:
+            size = max(self.index_buffer.size * GROWTH, data.nbytes)
+            memory = get_gpu_memory(self.ctx)
+            memory.remove(self.index_buffer)
+            self.release_vertex_arrays()
+            self.index_buffer.release()
+            self.index_buffer = self.ctx.buffer(reserve=size)
+            memory.add_buffer(f'mesh arena {self.format} indices', self.index_buffer)
+        if data.nbytes:
+            self.index_buffer.write(data)
+        self.indices_dirty = False
+
+    # Method to get a mesh of the arena, drawn with a program (and an instance buffer of model matrices)
+    def get_range(self, name, program, instance_buffer=None):
+        return MeshRange(self, name, program, instance_buffer)
+
+    # Method to get the vertex array over the whole buffer (and the index buffer) for a program (and
+    # instance buffer)
+    def get_vertex_array(self, program, instance_buffer=None):
+        if self.indices_dirty:
+            self.pack_indices()
+        key = (program.glo, None if instance_buffer is None else instance_buffer.glo)
+        vertex_array = self.vertex_arrays.get(key)
+        if vertex_array is None:
+            buffers = [(self.buffer, self.format, *self.attribs)]
+            if instance_buffer is not None:
+                buffers.append((instance_buffer, '16f/i', 'in_instance_model'))
+            vertex_array = self.ctx.vertex_array(program, buffers, self.index_buffer, 4, skip_errors=True)
+            self.vertex_arrays[key] = vertex_array
+        return vertex_array
+
+    # Method to release the vertex array of a program (and instance buffer), if it was created
+    def release_vertex_array(self, program, instance_buffer=None):
+        key = (program.glo, None if instance_buffer is None else instance_buffer.glo)
+        vertex_array = self.vertex_arrays.pop(key, None)
+        if vertex_array is not None:
+            vertex_array.release()
+
+    # Method to release every vertex array over the buffer
+    def release_vertex_arrays(self):
+        for vertex_array in self.vertex_arrays.values():
+            vertex_array.release()
+        self.vertex_arrays.clear()
+
+    # Method to release the buffers and their vertex arrays
+    def destroy(self):
+        self.release_vertex_arrays()
+        for buffer in (self.buffer, self.index_buffer):
+            get_gpu_memory(self.ctx).remove(buffer)
+            buffer.release()
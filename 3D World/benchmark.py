@@ -0,0 +1,466 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pygame as pg
+import moderngl as mgl
+from main import GraphicsEngine
+from gpu_memory import get_gpu_memory
+from capture import FORMATS
+from scene import X_MIN, X_MAX, ENV1_Z_MIN, ENV1_Z_MAX, ENV2_Z_MIN, ENV2_Z_MAX, ENV3_Z_MIN, ENV3_Z_MAX
+
+# Environments that can be benchmarked, mapped to their bounds about the Z-Axis
+ENVIRONMENTS = {
+    'forest': (ENV1_Z_MIN, ENV1_Z_MAX),
+    'rocky': (ENV2_Z_MIN, ENV2_Z_MAX),
+    'desert': (ENV3_Z_MIN, ENV3_Z_MAX),
+}
+
+# Benchmark settings
+DEFAULT_SEED = 1234  # Seed used for scene generation
+SAMPLE_RATE = 30  # Frames rendered per second of camera path time
+WARMUP_FRAMES = 10  # Frames rendered (and discarded) before measuring
+REGRESSION_THRESHOLD = 0.10  # Allowed slowdown against the baseline (10%)
+PERCENTILES = (50, 95, 99)
+STRESS_FACTORS = (1, 10, 100, 1000)  # Object count multipliers stepped through in stress mode
+MB = 1024 * 1024
+
+
+# CameraPath class
+class CameraPath:
+
+    """
+    stores a camera flythrough as a list
+    of timed keyframes and samples poses
+    from it. Here's a summary of its key
+    features:
+
+        * Keyframes: Each keyframe holds a time
+          (in seconds), a position, a yaw, and a
+          pitch, matching the values used by Camera.
+
+        * Sampling: The sample method linearly
+          interpolates the pose at any time along
+          the path, clamping to the first and last
+          keyframes.
+
+        * Persistence: Paths can be saved to and
+          loaded from JSON, so recorded flythroughs
+          can be replayed later.
+
+        * Scripted Paths: The scripted class method
+          builds a deterministic flythrough through
+          one of the environments of the scene.
+    """
+
+    def __init__(self, keyframes=None):
+        # List of (time, position, yaw, pitch) tuples sorted by time
+        self.keyframes = keyframes or []
+
+    # Method to append a keyframe to the end of the path
+    def add(self, t, position, yaw, pitch):
+        self.keyframes.append((t, tuple(position), yaw, pitch))
+
+    # Length of the path in seconds
+    @property
+    def duration(self):
+        return self.keyframes[-1][0] - self.keyframes[0][0] if self.keyframes else 0.0
+
+    # Method to interpolate the camera pose at time t (seconds from the start of the path)
+    def sample(self, t):
+        t += self.keyframes[0][0]
+        if t <= self.keyframes[0][0]:
+            return self.keyframes[0][1:]
+        for (t0, p0, yaw0, pitch0), (t1, p1, yaw1, pitch1) in zip(self.keyframes, self.keyframes[1:]):
+            if t <= t1:
+                a = (t - t0) / (t1 - t0) if t1 > t0 else 1.0
+                position = tuple(v0 + (v1 - v0) * a for v0, v1 in zip(p0, p1))
+                return position, yaw0 + (yaw1 - yaw0) * a, pitch0 + (pitch1 - pitch0) * a
+        return self.keyframes[-1][1:]
+
+    # Method to save the path as JSON
+    def save(self, path):
+        keyframes = [{'t': t, 'position': list(p), 'yaw': yaw, 'pitch': pitch}
+                     for t, p, yaw, pitch in self.keyframes]
+        with open(path, 'w') as file:
+            json.dump({'keyframes': keyframes}, file, indent=2)
+
+    # Method to load a path from JSON
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            data = json.load(file)
+        return cls([(k['t'], tuple(k['position']), k['yaw'], k['pitch']) for k in data['keyframes']])
+
+    # Method to build the scripted flythrough for an environment
+    @classmethod
+    def scripted(cls, env):
+        z_min, z_max = ENVIRONMENTS[env]
+        z_mid, z_span = (z_min + z_max) / 2, (z_max - z_min) / 2
+
+        # Enter from the +X side, weave through the environment, then climb and look back over it
+        path = cls()
+        path.add(0.0, (X_MAX + 10, 3.0, z_mid), -180, -10)
+        path.add(3.0, (X_MAX - 20, 2.0, z_mid - z_span * 0.4), -200, -5)
+        path.add(6.0, (X_MIN + 35, 2.0, z_mid + z_span * 0.4), -160, -5)
+        path.add(8.0, (X_MIN + 5, 4.0, z_mid), -90, -10)
+        path.add(10.0, (X_MIN + 5, 15.0, z_mid), 0, -25)
+        return path
+
+
+# Benchmark class
+class Benchmark:
+
+    """
+    replays camera paths through a seeded
+    scene and measures renderer performance.
+    Here's a summary of its key features:
+
+        * Initialization: Creates a GraphicsEngine
+          with a fixed seed so every run renders the
+          exact same world.
+
+        * Replaying Paths: The run_path method places
+          the camera at each sampled pose of a path
+          (instead of reading keyboard and mouse input),
+          renders the frame, and waits for the GPU to
+          finish so the measured time is the real frame
+          time.
+
+        * Statistics: Frame-time percentiles (p50/p95/p99)
+          are reported along with the average number of
+          draw calls and triangles per frame taken from
+          the SceneRenderer statistics.
+
+        * Baselines: Results can be stored as a baseline JSON
+          and later runs compared against it, flagging any
+          percentile that got slower than the regression
+          threshold allows.
+
+        * Stress Mode: run_stress rebuilds the engine with
+          the generated object counts multiplied by each of
+          STRESS_FACTORS, recording startup time, Python heap
+          and GPU buffer memory, frame-time percentiles, and
+          the profiler's scopes at every step, and fits how
+          each of them grows with the object count, so the
+          subsystem that breaks down first stands out.
+
+        * Capture: With a capture directory, the replayed
+          frames are recorded (see FrameCapture) at the
+          sample rate, e.g. to make videos of the flythroughs.
+    """
+
+    def __init__(self, win_size=(1600, 900), seed=DEFAULT_SEED, sample_rate=SAMPLE_RATE, profile=False,
+                 scene_file=None, density=1.0, instanced=None, capture=None, capture_format='png'):
+        self.seed = seed
+        self.sample_rate = sample_rate
+        self.app = GraphicsEngine(win_size, seed=seed, profile=profile, scene_file=scene_file, frame_mode='uncapped',
+                                  density=density, instanced=instanced, capture=capture, capture_format=capture_format)
+        if self.app.capture:
+            self.app.capture.fps = sample_rate
+
+    # Method to render a single frame from the given pose and return its duration in seconds
+    def render_frame(self, t, pose):
+        app = self.app
+        start = time.perf_counter()
+        app.profiler.begin_frame()
+        pg.event.pump()
+        app.time = t
+        app.camera.set_pose(*pose)
+        app.render()
+        app.ctx.finish()
+        app.profiler.end_frame()
+        return time.perf_counter() - start
+
+    # Method to replay a camera path and return its per-frame times, draw calls, and triangles
+    def measure_path(self, path):
+        renderer = self.app.scene_renderer
+        frames = max(1, int(path.duration * self.sample_rate))
+
+        # Warm up caches and drivers before measuring
+        for i in range(WARMUP_FRAMES):
+            self.render_frame(0.0, path.sample(0.0))
+
+        frame_times, draw_calls, triangles = [], [], []
+        for i in range(frames):
+            t = i / self.sample_rate
+            frame_times.append(self.render_frame(t, path.sample(t)))
+            draw_calls.append(renderer.stats['draw_calls'])
+            triangles.append(renderer.stats['triangles'])
+        return frame_times, draw_calls, triangles
+
+    # Method to replay a camera path and collect per-frame measurements
+    def run_path(self, path):
+        return self.summarize(*self.measure_path(path))
+
+    # Method to reduce per-frame measurements to the reported statistics
+    @staticmethod
+    def summarize(frame_times, draw_calls, triangles):
+        frame_ms = np.array(frame_times) * 1000.0
+        result = {'frames': len(frame_ms), 'frame_ms': {'mean': float(frame_ms.mean())}}
+        for p in PERCENTILES:
+            result['frame_ms'][f'p{p}'] = float(np.percentile(frame_ms, p))
+        result['draw_calls'] = float(np.mean(draw_calls))
+        result['triangles'] = float(np.mean(triangles))
+        return result
+
+    # Method to benchmark every camera path (a dictionary of name -> CameraPath)
+    def run(self, paths):
+        results = {'seed': self.seed, 'win_size': list(self.app.WIN_SIZE), 'environments': {}}
+        for name, path in paths.items():
+            results['environments'][name] = self.run_path(path)
+        return results
+
+    # Method to release the engine's resources
+    def destroy(self):
+        if self.app.capture:
+            self.app.capture.finish()
+        self.app.profiler.destroy()
+        self.app.scene.destroy()
+        self.app.mesh.destroy()
+        self.app.scene_renderer.destroy()
+        pg.quit()
+
+
+# Compare results against a baseline and return a list of (env, metric, baseline, current, change) regressions
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    for env, current in results['environments'].items():
+        reference = baseline.get('environments', {}).get(env)
+        if reference is None:
+            continue
+        for p in PERCENTILES:
+            key = f'p{p}'
+            base_ms, cur_ms = reference['frame_ms'][key], current['frame_ms'][key]
+            change = cur_ms / base_ms - 1.0 if base_ms > 0 else 0.0
+            if change > threshold:
+                regressions.append((env, key, base_ms, cur_ms, change))
+    return regressions
+
+
+# Print the results table (and the change against the baseline if there is one)
+def print_report(results, baseline=None):
+    print(f"seed={results['seed']} win_size={results['win_size'][0]}x{results['win_size'][1]}")
+    print(f"{'env':<8} {'frames':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'draws':>8} {'tris':>10}")
+    for env, r in results['environments'].items():
+        ms = r['frame_ms']
+        print(f"{env:<8} {r['frames']:>6} {ms['p50']:>9.2f} {ms['p95']:>9.2f} {ms['p99']:>9.2f} "
+              f"{r['draw_calls']:>8.0f} {r['triangles']:>10.0f}")
+        reference = (baseline or {}).get('environments', {}).get(env)
+        if reference:
+            changes = ' '.join(f"{k}:{ms[k] / reference['frame_ms'][k] - 1.0:+.1%}" for k in ('p50', 'p95', 'p99'))
+            print(f"{'':<8} vs baseline {changes}")
+
+
+# Benchmark the scene at every object count multiplier (factor) and return the scaling curve
+# Startup and memory are measured while building the engine (with tracemalloc tracing the Python heap,
+# NumPy arrays included), frames with the profiler on so the cost of every scope is recorded.
+# Stepping stops at the first factor that runs out of memory or OpenGL resources.
+def run_stress(paths, factors=STRESS_FACTORS, win_size=(1600, 900), seed=DEFAULT_SEED, sample_rate=SAMPLE_RATE,
+               instanced=None):
+    steps = []
+    for factor in factors:
+        gc.collect()
+        step = {'factor': factor}
+        steps.append(step)
+        try:
+            tracemalloc.start()
+            start = time.perf_counter()
+            bench = Benchmark(win_size, seed=seed, sample_rate=sample_rate, profile=True, density=factor,
+                              instanced=instanced)
+            step['startup_s'] = time.perf_counter() - start
+            heap, heap_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        except (MemoryError, mgl.Error) as error:
+            tracemalloc.stop()
+            step['error'] = f'{type(error).__name__}: {error}'
+            break
+
+        app = bench.app
+        step['objects'] = len(app.scene.layout)
+        step['python_heap_mb'] = heap / MB
+        step['python_heap_peak_mb'] = heap_peak / MB
+        memory = get_gpu_memory(app.ctx)
+        step['gpu_buffer_mb'] = memory.totals['buffer'] / MB
+        step['gpu_memory_mb'] = memory.total / MB
+        print(f"{factor:g}x: {step['objects']} objects, started in {step['startup_s']:.2f} s", flush=True)
+
+        # Frames of every path, summarized together
+        try:
+            frame_times, draw_calls, triangles = [], [], []
+            for path in paths.values():
+                for values, measured in zip((frame_times, draw_calls, triangles), bench.measure_path(path)):
+                    values.extend(measured)
+        except (MemoryError, mgl.Error) as error:
+            step['error'] = f'{type(error).__name__}: {error}'
+            bench.destroy()
+            break
+        step.update(Benchmark.summarize(frame_times, draw_calls, triangles))
+        step['scopes_ms'] = {name: mean for name, (mean, peak) in app.profiler.summary().items()}
+        bench.destroy()
+        del bench, app
+
+    return {'seed': seed, 'win_size': list(win_size), 'instanced': bool(instanced), 'steps': steps,
+            'scaling': get_scaling(steps)}
+
+
+# Fit how every measurement grows with the object count, as the exponent k of measurement ~ objects ** k
+# (least squares in log-log space over the completed steps), steepest first
+def get_scaling(steps):
+    steps = [step for step in steps if 'frames' in step]
+    if len(steps) < 2:
+        return []
+    metrics = {
+        'startup_s': [step['startup_s'] for step in steps],
+        'python_heap_mb': [step['python_heap_mb'] for step in steps],
+        'gpu_buffer_mb': [step['gpu_buffer_mb'] for step in steps],
+        'frame_p50_ms': [step['frame_ms']['p50'] for step in steps],
+        'frame_p99_ms': [step['frame_ms']['p99'] for step in steps],
+    }
+    for name in steps[-1]['scopes_ms']:
+        metrics[f'scope:{name}'] = [step['scopes_ms'].get(name, 0.0) for step in steps]
+
+    objects = np.log(np.array([step['objects'] for step in steps], dtype='f8'))
+    scaling = []
+    for name, values in metrics.items():
+        values = np.array(values, dtype='f8')
+        if (values <= 0).any():
+            continue
+        exponent = np.polyfit(objects, np.log(values), 1)[0]
+        scaling.append((name, float(exponent), float(values[0]), float(values[-1])))
+    return sorted(scaling, key=lambda item: -item[1])
+
+
+# Print the stress steps and the scaling of every measurement
+def print_stress_report(report, frame_budget_ms=1000 / 60):
+    print(f"seed={report['seed']} win_size={report['win_size'][0]}x{report['win_size'][1]} "
+          f"instanced={report['instanced']}")
+    print(f"{'factor':>7} {'objects':>9} {'startup s':>10} {'heap MB':>9} {'GPU MB':>8} {'p50 ms':>9} "
+          f"{'p95 ms':>9} {'p99 ms':>9} {'draws':>7} {'tris':>10}  slowest scope")
+    over_budget = None
+    for step in report['steps']:
+        if 'error' in step:
+            print(f"{step['factor']:>7g} failed: {step['error']}")
+            continue
+        ms = step['frame_ms']
+        scopes = {name: mean for name, mean in step['scopes_ms'].items() if name != 'frame'}
+        slowest = max(scopes, key=scopes.get) if scopes else ''
+        print(f"{step['factor']:>7g} {step['objects']:>9} {step['startup_s']:>10.2f} {step['python_heap_mb']:>9.1f} "
+              f"{step['gpu_buffer_mb']:>8.1f} {ms['p50']:>9.2f} {ms['p95']:>9.2f} {ms['p99']:>9.2f} "
+              f"{step['draw_calls']:>7.0f} {step['triangles']:>10.0f}  {slowest} ({scopes.get(slowest, 0):.2f} ms)")
+        if over_budget is None and ms['p99'] > frame_budget_ms:
+            over_budget = step['factor']
+
+    if over_budget is not None:
+        print(f'p99 frame time first exceeds {frame_budget_ms:.1f} ms at {over_budget:g}x')
+    if report['scaling']:
+        print('scaling with object count (objects ** k, steepest first):')
+        for name, exponent, first, last in report['scaling']:
+            print(f'  {name:<32} k={exponent:>5.2f}  {first:>10.3f} -> {last:>10.3f}')
+
+
+# Record a camera path while flying through the scene interactively
+def record(app, out_path):
+    path = CameraPath()
+    start = None
+    try:
+        app.clock.tick()
+        while True:
+            app.step()
+            start = app.time if start is None else start
+            path.add(app.time - start, *app.camera.get_pose())
+    finally:
+        # Quitting (Escape) exits through check_events, so the path is saved on the way out
+        path.save(out_path)
+        print(f'recorded {len(path.keyframes)} keyframes to {out_path}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Deterministic renderer benchmark with camera flythroughs.')
+    parser.add_argument('--env', nargs='+', choices=list(ENVIRONMENTS), default=list(ENVIRONMENTS),
+                        help='environments to fly through')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='scene generation seed')
+    parser.add_argument('--scene', help='bulk-load this scene file instead of running the generators')
+    parser.add_argument('--size', type=int, nargs=2, default=(1600, 900), metavar=('W', 'H'),
+                        help='window size')
+    parser.add_argument('--path', help='replay a recorded camera path (JSON) instead of the scripted ones')
+    parser.add_argument('--record', metavar='FILE', help='fly interactively and record the camera path to FILE')
+    parser.add_argument('--sample-rate', type=int, default=SAMPLE_RATE,
+                        help='frames rendered per second of path time')
+    parser.add_argument('--baseline', help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results to --baseline')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='allowed slowdown before a percentile counts as a regression')
+    parser.add_argument('--output', help='write the results JSON to this file')
+    parser.add_argument('--profile', metavar='FILE', help='profile every frame and write a Chrome trace to FILE')
+    parser.add_argument('--instanced', action='store_true',
+                        help='draw the generated objects as one instanced model per type')
+    parser.add_argument('--capture', metavar='DIR', help='record the replayed frames into DIR')
+    parser.add_argument('--capture-format', choices=FORMATS, default='png',
+                        help='write the frames as a PNG sequence or as one raw RGB video file')
+    parser.add_argument('--stress', type=float, nargs='*', metavar='FACTOR',
+                        help='step the generated object counts through these multipliers '
+                             f'(default: {" ".join(map(str, STRESS_FACTORS))}) and report how everything scales')
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record(GraphicsEngine(tuple(args.size), seed=args.seed), args.record)
+        return 0
+
+    # A recorded path is reported under its file name, scripted ones under their environment
+    if args.path:
+        paths = {os.path.splitext(os.path.basename(args.path))[0]: CameraPath.load(args.path)}
+    else:
+        paths = {env: CameraPath.scripted(env) for env in args.env}
+
+    if args.stress is not None:
+        report = run_stress(paths, args.stress or STRESS_FACTORS, tuple(args.size), seed=args.seed,
+                            sample_rate=args.sample_rate, instanced=args.instanced or None)
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(report, file, indent=2)
+        print_stress_report(report)
+        return 0
+
+    bench = Benchmark(tuple(args.size), seed=args.seed, sample_rate=args.sample_rate, profile=bool(args.profile),
+                      scene_file=args.scene, instanced=args.instanced or None, capture=args.capture,
+                      capture_format=args.capture_format)
+    results = bench.run(paths)
+    if args.profile:
+        bench.app.profiler.print_summary()
+        bench.app.profiler.export_chrome_trace(args.profile)
+    bench.destroy()
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print_report(results)
+        print(f'baseline written to {args.baseline}')
+        return 0
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print_report(results, baseline)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for env, key, base_ms, cur_ms, change in regressions:
+            print(f'REGRESSION {env} {key}: {base_ms:.2f} ms -> {cur_ms:.2f} ms ({change:+.1%})')
+        if regressions:
+            return 1
+    return 0
+
+
+# Entry point for the benchmark
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,347 @@
+import numpy as np
+
+# Most primitives kept in a leaf (mesh triangles, tested together with NumPy / scene objects)
+TRIANGLE_LEAF_SIZE = 8
+OBJECT_LEAF_SIZE = 16
+
+# Stand-in for 1 / 0 when a ray runs parallel to an axis
+BIG = 1e30
+
+# Bits per axis of the Morton codes the boxes are sorted by, and the largest cell coordinate
+MORTON_BITS = 10
+MORTON_CELLS = (1 << MORTON_BITS) - 1
+
+# Smallest determinant (ray/triangle) and distance counted as a hit
+EPSILON = 1e-7
+
+
+# Get the distance at which a ray enters a node's box, or None if it misses it before t_max
+# The ray is given by its origin and the reciprocal of its direction (one component at a time, for speed)
+def enter_box(node, ox, oy, oz, ix, iy, iz, t_max):
+    x0, x1 = (node[0] - ox) * ix, (node[3] - ox) * ix
+    y0, y1 = (node[1] - oy) * iy, (node[4] - oy) * iy
+    z0, z1 = (node[2] - oz) * iz, (node[5] - oz) * iz
+    t0 = max(min(x0, x1), min(y0, y1), min(z0, z1), 0.0)
+    t1 = min(max(x0, x1), max(y0, y1), max(z0, z1), t_max)
+    return t0 if t0 <= t1 else None
+
+
+# Get the distances at which rays enter boxes (np.inf where they miss them before t_max)
+# The rays' origins and reciprocal directions, and the boxes' corners, are given axis by axis, as
+# arrays (or numbers) indexed [axis, ...] that broadcast against each other
+def enter_boxes(origins, inverse_directions, b_min, b_max, t_max):
+    t_enter, t_exit = 0.0, t_max
+    for axis in range(3):
+        t0 = (b_min[axis] - origins[axis]) * inverse_directions[axis]
+        t1 = (b_max[axis] - origins[axis]) * inverse_directions[axis]
+        t_enter = np.maximum(t_enter, np.minimum(t0, t1))
+        t_exit = np.minimum(t_exit, np.maximum(t0, t1))
+    return np.where(t_enter <= t_exit, t_enter, np.inf)
+
+
+# Get the reciprocals of ray directions (BIG for components that are 0)
+def get_inverse_directions(directions):
+    directions = np.asarray(directions, dtype='f8')
+    inverse = np.full(directions.shape, BIG)
+    np.divide(1.0, directions, out=inverse, where=directions != 0)
+    return inverse
+
+
+# Get the (range, item) pairs of ranges (first, count), one pair per item of each range
+def expand_ranges(first, count):
+    offsets = np.cumsum(count) - count
+    ranges = np.repeat(np.arange(len(count)), count)
+    return ranges, first[ranges] + np.arange(len(ranges)) - offsets[ranges]
+
+
+# Get the 30-bit Morton codes of (N, 3) points, interleaving 10 bits per axis of their
+# position within the points' bounds
+def get_morton_codes(points):
+    lo, hi = points.min(axis=0, initial=np.inf), points.max(axis=0, initial=-np.inf)
+    cells = ((points - lo) / np.maximum(hi - lo, EPSILON) * MORTON_CELLS).astype('i8')
+    cells = np.clip(cells, 0, MORTON_CELLS)
+    codes = np.zeros(len(points), dtype='i8')
+    for bit in range(MORTON_BITS):
+        for axis in range(3):
+            codes |= ((cells[:, axis] >> bit) & 1) << (3 * bit + axis)
+    return codes
+
+
+# BVH class
+class BVH:
+
+    """
+    a bounding volume hierarchy over a set of
+    axis-aligned boxes, for finding the ones a
+    ray passes through without testing them
+    all. Here's a summary of its key features:
+
+        * Building: The boxes are sorted along a Morton
+          (Z-order) curve through their centers, so boxes
+          close to each other are close in the order, and
+          nodes are split in halves of the order until at
+          most leaf_size boxes are left in each. Every node
+          covers a contiguous range of self.order, so the
+          bounds of a whole level of nodes are computed at
+          once with np.minimum.reduceat.
+
+        * Flat Nodes: Nodes are kept as tuples in a list,
+          (min x, y, z, max x, y, z, left child, first,
+          count), with the right child right after the
+          left one, so traversal is plain Python with no
+          NumPy call per node.
+
+        * Traversal: traverse visits the nodes a ray passes
+          through nearest first, and hands every leaf it
+          reaches to a test callback, which returns the
+          distance of the closest hit found so far. Nodes
+          further away than that are skipped.
+
+        * Leaves: The bounds and ranges of the leaves are
+          also kept as arrays, and find_leaves tests a batch
+          of rays against every leaf at once with NumPy, for
+          small trees (like a mesh's) that many rays are cast
+          through together.
+    """
+
+    def __init__(self, b_min, b_max, leaf_size=OBJECT_LEAF_SIZE):
+        b_min = np.asarray(b_min, dtype='f4').reshape(-1, 3)
+        b_max = np.asarray(b_max, dtype='f4').reshape(-1, 3)
+
+        # Order of the boxes along the curve (every node covers a range of it) and the nodes
+        self.order = np.argsort(get_morton_codes((b_min + b_max) * 0.5), kind='stable')
+        self.nodes = []
+        b_min, b_max = b_min[self.order], b_max[self.order]
+
+        # Ranges of the nodes of the current level, starting with the root
+        starts = np.zeros(1, dtype='i8')
+        counts = np.full(1, len(b_min), dtype='i8')
+        while len(starts):
+
+            # Bounds of every node of the level (one reduceat over the ranges put side by side)
+            offsets = np.cumsum(counts) - counts
+            items = np.arange(counts.sum()) - np.repeat(offsets - starts, counts)
+            if len(items):
+                lo = np.minimum.reduceat(b_min[items], offsets).tolist()
+                hi = np.maximum.reduceat(b_max[items], offsets).tolist()
+            else:
+                lo = hi = [[0.0, 0.0, 0.0]]
+
+            # Nodes with more than leaf_size boxes get two children, side by side on the next level
+            split = counts > leaf_size
+            first_child = len(self.nodes) + len(starts)
+            left = np.where(split, first_child + 2 * (np.cumsum(split) - 1), -1).tolist()
+            self.nodes += [(*lo[i], *hi[i], left[i], start, count)
+                           for i, (start, count) in enumerate(zip(starts.tolist(), counts.tolist()))]
+
+            half = counts[split] // 2
+            starts = np.stack([starts[split], starts[split] + half], axis=1).ravel()
+            counts = np.stack([half, counts[split] - half], axis=1).ravel()
+
+        self.set_leaves()
+
+    # Method to keep the bounds (indexed [axis, leaf]) and the (first, count) ranges of the leaves as arrays
+    def set_leaves(self):
+        nodes = np.array(self.nodes, dtype='f8').reshape(-1, 9)
+        leaves = nodes[nodes[:, 6] < 0]
+        self.leaf_min, self.leaf_max = leaves[:, 0:3].T.copy(), leaves[:, 3:6].T.copy()
+        self.leaf_first, self.leaf_count = leaves[:, 7].astype('i8'), leaves[:, 8].astype('i8')
+
+    # Method to find the leaves rays (origins and reciprocal directions indexed [axis, ray]) enter before
+    # t_max (a number, or one per ray); returns the (ray, leaf) pairs
+    def find_leaves(self, origins, inverse_directions, t_max):
+        t_enter = enter_boxes(origins[:, :, None], inverse_directions[:, :, None], self.leaf_min[:, None],
+                              self.leaf_max[:, None], np.reshape(t_max, (-1, 1)))
+        return np.nonzero(t_enter < np.inf)
+
+    # Method to walk the nodes a ray passes through, nearest first, calling test(first, count, t_max)
+    # for every leaf reached before t_max; test returns the distance of the closest hit so far
+    # Returns the final t_max
+    def traverse(self, origin, direction, t_max, test):
+        ox, oy, oz = origin
+        ix, iy, iz = (1.0 / d if d else BIG for d in direction)
+        nodes = self.nodes
+
+        t_enter = enter_box(nodes[0], ox, oy, oz, ix, iy, iz, t_max)
+        stack = [] if t_enter is None else [(t_enter, 0)]
+        while stack:
+            t_enter, index = stack.pop()
+            if t_enter > t_max:
+                continue
+            node = nodes[index]
+            left = node[6]
+            if left < 0:
+                t_max = test(node[7], node[8], t_max)
+                continue
+
+            # Enter both children (enter_box, inlined for speed), and visit the nearer one first
+            hits = []
+            for child in (left, left + 1):
+                x0, y0, z0, x1, y1, z1 = nodes[child][:6]
+                x0, x1 = (x0 - ox) * ix, (x1 - ox) * ix
+                y0, y1 = (y0 - oy) * iy, (y1 - oy) * iy
+                z0, z1 = (z0 - oz) * iz, (z1 - oz) * iz
+                if x0 > x1:
+                    x0, x1 = x1, x0
+                if y0 > y1:
+                    y0, y1 = y1, y0
+                if z0 > z1:
+                    z0, z1 = z1, z0
+                t0 = max(x0, y0, z0, 0.0)
+                if t0 <= min(x1, y1, z1, t_max):
+                    hits.append((t0, child))
+            if len(hits) == 2 and hits[0][0] < hits[1][0]:
+                hits.reverse()
+            stack += hits
+        return t_max
+
+    # Method to get the order and nodes as arrays (for the warm-start cache)
+    def get_arrays(self):
+        return {'order': self.order, 'nodes': np.array(self.nodes, dtype='f8').reshape(-1, 9)}
+
+    # Method to make a BVH from the arrays of get_arrays, without building it again
+    @classmethod
+    def from_arrays(cls, order, nodes):
+        bvh = cls.__new__(cls)
+        bvh.order = order
+        bvh.nodes = [(*node[:6], int(node[6]), int(node[7]), int(node[8])) for node in nodes.tolist()]
+        bvh.set_leaves()
+        return bvh
+
+
+# MeshBVH class
+class MeshBVH:
+
+    """
+    a BVH over the triangles of a mesh, for
+    intersecting rays with it in the mesh's
+    own (model) space. Here's a summary of
+    its key features:
+
+        * Triangles: Built from the (3 * T, 3) vertex
+          positions of a triangle list (as stored in a
+          VBO). Each triangle is kept as its first vertex
+          and two edges, in BVH order, both as Python floats
+          and as arrays indexed [axis, triangle].
+
+        * Intersection: intersect runs a Moller-Trumbore
+          test on the triangles of every leaf the ray
+          reaches, and returns the distance and index of
+          the closest hit. Like the renderer (which culls
+          back faces), only the front faces count, so a
+          ray goes through what is invisible from its side.
+
+        * Batches: intersect_many does the same for a batch
+          of rays (e.g. one ray moved into the model space of
+          every object using the mesh) with NumPy: it finds
+          the leaves each ray enters, and tests all the (ray,
+          triangle) pairs of those leaves at once.
+
+        * Normals: The face normal of every triangle is
+          kept for the hits (normal), on the side its
+          vertices wind counter-clockwise (the front).
+
+        * Prebuilt Trees: A BVH built earlier over the
+          same positions (e.g. read from the warm-start
+          cache with BVH.from_arrays) can be passed in,
+          and only the triangles are set up.
+    """
+
+    def __init__(self, positions, bvh=None):
+        triangles = np.asarray(positions, dtype='f4').reshape(-1, 3, 3)
+        self.bvh = bvh or self.build_bvh(triangles)
+        triangles = triangles[self.bvh.order]
+
+        # First vertex and both edges of every triangle, and its face normal
+        v0, e1, e2 = triangles[:, 0], triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]
+        self.triangles = np.concatenate([v0, e1, e2], axis=1).tolist()
+        self.v0, self.e1, self.e2 = (np.ascontiguousarray(array.T, dtype='f8') for array in (v0, e1, e2))
+        normals = np.cross(e1, e2)
+        self.normals = normals / np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), EPSILON)
+
+    # Method to build the BVH over the triangles of (3 * T, 3) vertex positions
+    @staticmethod
+    def build_bvh(positions):
+        triangles = np.asarray(positions, dtype='f4').reshape(-1, 3, 3)
+        return BVH(triangles.min(axis=1), triangles.max(axis=1), TRIANGLE_LEAF_SIZE)
+
+    # Number of triangles
+    def __len__(self):
+        return len(self.triangles)
+
+    # Method to intersect a ray (origin, direction) with the mesh
+    # Returns (distance, triangle) for the closest hit before t_max (in units of direction), or None
+    def intersect(self, origin, direction, t_max):
+        ox, oy, oz = origin
+        dx, dy, dz = direction
+        triangles = self.triangles
+        closest = [None]
+
+        # Moller-Trumbore test of every triangle of a leaf
+        def test(first, count, t_max):
+            for index in range(first, first + count):
+                x0, y0, z0, ax, ay, az, bx, by, bz = triangles[index]
+                px, py, pz = dy * bz - dz * by, dz * bx - dx * bz, dx * by - dy * bx
+                det = ax * px + ay * py + az * pz
+                if det < EPSILON:
+                    continue
+                inv_det = 1.0 / det
+                sx, sy, sz = ox - x0, oy - y0, oz - z0
+                u = (sx * px + sy * py + sz * pz) * inv_det
+                if u < 0.0 or u > 1.0:
+                    continue
+                qx, qy, qz = sy * az - sz * ay, sz * ax - sx * az, sx * ay - sy * ax
+                v = (dx * qx + dy * qy + dz * qz) * inv_det
+                if v < 0.0 or u + v > 1.0:
+                    continue
+                t = (bx * qx + by * qy + bz * qz) * inv_det
+                if EPSILON < t < t_max:
+                    t_max = t
+                    closest[0] = index
+            return t_max
+
+        t_max = self.bvh.traverse(origin, direction, t_max, test)
+        return None if closest[0] is None else (t_max, closest[0])
+
+    # Method to intersect many rays ((N, 3) origins and directions) with the mesh at once
+    # Returns the distances (in units of direction, np.inf for a miss) and triangles (-1 for a miss)
+    # of the closest hit of every ray before t_max
+    def intersect_many(self, origins, directions, t_max):
+        origins = np.asarray(origins, dtype='f8').reshape(-1, 3).T
+        directions = np.asarray(directions, dtype='f8').reshape(-1, 3).T
+        distances = np.full(origins.shape[1], np.inf)
+        triangles = np.full(origins.shape[1], -1, dtype='i8')
+
+        # (ray, triangle) pairs for every triangle of the leaves each ray enters
+        bvh = self.bvh
+        rays, leaves = bvh.find_leaves(origins, get_inverse_directions(directions), t_max)
+        if not len(rays):
+            return distances, triangles
+        pairs, index = expand_ranges(bvh.leaf_first[leaves], bvh.leaf_count[leaves])
+        rays = rays[pairs]
+
+        # Moller-Trumbore test of every pair (front faces only)
+        (dx, dy, dz), (ax, ay, az), (bx, by, bz) = directions[:, rays], self.e1[:, index], self.e2[:, index]
+        px, py, pz = dy * bz - dz * by, dz * bx - dx * bz, dx * by - dy * bx
+        det = ax * px + ay * py + az * pz
+        front = det >= EPSILON
+        inv_det = 1.0 / np.where(front, det, 1.0)
+        sx, sy, sz = origins[:, rays] - self.v0[:, index]
+        u = (sx * px + sy * py + sz * pz) * inv_det
+        qx, qy, qz = sy * az - sz * ay, sz * ax - sx * az, sx * ay - sy * ax
+        v = (dx * qx + dy * qy + dz * qz) * inv_det
+        t = (bx * qx + by * qy + bz * qz) * inv_det
+        hit = front & (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0) & (t > EPSILON)
+        hit &= t < (t_max[rays] if np.ndim(t_max) else t_max)
+
+        # Closest hit of every ray (the nearest pairs first, so the first pair of each ray wins)
+        rays, index, t = rays[hit], index[hit], t[hit]
+        order = np.lexsort((t, rays))
+        closest = order[np.unique(rays[order], return_index=True)[1]]
+        distances[rays[closest]] = t[closest]
+        triangles[rays[closest]] = index[closest]
+        return distances, triangles
+
+    # Method to get the face normal of a triangle (an index returned by intersect)
+    def normal(self, triangle):
+        return self.normals[triangle]
@@ -38,9 +38,29 @@ class Camera:
           and rotation, and recalculates the view matrix to reflect the updated 
           camera orientation.
 
+        * Fixed Timestep: The main loop splits update in two. tick advances the 
+          camera by one simulation step (remembering the pose it started from), 
+          and interpolate blends the previous and current poses by the fraction 
+          of a step left over, so the view stays smooth whatever the frame rate. 
+          tick can also be given a snapshot of the keyboard and mouse state (so 
+          it can run off the main thread), and get_interpolated_view computes the 
+          blended view without touching the camera's own view matrix.
+
         * Camera Movement: The move method processes key inputs for camera movement, 
           adjusting the camera's position based on the pressed keys.
 
+        * Walk Mode: With walk set, the camera walks instead of flying: it moves 
+          along the ground plane (Q and E do nothing), and after every step the 
+          scene's CollisionWorld pushes it out of the objects it ran into and puts 
+          it at eye height above the ground (timed as the 'collision' scope).
+
+        * Scripted Poses: The set_pose method places the camera at a given position, 
+          yaw, and pitch without reading any input, so recorded or scripted camera 
+          paths can be replayed deterministically.
+
+        * Picking Rays: get_ray returns the ray through a pixel of the 
+          window (or the center of the view), for raycasts into the scene.
+
         * View and Projection Matrix Generation: The get_view_matrix and 
           get_projection_matrix methods compute the view and projection 
           matrices, respectively, using the camera's position, orientation, 
@@ -65,20 +85,29 @@ class Camera:
         self.right = glm.vec3(1, 0, 0)
         self.forward = glm.vec3(0, 0, -1)
 
+        # Walk on the ground (colliding with the scene's objects) instead of flying
+        self.walk = False
+
         # Initial yaw and pitch angles
         self.yaw = yaw
         self.pitch = pitch
 
-        # View matrix
+        # Pose at the start of the last simulation step (for render interpolation)
+        self.prev_position = glm.vec3(self.position)
+        self.prev_yaw = yaw
+        self.prev_pitch = pitch
+
+        # View matrix, and the position it looks from (the camera position the frame is drawn with)
         self.m_view = self.get_view_matrix()
+        self.view_position = glm.vec3(self.position)
 
         # Projection matrix
         self.m_proj = self.get_projection_matrix()
 
-    # Method to handle rotation based on mouse movement
-    def rotate(self):
+    # Method to handle rotation based on mouse movement (or a given relative mouse motion)
+    def rotate(self, mouse_rel=None):
 
-        rel_x, rel_y = pg.mouse.get_rel()
+        rel_x, rel_y = pg.mouse.get_rel() if mouse_rel is None else mouse_rel
         self.yaw += rel_x * SENSITIVITY
         self.pitch -= rel_y * SENSITIVITY
 
@@ -87,56 +116,90 @@ class Camera:
 
     # Method to update camera vectors based on yaw and pitch
     def update_camera_vectors(self):
+        self.forward, self.right, self.up = self.get_camera_vectors(self.yaw, self.pitch)
+
+    # Method to compute the orientation vectors (forward, right, up) for a yaw and pitch
+    def get_camera_vectors(self, yaw, pitch):
 
         # Convert yaw and pitch to radians for trigonometric calculations
-        yaw, pitch = glm.radians(self.yaw), glm.radians(self.pitch)
+        yaw, pitch = glm.radians(yaw), glm.radians(pitch)
 
-        # Update the forward vector based on yaw and pitch
-        self.forward.x = glm.cos(yaw) * glm.cos(pitch)
-        self.forward.y = glm.sin(pitch)
-        self.forward.z = glm.sin(yaw) * glm.cos(pitch)
+        # Forward vector based on yaw and pitch
+        forward = glm.vec3(glm.cos(yaw) * glm.cos(pitch), glm.sin(pitch), glm.sin(yaw) * glm.cos(pitch))
 
         # Normalize vectors to ensure they have unit length
-        self.forward = glm.normalize(self.forward)
-        self.right = glm.normalize(glm.cross(self.forward, glm.vec3(0, 1, 0)))
-        self.up = glm.normalize(glm.cross(self.right, self.forward))
+        forward = glm.normalize(forward)
+        right = glm.normalize(glm.cross(forward, glm.vec3(0, 1, 0)))
+        up = glm.normalize(glm.cross(right, forward))
+        return forward, right, up
 
-    # Method to update the camera (called in the game loop)
+    # Method to update the camera (a single simulation step, shown as is)
     def update(self):
+        self.tick()
+        self.interpolate(1.0)
 
-        # Move the camera based on user input
-        self.move()
+    # Method to advance the camera by one simulation step of app.delta_time milliseconds
+    # (keys and mouse_rel are snapshots of the input state, read from pygame if not given)
+    def tick(self, keys=None, mouse_rel=None):
+
+        # Remember where this step started
+        self.prev_position = glm.vec3(self.position)
+        self.prev_yaw = self.yaw
+        self.prev_pitch = self.pitch
 
         # Rotate the camera based on mouse movement
-        self.rotate()
+        self.rotate(mouse_rel)
 
         # Update the camera orientation vectors based on yaw and pitch
         self.update_camera_vectors()
 
-        # Update the view matrix to reflect the new camera position and orientation
-        self.m_view = self.get_view_matrix()
+        # Move the camera based on user input
+        self.move(keys)
 
-    # Method to handle camera movement based on key inputs
-    def move(self):
+    # Method to set the view matrix (and view position) to a blend of the previous and current poses (alpha in [0, 1])
+    def interpolate(self, alpha):
+        self.m_view, self.view_position = self.get_interpolated_view(alpha)
+
+    # Method to get the view matrix and position of a blend of the previous and current poses
+    def get_interpolated_view(self, alpha):
+        position = glm.mix(self.prev_position, self.position, alpha)
+        yaw = self.prev_yaw + (self.yaw - self.prev_yaw) * alpha
+        pitch = self.prev_pitch + (self.pitch - self.prev_pitch) * alpha
+        forward, right, up = self.get_camera_vectors(yaw, pitch)
+        return glm.lookAt(position, position + forward, up), position
+
+    # Method to handle camera movement based on key inputs (or a given snapshot of the key states)
+    def move(self, keys=None):
 
         # Calculate the camera movement velocity based on the predefined speed and delta time
         velocity = SPEED * self.app.delta_time
 
         # Get the current state of all keys to check for user input
-        keys = pg.key.get_pressed()
+        keys = pg.key.get_pressed() if keys is None else keys
+
+        # Walking moves along the ground plane, flying along the view
+        forward, right = self.forward, self.right
+        if self.walk:
+            forward = glm.normalize(glm.vec3(forward.x, 0, forward.z)) if forward.x or forward.z else glm.vec3(0)
 
         # Update camera position based on pressed keys
         if keys[pg.K_w]:  # Move forward (along the camera's forward vector)
-            self.position += self.forward * velocity
+            self.position += forward * velocity
 
         if keys[pg.K_s]:  # Move backward (opposite to the camera's forward vector)
-            self.position -= self.forward * velocity
+            self.position -= forward * velocity
 
         if keys[pg.K_a]:  # Move left (along the camera's right vector)
-            self.position -= self.right * velocity
+            self.position -= right * velocity
 
         if keys[pg.K_d]:  # Move right (opposite to the camera's right vector)
-            self.position += self.right * velocity
+            self.position += right * velocity
+
+        if self.walk:
+            # Keep the walking camera out of the objects and on the ground
+            with self.app.profiler.cpu('collision'):
+                self.position = self.app.scene.collision.resolve(self.position)
+            return
 
         if keys[pg.K_q]:  # Move up (along the camera's up vector)
             self.position += self.up * velocity
@@ -144,6 +207,38 @@ class Camera:
         if keys[pg.K_e]:  # Move down (opposite to the camera's up vector)
             self.position -= self.up * velocity
 
+    # Method to place the camera at an explicit pose (used when replaying camera paths)
+    def set_pose(self, position, yaw, pitch):
+
+        # Overwrite the position and orientation angles (there is nothing to interpolate from)
+        self.position = glm.vec3(position)
+        self.yaw = yaw
+        self.pitch = max(-89, min(89, pitch))
+        self.prev_position = glm.vec3(self.position)
+        self.prev_yaw, self.prev_pitch = self.yaw, self.pitch
+
+        # Recalculate the orientation vectors and the view matrix
+        self.update_camera_vectors()
+        self.m_view = self.get_view_matrix()
+        self.view_position = glm.vec3(self.position)
+
+    # Method to get the current pose as (position, yaw, pitch)
+    def get_pose(self):
+        return tuple(self.position), self.yaw, self.pitch
+
+    # Method to get the ray (origin, unit direction) through a window pixel (the center if not given)
+    def get_ray(self, screen_pos=None):
+        if screen_pos is None:
+            return glm.vec3(self.position), glm.vec3(self.forward)
+
+        # Unproject the pixel onto the near and far planes
+        width, height = self.app.WIN_SIZE
+        x, y = 2 * screen_pos[0] / width - 1, 1 - 2 * screen_pos[1] / height
+        m_inverse = glm.inverse(self.m_proj * self.m_view)
+        near, far = m_inverse * glm.vec4(x, y, -1, 1), m_inverse * glm.vec4(x, y, 1, 1)
+        near, far = glm.vec3(near) / near.w, glm.vec3(far) / far.w
+        return near, glm.normalize(far - near)
+
     # Method to get the view matrix
     def get_view_matrix(self):
         return glm.lookAt(self.position, self.position + self.forward, self.up)
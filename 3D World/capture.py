@@ -0,0 +1,133 @@
+import os
+import queue
+import threading
+import numpy as np
+import pygame as pg
+from gpu_memory import get_gpu_memory
+
+# Capture settings
+RING_SIZE = 3  # Pixel buffers frames are read back through (a frame is collected RING_SIZE - 1 frames later)
+QUEUE_FRAMES = 32  # Frames waiting for the writer before capture blocks
+FORMATS = ('png', 'raw')
+
+
+# FrameCapture class
+class FrameCapture:
+
+    """
+    records the frames the application renders
+    to disk without stalling it. Here's a summary
+    of its key features:
+
+        * Pixel Buffer Ring: capture asks OpenGL to copy the
+          framebuffer into one of RING_SIZE pixel buffers
+          (read_into a Buffer), which returns at once; the
+          copy happens on the GPU in the background. A buffer
+          is only read back when the ring comes round to it,
+          RING_SIZE - 1 frames later, by which time the copy
+          is done and reading it does not wait for the GPU.
+
+        * Writer Thread: The frames read back are handed to
+          a background thread through a queue of QUEUE_FRAMES,
+          which flips them upright and writes them out, so PNG
+          encoding and disk writes stay off the render loop.
+          When the writer falls behind and the queue is full,
+          capture waits for it rather than dropping frames.
+
+        * Formats: 'png' writes an image sequence (frame_000000.png,
+          ...), and 'raw' appends the RGB frames to a single
+          video.rgb file, which ffmpeg can encode (see
+          get_ffmpeg_command) without the cost of compressing
+          every frame as a PNG.
+
+        * Finishing: finish collects the frames still in the ring,
+          waits for the writer to write everything and releases
+          the buffers.
+
+        * Accounting: The pixel buffers are recorded in the GPU
+          memory registry.
+    """
+
+    def __init__(self, ctx, size, directory, format='png', fps=60, ring_size=RING_SIZE):
+        if format not in FORMATS:
+            raise ValueError(f'unknown capture format {format!r} (expected one of {", ".join(FORMATS)})')
+
+        # Context, frame size, output directory and format, and the frame rate the video is encoded at
+        self.ctx = ctx
+        self.size = size
+        self.directory = directory
+        self.format = format
+        self.fps = fps
+        os.makedirs(directory, exist_ok=True)
+
+        # Ring of pixel buffers, and the number of the frame each one holds (None while empty)
+        width, height = size
+        self.frame_bytes = width * height * 3
+        self.buffers = [ctx.buffer(reserve=self.frame_bytes) for i in range(ring_size)]
+        for buffer in self.buffers:
+            get_gpu_memory(ctx).add_buffer('capture ring', buffer)
+        self.pending = [None] * ring_size
+        self.frames = 0
+
+        # Writer thread and the frames waiting for it
+        self.queue = queue.Queue(maxsize=QUEUE_FRAMES)
+        self.video = open(os.path.join(directory, 'video.rgb'), 'wb') if format == 'raw' else None
+        self.written = 0
+        self.thread = threading.Thread(target=self.write_frames, name='frame capture', daemon=True)
+        self.thread.start()
+
+    # Method to start reading back a framebuffer, and hand the frame read RING_SIZE - 1 frames ago to the writer
+    def capture(self, framebuffer):
+        slot = self.frames % len(self.buffers)
+        self.collect(slot)
+        framebuffer.read_into(self.buffers[slot], viewport=(0, 0, *self.size), components=3, alignment=1)
+        self.pending[slot] = self.frames
+        self.frames += 1
+
+    # Method to read back the frame held by a slot of the ring (if any) and queue it for the writer
+    def collect(self, slot):
+        number = self.pending[slot]
+        if number is not None:
+            self.queue.put((number, self.buffers[slot].read()))
+            self.pending[slot] = None
+
+    # Method run by the writer thread: write the queued frames until the None that ends the capture
+    def write_frames(self):
+        width, height = self.size
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            number, data = item
+
+            # OpenGL rows go bottom to top
+            pixels = np.frombuffer(data, dtype='u1').reshape(height, width, 3)[::-1]
+            if self.video:
+                self.video.write(pixels.tobytes())
+            else:
+                surface = pg.image.frombuffer(pixels.tobytes(), self.size, 'RGB')
+                pg.image.save(surface, os.path.join(self.directory, f'frame_{number:06d}.png'))
+            self.written += 1
+
+    # Command that encodes the raw video with ffmpeg
+    def get_ffmpeg_command(self):
+        width, height = self.size
+        path = os.path.join(self.directory, 'video.rgb')
+        return (f'ffmpeg -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {self.fps} -i {path} '
+                f'-pix_fmt yuv420p {os.path.join(self.directory, "video.mp4")}')
+
+    # Method to write the frames still in the ring, wait for the writer and release the buffers
+    def finish(self):
+        for i in range(len(self.buffers)):
+            self.collect((self.frames + i) % len(self.buffers))
+        self.queue.put(None)
+        self.thread.join()
+        if self.video:
+            self.video.close()
+        for buffer in self.buffers:
+            get_gpu_memory(self.ctx).remove(buffer)
+            buffer.release()
+        self.buffers = []
+        print(f'captured {self.written} frames to {self.directory}')
+        if self.format == 'raw':
+            print(f'encode with: {self.get_ffmpeg_command()}')
@@ -0,0 +1,144 @@
+import math
+import numpy as np
+import glm
+
+# Walk mode settings
+EYE_HEIGHT = 1.8  # Height of the camera above the ground it stands on
+CAPSULE_RADIUS = 0.4  # Radius of the capsule around the camera
+STEP_HEIGHT = 0.5  # Obstacles whose top is less than this above the ground are stepped over
+CELL_SIZE = 4.0  # Size of the square cells of the collision grid
+RESOLVE_ITERATIONS = 3  # Rounds of pushing the capsule out of the boxes it overlaps
+COLLISION_BUDGET_MS = 0.5  # Per-frame budget of the 'collision' profiler scope
+
+# Meshes the camera walks through (the ground and ground cover)
+PASSABLE_MESHES = {'plane', 'plane_grass', 'plane_dirt', 'plane_sand', 'grass', 'grasspatch'}
+
+
+# CollisionWorld class
+class CollisionWorld:
+
+    """
+    keeps a walking camera on the ground and out
+    of the scene's objects. Here's a summary of
+    its key features:
+
+        * Capsule: The camera is treated as an upright
+          capsule of CAPSULE_RADIUS, from its feet on the
+          ground to its eyes EYE_HEIGHT above them. Boxes
+          entirely above the capsule, and boxes lower than
+          STEP_HEIGHT (which are stepped over), are ignored.
+
+        * Collision Grid: The world boxes of the solid objects
+          (the raycaster's broad phase boxes, minus ground cover)
+          are bucketed into a dictionary of CELL_SIZE cells on the
+          ground plane. A query only looks at the few cells under
+          the capsule, so its cost does not depend on how many
+          objects the world holds. The grid is rebuilt whenever
+          the raycaster's broad phase is.
+
+        * Resolving: resolve pushes the capsule out of every box
+          it overlaps along the shortest way out on the ground
+          plane (so the camera slides along walls), repeated up to
+          RESOLVE_ITERATIONS times for corners between boxes.
+
+        * Ground Following: The feet are then put on the ground:
+          the terrain's height where there is a terrain, and the
+          flat ground's height elsewhere.
+    """
+
+    def __init__(self, scene, ground_y=0.0, radius=CAPSULE_RADIUS, eye_height=EYE_HEIGHT,
+                 step_height=STEP_HEIGHT, cell_size=CELL_SIZE):
+
+        # Reference to the scene, and the height of the flat ground (without a terrain)
+        self.scene = scene
+        self.ground_y = ground_y
+
+        # Capsule settings
+        self.radius = radius
+        self.eye_height = eye_height
+        self.step_height = step_height
+
+        # Collision grid: cell -> indices of the boxes overlapping it, the boxes as
+        # (min x, y, z, max x, y, z) tuples, and the broad phase it was built from
+        self.cell_size = cell_size
+        self.cells = {}
+        self.boxes = []
+        self.source = None
+
+    # Method to build the collision grid from the raycaster's boxes
+    def build(self):
+        raycaster = self.scene.raycaster
+        if raycaster.bvh is None:
+            raycaster.build()
+        self.source = raycaster.bvh
+
+        solid = np.array([obj.vao_name not in PASSABLE_MESHES for obj, instance in raycaster.placements], dtype=bool)
+        b_min, b_max = raycaster.b_min[solid], raycaster.b_max[solid]
+        self.boxes = np.concatenate([b_min, b_max], axis=1).tolist() if len(b_min) else []
+
+        # Add every box to the cells its footprint overlaps
+        first = np.floor(b_min[:, [0, 2]] / self.cell_size).astype(int).tolist()
+        last = np.floor(b_max[:, [0, 2]] / self.cell_size).astype(int).tolist()
+        self.cells = {}
+        for index, ((x0, z0), (x1, z1)) in enumerate(zip(first, last)):
+            for cx in range(x0, x1 + 1):
+                for cz in range(z0, z1 + 1):
+                    self.cells.setdefault((cx, cz), []).append(index)
+
+    # Method to get the height of the ground at x, z
+    def get_ground_height(self, x, z):
+        heightmap = self.scene.heightmap
+        return float(heightmap.get_height(x, z)) if heightmap is not None else self.ground_y
+
+    # Method to get the indices of the boxes in the cells a circle of radius r around x, z overlaps
+    def get_candidates(self, x, z, r):
+        size = self.cell_size
+        candidates = set()
+        for cx in range(math.floor((x - r) / size), math.floor((x + r) / size) + 1):
+            for cz in range(math.floor((z - r) / size), math.floor((z + r) / size) + 1):
+                candidates.update(self.cells.get((cx, cz), ()))
+        return candidates
+
+    # Method to move a camera position out of the objects and onto the ground
+    # Returns the corrected position (at eye height above the ground)
+    def resolve(self, position):
+        if self.source is None or self.source is not self.scene.raycaster.bvh:
+            self.build()
+        x, z, r = position.x, position.z, self.radius
+        feet = self.get_ground_height(x, z)
+        pushed = False
+
+        for iteration in range(RESOLVE_ITERATIONS):
+            moved = False
+            for index in self.get_candidates(x, z, r):
+                x0, y0, z0, x1, y1, z1 = self.boxes[index]
+
+                # Boxes above the capsule, or low enough to step over
+                if y0 >= feet + self.eye_height or y1 <= feet + self.step_height:
+                    continue
+
+                # Closest point of the box's footprint to the capsule's axis
+                dx, dz = x - min(max(x, x0), x1), z - min(max(z, z0), z1)
+                distance_sq = dx * dx + dz * dz
+                if distance_sq >= r * r:
+                    continue
+
+                # Push out along the separation, or through the nearest side if the axis is inside the box
+                if distance_sq > 1e-12:
+                    distance = math.sqrt(distance_sq)
+                    x += dx / distance * (r - distance)
+                    z += dz / distance * (r - distance)
+                else:
+                    exits = [(x - x0 + r, -1, 0), (x1 - x + r, 1, 0), (z - z0 + r, 0, -1), (z1 - z + r, 0, 1)]
+                    depth, sx, sz = min(exits)
+                    x, z = x + sx * depth, z + sz * depth
+                moved = True
+
+            if not moved:
+                break
+            pushed = True
+
+        # The ground under where the capsule ended up
+        if pushed:
+            feet = self.get_ground_height(x, z)
+        return glm.vec3(x, feet + self.eye_height, z)
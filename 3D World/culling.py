@@ -0,0 +1,105 @@
+import numpy as np
+import glm
+
+# Results of testing a bounding box against a frustum
+OUTSIDE = 0
+INTERSECTING = 1
+INSIDE = 2
+
+
+# Transform an axis-aligned box (min, max) by a matrix and return the box enclosing the result
+def transform_bounds(matrix, bounds):
+    b_min, b_max = bounds
+    center = (glm.vec3(b_min) + glm.vec3(b_max)) * 0.5
+    extent = (glm.vec3(b_max) - glm.vec3(b_min)) * 0.5
+
+    # The extent of the new box is the extent projected on the absolute value of every axis
+    center = glm.vec3(matrix * glm.vec4(center, 1.0))
+    axes = [glm.abs(glm.vec3(matrix[i])) for i in range(3)]
+    extent = axes[0] * extent.x + axes[1] * extent.y + axes[2] * extent.z
+    return center - extent, center + extent
+
+
+# Transform N boxes ((N, 3) arrays of minimums and maximums) by N matrices ((N, 4, 4) arrays laid out
+# like the transform store's, translation in [:, 3, :3]) and return the minimums and maximums enclosing them
+def transform_boxes(matrices, b_min, b_max):
+    center, extent = (b_min + b_max) * 0.5, (b_max - b_min) * 0.5
+    center = np.einsum('ni,nij->nj', center, matrices[:, :3, :3]) + matrices[:, 3, :3]
+    extent = np.einsum('ni,nij->nj', extent, np.abs(matrices[:, :3, :3]))
+    return center - extent, center + extent
+
+
+# Merge two axis-aligned boxes (either may be None)
+def merge_bounds(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return glm.min(a[0], b[0]), glm.max(a[1], b[1])
+
+
+# Frustum class
+class Frustum:
+
+    """
+    the six clipping planes of a view-projection
+    matrix, used to skip objects that cannot be
+    seen. Here's a summary of its key features:
+
+        * Planes: The constructor extracts the left,
+          right, bottom, top, near and far planes from
+          the combined projection * view matrix (Gribb &
+          Hartmann) and normalizes them. Plane normals
+          point into the frustum.
+
+        * Box Tests: classify tests an axis-aligned box
+          (min, max) against the planes and returns OUTSIDE,
+          INTERSECTING or INSIDE. A box that is INSIDE lets
+          the caller skip testing everything it contains.
+
+        * Batched Tests: cull_boxes tests (N, 3) arrays of box
+          minimums and maximums at once and returns a boolean
+          mask of the visible ones.
+    """
+
+    def __init__(self, m_proj_view):
+
+        # Rows of the matrix (glm matrices are indexed [column][row])
+        rows = [glm.vec4(*(m_proj_view[c][r] for c in range(4))) for r in range(4)]
+
+        # Left, right, bottom, top, near and far planes as (normal, distance)
+        self.planes = []
+        for axis in range(3):
+            for sign in (1, -1):
+                plane = rows[3] + rows[axis] * sign
+                length = glm.length(glm.vec3(plane))
+                self.planes.append((glm.vec3(plane) / length, plane.w / length))
+
+        # The same planes as an array for batched tests
+        self.plane_array = np.array([(*normal, d) for normal, d in self.planes], dtype='f4')
+
+    # Method to test an axis-aligned box against the frustum
+    def classify(self, bounds):
+        b_min, b_max = bounds
+        result = INSIDE
+        for normal, d in self.planes:
+
+            # Corner of the box furthest along the plane normal (and the one furthest against it)
+            positive = glm.vec3(b_max.x if normal.x >= 0 else b_min.x,
+                                b_max.y if normal.y >= 0 else b_min.y,
+                                b_max.z if normal.z >= 0 else b_min.z)
+            if glm.dot(normal, positive) + d < 0:
+                return OUTSIDE
+
+            negative = glm.vec3(b_min.x if normal.x >= 0 else b_max.x,
+                                b_min.y if normal.y >= 0 else b_max.y,
+                                b_min.z if normal.z >= 0 else b_max.z)
+            if glm.dot(normal, negative) + d < 0:
+                result = INTERSECTING
+        return result
+
+    # Method to test (N, 3) arrays of box minimums and maximums and return the mask of visible boxes
+    def cull_boxes(self, b_min, b_max):
+        normals, d = self.plane_array[:, :3], self.plane_array[:, 3]
+        positive = np.where(normals[None] >= 0, b_max[:, None], b_min[:, None])
+        return ((positive * normals[None]).sum(axis=2) + d >= 0).all(axis=1)
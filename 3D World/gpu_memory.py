@@ -0,0 +1,140 @@
+import moderngl as mgl
+
+# Bytes in a megabyte (for reports)
+MB = 1024 * 1024
+
+# Kinds of resources, in report order
+KINDS = ('buffer', 'texture', 'framebuffer')
+
+
+# Get the GPU memory registry of a context (created on first use and kept in ctx.extra, so everything
+# holding the context can record its resources without a reference to the application)
+def get_gpu_memory(ctx):
+    if not isinstance(ctx.extra, dict):
+        ctx.extra = {}
+    if 'gpu_memory' not in ctx.extra:
+        ctx.extra['gpu_memory'] = GPUMemory()
+    return ctx.extra['gpu_memory']
+
+
+# Get the kind of a resource from its moderngl type (OpenGL names are only unique within a kind, so a
+# buffer and a texture may share one)
+def get_kind(resource):
+    if isinstance(resource, mgl.Buffer):
+        return 'buffer'
+    if isinstance(resource, (mgl.Texture, mgl.TextureCube, mgl.TextureArray, mgl.Texture3D)):
+        return 'texture'
+    if isinstance(resource, mgl.Framebuffer):
+        return 'framebuffer'
+    raise TypeError(f'cannot record {type(resource).__name__} objects')
+
+
+# Get the bytes of a 2D image of (width, height) texels, with its whole mip chain if mipmapped
+def get_image_bytes(size, texel_bytes, mipmaps=False):
+    width, height = size
+    total = width * height
+    while mipmaps and (width > 1 or height > 1):
+        width, height = max(1, width // 2), max(1, height // 2)
+        total += width * height
+    return total * texel_bytes
+
+
+# Get the bytes of a texel of a texture or renderbuffer (its dtype is e.g. 'f1' or 'f4')
+def get_texel_bytes(resource):
+    return resource.components * int(resource.dtype[1:]) * max(1, getattr(resource, 'samples', 0))
+
+
+# GPUMemory class
+class GPUMemory:
+
+    """
+    a registry of the GPU resources the
+    application allocates and how many bytes
+    each holds. Here's a summary of its key
+    features:
+
+        * Registry: VBO, Texture, the terrain, instanced
+          models and SceneRenderer record their buffers,
+          textures and framebuffers with add_buffer,
+          add_texture and add_framebuffer, under a name
+          saying what they are for, and drop them with
+          remove when they release them. OpenGL names are
+          only unique within a kind of object, so resources
+          are keyed by kind and name, and remove finds the
+          kind from the resource's moderngl type.
+
+        * Sizes: Buffers count their size. Textures count
+          width x height x bytes per texel (six faces for
+          cube maps), plus the whole mip chain once mipmaps
+          are built, about a third more. Framebuffers count
+          their renderbuffer attachments (texture attachments
+          are counted as textures).
+
+        * Totals: totals holds the bytes of every kind of
+          resource, kept up to date as resources come and go,
+          so reading them every frame costs nothing. The
+          renderer copies them into its stats.
+
+        * Report: get_report groups the resources by kind
+          and name (the terrain's chunks, for instance, share
+          one), largest first, and print_report prints it.
+    """
+
+    def __init__(self):
+
+        # Recorded resources as (kind, OpenGL object) -> (name, bytes), and the bytes of each kind
+        self.resources = {}
+        self.totals = dict.fromkeys(KINDS, 0)
+
+    # Method to record a resource (recording it again replaces the old entry)
+    def add(self, kind, name, resource, size):
+        self.remove(resource, kind)
+        self.resources[(kind, resource.glo)] = (name, size)
+        self.totals[kind] += size
+
+    # Method to record a buffer
+    def add_buffer(self, name, buffer):
+        self.add('buffer', name, buffer, buffer.size)
+
+    # Method to record a texture (with its mip chain if mipmaps is set)
+    def add_texture(self, name, texture, mipmaps=False):
+        size = get_image_bytes(texture.size, get_texel_bytes(texture), mipmaps)
+        if isinstance(texture, mgl.TextureCube):
+            size *= 6
+        self.add('texture', name, texture, size)
+
+    # Method to record a framebuffer (with the bytes of its renderbuffer attachments)
+    def add_framebuffer(self, name, framebuffer):
+        attachments = list(framebuffer.color_attachments) + [framebuffer.depth_attachment]
+        size = sum(get_image_bytes(attachment.size, get_texel_bytes(attachment))
+                   for attachment in attachments if isinstance(attachment, mgl.Renderbuffer))
+        self.add('framebuffer', name, framebuffer, size)
+
+    # Method to forget a resource (of the given kind, or of the kind of its moderngl type)
+    def remove(self, resource, kind=None):
+        kind = get_kind(resource) if kind is None else kind
+        entry = self.resources.pop((kind, resource.glo), None)
+        if entry is not None:
+            self.totals[kind] -= entry[1]
+
+    # Total bytes of all recorded resources
+    @property
+    def total(self):
+        return sum(self.totals.values())
+
+    # Method to get the resources grouped by (kind, name) as (kind, name, count, bytes), largest first
+    def get_report(self):
+        groups = {}
+        for (kind, glo), (name, size) in self.resources.items():
+            count, total = groups.get((kind, name), (0, 0))
+            groups[(kind, name)] = (count + 1, total + size)
+        report = [(kind, name, count, size) for (kind, name), (count, size) in groups.items()]
+        return sorted(report, key=lambda row: -row[3])
+
+    # Method to print the report and the totals of each kind
+    def print_report(self):
+        print(f'--- GPU memory: {self.total / MB:.2f} MB in {len(self.resources)} resources ---')
+        print(f"{'kind':<12} {'name':<32} {'count':>6} {'MB':>9}")
+        for kind, name, count, size in self.get_report():
+            print(f'{kind:<12} {name:<32} {count:>6} {size / MB:>9.3f}')
+        print(', '.join(f'{kind}s {self.totals[kind] / MB:.2f} MB' for kind in KINDS))
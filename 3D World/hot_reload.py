@@ -0,0 +1,116 @@
+import os
+import time
+from shader_program import SHADER_DIR
+
+# Seconds between two scans of the shader directory
+SCAN_INTERVAL = 0.5
+
+
+# ShaderReloader class
+class ShaderReloader:
+
+    """
+    watches the shader directory and swaps
+    recompiled programs into the running
+    engine. Here's a summary of its key
+    features:
+
+        * Watching: poll (called once per frame) scans
+          the modification times of the files in the
+          shader directory every SCAN_INTERVAL seconds,
+          so no extra dependency or thread is needed.
+
+        * Recompiling: Changed files are handed to
+          ShaderProgram.reload, which recompiles every
+          variant built from them (including through
+          #include), restores their uniforms, and prints
+          compile errors instead of raising them, so a
+          typo never takes the engine down.
+
+        * Rebinding: Vertex arrays cannot change program,
+          so every VAO using a replaced program is rebuilt
+          from its buffer layout, and the VAO table, the
+          scene's models, the terrain, the skybox and the upscale pass
+          are pointed at the new VAOs and programs before
+          the old ones are released.
+    """
+
+    def __init__(self, app, interval=SCAN_INTERVAL):
+
+        # Reference to the application and the scan interval
+        self.app = app
+        self.interval = interval
+        self.last_scan = time.perf_counter()
+
+        # Modification time of every shader file
+        self.mtimes = self.get_mtimes()
+
+    # Method to get the modification time of every file in the shader directory
+    def get_mtimes(self):
+        mtimes = {}
+        for entry in os.scandir(SHADER_DIR):
+            if entry.is_file():
+                mtimes[entry.name] = entry.stat().st_mtime
+        return mtimes
+
+    # Method to check for changed shaders (cheap to call every frame)
+    def poll(self):
+        now = time.perf_counter()
+        if now - self.last_scan < self.interval:
+            return
+        self.last_scan = now
+
+        mtimes = self.get_mtimes()
+        changed = {name for name, mtime in mtimes.items() if self.mtimes.get(name) != mtime}
+        self.mtimes = mtimes
+        if changed:
+            self.reload(changed)
+
+    # Method to recompile the programs built from the changed files and rebind them
+    def reload(self, changed_files):
+        app = self.app
+        vao = app.mesh.vao
+        replaced = vao.program.reload(changed_files)
+        if not replaced:
+            return
+
+        new_programs = {old.glo: new for old, new in replaced}
+        new_vaos = {}
+        old_vaos = []
+
+        # Rebuild a vertex array if its program was replaced (each one only once)
+        def rebind(vertex_array):
+            if vertex_array is None or vertex_array.program.glo not in new_programs:
+                return vertex_array
+            if vertex_array.glo not in new_vaos:
+                new_vaos[vertex_array.glo] = vao.rebuild_vao(vertex_array, new_programs[vertex_array.program.glo])
+                old_vaos.append(vertex_array)
+            return new_vaos[vertex_array.glo]
+
+        # The VAO table
+        for name, vertex_array in vao.vaos.items():
+            vao.vaos[name] = rebind(vertex_array)
+
+        # Everything holding a VAO and its program
+        holders = list(app.scene.objects) + [app.scene.skybox]
+        if app.scene_renderer.resolution:
+            holders.append(app.scene_renderer.resolution)
+        terrain = app.scene.terrain
+        if terrain:
+            holders.extend(terrain.chunks)
+        for holder in holders:
+            holder.vao = rebind(holder.vao)
+            holder.program = holder.vao.program
+            if getattr(holder, 'shadow_vao', None) is not None:
+                holder.shadow_vao = rebind(holder.shadow_vao)
+                holder.shadow_program = holder.shadow_vao.program
+        if terrain:
+            terrain.program, terrain.shadow_program = terrain.chunks[0].program, terrain.chunks[0].shadow_program
+
+        # Release what was replaced
+        for vertex_array in old_vaos:
+            vertex_array.release()
+        for old_program, new_program in replaced:
+            old_program.release()
+
+        print(f"reloaded {len(replaced)} shader program(s) after changes to {', '.join(sorted(changed_files))}")
@@ -0,0 +1,257 @@
+import math
+import numpy as np
+from camera import NEAR, FAR
+from gpu_memory import get_gpu_memory
+
+# Clusters along the screen's x and y and along the view depth (slices are exponentially spaced)
+CLUSTER_GRID = (16, 9, 24)
+
+# Texels per row of the light index texture, and lights the data texture first has room for
+INDEX_WIDTH = 1024
+INITIAL_LIGHTS = 64
+
+# Texture units the light textures are bound to (0 and 1 hold the model's texture and the shadow map)
+LIGHT_DATA_UNIT = 2
+LIGHT_GRID_UNIT = 3
+LIGHT_INDEX_UNIT = 4
+
+
+# LightManager class
+class LightManager:
+
+    """
+    the point and spot lights of a scene, shaded
+    with clustered forward lighting. Here's a
+    summary of its key features:
+
+        * Lights: add_point_light and add_spot_light add a
+          light with a position, a color (its intensity
+          included) and a radius it reaches, plus a direction
+          and cone angles for spot lights. They are stored in
+          NumPy arrays, not objects, so hundreds of lights cost
+          nothing per light in Python.
+
+        * Clusters: The view frustum is cut into a CLUSTER_GRID
+          of clusters: tiles of the screen, and slices of depth
+          spaced exponentially between the near and far planes.
+          bin works out which clusters every light's sphere
+          overlaps, from its view-space bounds, for all the
+          lights at once with NumPy and without OpenGL calls (the
+          renderer runs it while preparing a frame).
+
+        * Data Textures: upload writes three textures: the lights
+          (three RGBA float texels each), the (first index, light
+          count) of every cluster, and the light indices of all the
+          clusters one after the other. They are bound to texture
+          units LIGHT_DATA_UNIT to LIGHT_INDEX_UNIT by use.
+
+        * Shading: default.frag (through clustered_lights.glsl)
+          finds its fragment's cluster and loops over that
+          cluster's lights only, so the shading cost follows
+          the number of lights near a fragment rather than the
+          total number of lights. It only does so in the
+          CLUSTERED_LIGHTS variant (compiled for scenes with
+          lights), and upload and use do nothing while there
+          are no lights.
+
+        * Accounting: The textures are recorded in the GPU memory
+          registry, and grow (doubling) when the lights or the
+          light indices outgrow them.
+    """
+
+    def __init__(self, ctx, grid=CLUSTER_GRID, near=NEAR, far=FAR):
+
+        # Context, cluster grid and the depth range it covers
+        self.ctx = ctx
+        self.grid = grid
+        self.near = near
+        self.far = far
+
+        # Lights: positions, colors, radii, spot directions and the cosines of the spot cone's outer and
+        # inner angles (below -1 for point lights, which light every direction)
+        self.count = 0
+        self.positions = np.zeros((INITIAL_LIGHTS, 3), dtype='f4')
+        self.colors = np.zeros((INITIAL_LIGHTS, 3), dtype='f4')
+        self.radii = np.zeros(INITIAL_LIGHTS, dtype='f4')
+        self.directions = np.zeros((INITIAL_LIGHTS, 3), dtype='f4')
+        self.cos_outer = np.full(INITIAL_LIGHTS, -2.0, dtype='f4')
+        self.cos_inner = np.full(INITIAL_LIGHTS, -1.0, dtype='f4')
+        self.dirty = True
+
+        # Data textures (the light data and index textures are recreated larger when outgrown)
+        cols, rows, slices = grid
+        self.memory = get_gpu_memory(ctx)
+        self.light_texture = self.create_texture('light data', (3, INITIAL_LIGHTS), 4, 'f4')
+        self.grid_texture = self.create_texture('light grid', (cols * rows, slices), 2, 'u4')
+        self.index_texture = self.create_texture('light indices', (INDEX_WIDTH, 1), 1, 'u4')
+
+    # Number of lights
+    def __len__(self):
+        return self.count
+
+    # Method to create a data texture (read with texelFetch, so it is never filtered) and record it
+    def create_texture(self, name, size, components, dtype):
+        texture = self.ctx.texture(size, components, dtype=dtype)
+        texture.filter = (self.ctx.NEAREST, self.ctx.NEAREST)
+        self.memory.add_texture(name, texture)
+        return texture
+
+    # Method to replace a data texture with a larger one
+    def resize_texture(self, name, texture, size):
+        self.memory.remove(texture)
+        texture.release()
+        return self.create_texture(name, size, texture.components, texture.dtype)
+
+    # Method to add a point light of a color (with its intensity) reaching radius units
+    # Returns the index of the light
+    def add_point_light(self, position, color=(1, 1, 1), radius=10.0):
+        index = self.count
+        if index == len(self.radii):
+            self.grow()
+        self.count += 1
+        self.positions[index] = position
+        self.colors[index] = color
+        self.radii[index] = radius
+        self.dirty = True
+        return index
+
+    # Method to add a spot light shining along a direction, in a cone of angle degrees (from its axis)
+    # that fades out from inner_angle (80% of the angle by default)
+    # Returns the index of the light
+    def add_spot_light(self, position, direction, color=(1, 1, 1), radius=20.0, angle=30.0, inner_angle=None):
+        index = self.add_point_light(position, color, radius)
+        self.set_direction(index, direction)
+        inner_angle = angle * 0.8 if inner_angle is None else inner_angle
+        self.cos_outer[index] = math.cos(math.radians(angle))
+        self.cos_inner[index] = math.cos(math.radians(inner_angle))
+        return index
+
+    # Method to move a light
+    def set_position(self, index, position):
+        self.positions[index] = position
+        self.dirty = True
+
+    # Method to turn a spot light
+    def set_direction(self, index, direction):
+        direction = np.asarray(direction, dtype='f4')
+        self.directions[index] = direction / max(np.linalg.norm(direction), 1e-6)
+        self.dirty = True
+
+    # Method to double the room for lights
+    def grow(self):
+        capacity = len(self.radii) * 2
+        for name, fill in (('positions', 0.0), ('colors', 0.0), ('radii', 0.0), ('directions', 0.0),
+                           ('cos_outer', -2.0), ('cos_inner', -1.0)):
+            array = getattr(self, name)
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype='f4')
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    # Method to get the lights as the rows of the light data texture: (position, radius),
+    # (color, cos of the outer angle) and (direction, cos of the inner angle) per light
+    def get_light_data(self):
+        count = self.count
+        data = np.empty((count, 3, 4), dtype='f4')
+        data[:, 0, :3], data[:, 0, 3] = self.positions[:count], self.radii[:count]
+        data[:, 1, :3], data[:, 1, 3] = self.colors[:count], self.cos_outer[:count]
+        data[:, 2, :3], data[:, 2, 3] = self.directions[:count], self.cos_inner[:count]
+        return data
+
+    # Method to bin the lights into the clusters of a view (and projection), without OpenGL calls
+    # Returns the grid of (first index, light count) per cluster, and the light indices of the clusters
+    def bin(self, m_view, m_proj):
+        cols, rows, slices = self.grid
+        grid = np.zeros((slices, rows * cols, 2), dtype='u4')
+        if not self.count:
+            return grid, np.zeros(0, dtype='u4')
+
+        # Lights in view space (the camera looks down -z), and their depth range within the clusters
+        view = np.array(m_view, dtype='f4')
+        position = self.positions[:self.count] @ view[:3, :3].T + view[:3, 3]
+        radius = self.radii[:self.count]
+        depth = -position[:, 2]
+        d_min = np.clip(depth - radius, self.near, self.far)
+        d_max = np.clip(depth + radius, self.near, self.far)
+
+        # Range of screen x and y (in NDC) the view-space box of each sphere projects to, nearest and
+        # furthest depths taken together (a box straddling the near plane is clamped to it)
+        scale = np.array([m_proj[0][0], m_proj[1][1]], dtype='f4')
+        low = (position[:, :2] - radius[:, None]) * scale
+        high = (position[:, :2] + radius[:, None]) * scale
+        ndc_min = np.minimum(low / d_min[:, None], low / d_max[:, None])
+        ndc_max = np.maximum(high / d_min[:, None], high / d_max[:, None])
+        in_view = (depth + radius > self.near) & (depth - radius < self.far)
+        in_view &= (ndc_max > -1).all(axis=1) & (ndc_min < 1).all(axis=1)
+
+        # First and last cluster along each axis
+        size = np.array([cols, rows])
+        tile_min = np.clip(np.floor((ndc_min + 1) * 0.5 * size), 0, size - 1).astype(int)
+        tile_max = np.clip(np.floor((ndc_max + 1) * 0.5 * size), 0, size - 1).astype(int)
+        log_range = math.log(self.far / self.near)
+        slice_min = np.clip(np.floor(np.log(d_min / self.near) / log_range * slices), 0, slices - 1).astype(int)
+        slice_max = np.clip(np.floor(np.log(d_max / self.near) / log_range * slices), 0, slices - 1).astype(int)
+
+        # One (light, cluster) pair for every cluster in each light's range
+        lights = np.flatnonzero(in_view)
+        x0, y0, z0 = tile_min[lights, 0], tile_min[lights, 1], slice_min[lights]
+        nx, ny = tile_max[lights, 0] - x0 + 1, tile_max[lights, 1] - y0 + 1
+        nz = slice_max[lights] - z0 + 1
+        counts = nx * ny * nz
+        pairs = np.repeat(np.arange(len(lights)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        x = x0[pairs] + local % nx[pairs]
+        y = y0[pairs] + local // nx[pairs] % ny[pairs]
+        z = z0[pairs] + local // (nx * ny)[pairs]
+        clusters = (z * rows + y) * cols + x
+
+        # Light indices grouped by cluster, and every cluster's range of them
+        order = np.argsort(clusters, kind='stable')
+        indices = lights[pairs[order]].astype('u4')
+        light_counts = np.bincount(clusters, minlength=cols * rows * slices)
+        grid[..., 0] = (np.cumsum(light_counts) - light_counts).reshape(slices, rows * cols)
+        grid[..., 1] = light_counts.reshape(slices, rows * cols)
+        return grid, indices
+
+    # Method to upload the lights (if they changed) and a frame's binned clusters (nothing without lights)
+    def upload(self, grid, indices):
+        if not self.count:
+            return
+        if self.dirty:
+            if self.light_texture.height < self.count:
+                self.light_texture = self.resize_texture('light data', self.light_texture, (3, len(self.radii)))
+            self.light_texture.write(self.get_light_data(), viewport=(0, 0, 3, self.count))
+            self.dirty = False
+        self.grid_texture.write(grid)
+
+        # Indices fill rows of INDEX_WIDTH (the last row padded)
+        rows = max(1, -(-len(indices) // INDEX_WIDTH))
+        if self.index_texture.height < rows:
+            height = max(rows, self.index_texture.height * 2)
+            self.index_texture = self.resize_texture('light indices', self.index_texture, (INDEX_WIDTH, height))
+        if len(indices):
+            padded = np.zeros(rows * INDEX_WIDTH, dtype='u4')
+            padded[:len(indices)] = indices
+            self.index_texture.write(padded, viewport=(0, 0, INDEX_WIDTH, rows))
+
+    # Method to bind the textures and set the cluster uniforms of the programs shading with them (nothing
+    # without lights; a uniform the shader compiler optimized out is skipped)
+    def use(self, programs):
+        if not self.count:
+            return
+        self.light_texture.use(location=LIGHT_DATA_UNIT)
+        self.grid_texture.use(location=LIGHT_GRID_UNIT)
+        self.index_texture.use(location=LIGHT_INDEX_UNIT)
+        uniforms = (('u_lights', LIGHT_DATA_UNIT), ('u_light_grid', LIGHT_GRID_UNIT),
+                    ('u_light_indices', LIGHT_INDEX_UNIT), ('u_cluster_grid', self.grid),
+                    ('u_cluster_depth', (self.near, math.log(self.far / self.near))))
+        for program in programs:
+            for name, value in uniforms:
+                uniform = program.get(name, None)
+                if uniform is not None:
+                    uniform.value = value
+
+    # Method to release the textures
+    def destroy(self):
+        for texture in (self.light_texture, self.grid_texture, self.index_texture):
+            self.memory.remove(texture)
+            texture.release()
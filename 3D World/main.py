@@ -1,12 +1,34 @@
 import pygame as pg
 import moderngl as mgl
+import os
 import sys
+import argparse
 from model import *
 from camera import Camera
 from light import Light
 from mesh import Mesh
 from scene import Scene
 from scene_renderer import SceneRenderer
+from profiler import Profiler
+from pipeline import FramePipeline
+from hot_reload import ShaderReloader
+from collision import COLLISION_BUDGET_MS
+from gpu_memory import get_gpu_memory
+from capture import FrameCapture, FORMATS
+from startup import StartupTrace, WarmStartCache, install_startup, get_warm_cache, CACHE_DIR
+
+# Simulation and frame pacing settings
+SIM_RATE = 120  # Simulation steps per second
+TICK_MS = 1000 / SIM_RATE  # Length of a simulation step in milliseconds
+MAX_FRAME_TIME = 250  # Longest frame (in milliseconds) the simulation catches up on
+FPS_CAP = 60  # Frame rate limit in 'capped' mode
+FRAME_MODES = ('capped', 'uncapped', 'vsync')
+
+# File the startup trace is written to (with the startup report)
+STARTUP_TRACE_PATH = 'startup_trace.json'
+
+# Arguments of the standalone OpenGL context of a headless engine (EGL needs no display server on Linux)
+HEADLESS_CONTEXT = {'require': 330, 'backend': 'egl'} if sys.platform.startswith('linux') else {'require': 330}
 
 
 # GraphicsEngine class responsible for setting up and managing the graphics engine
@@ -28,6 +50,22 @@ class GraphicsEngine:
         * Tracking Time: Utilizes Pygame's clock to keep track of the current time and calculate 
           the time elapsed between frames.
 
+        * Fixed Timestep: The simulation (camera input and movement) advances in fixed steps of 
+          TICK_MS, as many as the elapsed frame time calls for, so a slow or fast frame never 
+          changes how the world moves. Frames longer than MAX_FRAME_TIME are clamped so a 
+          spike cannot trigger a long catch-up. Rendering then interpolates the camera between 
+          the last two simulation states.
+
+        * Frame Modes: 'capped' limits the frame rate to FPS_CAP, 'uncapped' renders as fast as 
+          possible (for measuring throughput), and 'vsync' waits for the display's refresh.
+
+        * Dynamic Resolution: With a resolution_target (a GPU frame time in milliseconds), the 
+          renderer scales the resolution of the main pass to hold that frame time.
+
+        * Pipelining: With pipelined=True, frames are run by a FramePipeline: the simulation, 
+          scene update and culling of the next frame run on a worker thread while the main 
+          thread submits the current frame's OpenGL commands.
+
         * Resource Management: Manages resources related to light, camera, mesh, scene, and renderer, 
           ensuring proper initialization and destruction.
 
@@ -37,14 +75,69 @@ class GraphicsEngine:
         * Rendering: Clears the framebuffer, updates the camera, and renders the scene using the specified 
           renderer.
 
-        * Main Loop: Runs the main loop of the graphics engine, continuously updating the time, checking 
-          for events, updating the camera, rendering the scene, and maintaining a consistent frame rate.
+        * Main Loop: Runs the main loop of the graphics engine, calling step for every frame: updating 
+          the time, checking for events, running the simulation steps that are due, and rendering 
+          the scene.
+
+        * Profiling: Every phase of the main loop is wrapped in a profiler scope. F3 toggles the 
+          profiler, F4 prints its rolling summary, and on exit the recorded frames are written as a 
+          Chrome trace (profile_trace.json) if the profiler was used.
+
+        * Picking: A left click casts a ray from the center of the view into the scene 
+          (Scene.raycaster) and prints what it hit.
+
+        * Walk Mode: With walk=True (toggled with F6), the camera walks on the ground and collides 
+          with the scene's objects instead of flying. The collision queries are timed as the 
+          'collision' profiler scope, with a budget of COLLISION_BUDGET_MS per frame.
+
+        * Texture Budget: With a texture_budget (in MB), the textures loaded from files are kept 
+          within it by shrinking and evicting the least recently used ones, which are reloaded 
+          when an object using them is drawn again.
+
+        * Lights: With lights=True, the scene gets campfires and vehicle headlights, shaded with 
+          clustered forward lighting (light_clusters.py).
+
+        * Frame Capture: With a capture directory, every rendered frame is recorded into it (as PNG 
+          files or one raw video file) through a ring of pixel buffers and a writer thread 
+          (capture.py), so recording does not stall the frame.
+
+        * Headless Mode: With headless=True there is no window: the engine renders into an 
+          offscreen framebuffer of a standalone context (self.framebuffer, which is otherwise the 
+          screen), e.g. for the workers of the render farm (render_farm.py).
+
+        * Startup Report: Every phase of the startup, and the work on every asset (OBJ parsing, 
+          NumPy conversion, mesh optimization, buffer uploads, PNG decoding, mipmaps, shader 
+          compilation, object construction), is timed in self.startup (startup.py). With 
+          startup_report=True, the breakdown is printed (with the meshes' vertex cache miss ratios 
+          before and after optimization) and written as a Chrome trace (STARTUP_TRACE_PATH).
+
+        * Warm Start: What the startup derives from the asset files (parsed and optimized meshes, decoded 
+          images, generated layouts, mesh BVHs) is kept in the warm_cache directory (CACHE_DIR by default, 
+          None to disable it), so the next launch reads it back instead of deriving it again.
+
+        * GPU Memory: F7 prints the GPU memory registry's report (gpu_memory.py): every buffer, 
+          texture and framebuffer the engine allocated, largest first, with the totals by kind.
+
+        * Shader Hot-Reload: With hot_reload=True, edited shader files are recompiled and swapped 
+          in while the engine runs, and F5 reloads every shader. A shader that fails to compile 
+          prints its error and the previous program stays in use.
     """
 
 
-    def __init__(self, win_size=(1600, 900)):
-        # Initialize pygame modules
-        pg.init()
+    def __init__(self, win_size=(1600, 900), seed=None, profile=False, scene_file=None, frame_mode='capped',
+                 pipelined=False, resolution_target=None, precompile_shaders=False, hot_reload=False,
+                 terrain=False, density=1.0, instanced=None, walk=False, texture_budget=None, lights=False,
+                 capture=None, capture_format='png', headless=False, warm_cache=CACHE_DIR, startup_report=False):
+        # Trace of where the startup's time goes
+        self.startup = StartupTrace()
+        startup = self.startup.phase
+
+        # Initialize pygame modules (without a window, SDL's dummy video driver only serves image loading)
+        self.headless = headless
+        if headless:
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        with startup('pygame'):
+            pg.init()
         
         # Window size
         self.WIN_SIZE = win_size
@@ -54,75 +147,292 @@ class GraphicsEngine:
         pg.display.gl_set_attribute(pg.GL_CONTEXT_MINOR_VERSION, 3)
         pg.display.gl_set_attribute(pg.GL_CONTEXT_PROFILE_MASK, pg.GL_CONTEXT_PROFILE_CORE)
         
-        # Create OpenGL context
-        self.screen = pg.display.set_mode(self.WIN_SIZE, flags=pg.OPENGL | pg.DOUBLEBUF)
+        # Create OpenGL context (with vsync if asked for and the driver allows it)
+        self.frame_mode = frame_mode
+        self.screen = None
+        with startup('window'):
+            if headless:
+                self.screen = pg.display.set_mode((1, 1))
+            elif frame_mode == 'vsync':
+                try:
+                    self.screen = pg.display.set_mode(self.WIN_SIZE, flags=pg.OPENGL | pg.DOUBLEBUF, vsync=1)
+                except pg.error as error:
+                    print(f'vsync is not available ({error}), falling back to a capped frame rate')
+                    self.frame_mode = 'capped'
+            if self.screen is None:
+                self.screen = pg.display.set_mode(self.WIN_SIZE, flags=pg.OPENGL | pg.DOUBLEBUF)
         
         # Mouse settings
-        pg.event.set_grab(True)
-        pg.mouse.set_visible(False)
+        if not headless:
+            pg.event.set_grab(True)
+            pg.mouse.set_visible(False)
         
-        # Detect and use existing OpenGL context
-        self.ctx = mgl.create_context()
+        # Detect and use existing OpenGL context (or create a standalone one rendering into an offscreen
+        # framebuffer when headless); frames are drawn into self.framebuffer
+        with startup('context'):
+            if headless:
+                self.ctx = mgl.create_context(standalone=True, **HEADLESS_CONTEXT)
+                self.framebuffer = self.ctx.simple_framebuffer(self.WIN_SIZE)
+                self.framebuffer.use()
+            else:
+                self.ctx = mgl.create_context()
+                self.framebuffer = self.ctx.screen
+
+        # Every part of the engine times its startup work in the trace, and reads what it can from the
+        # warm-start cache (None disables it)
+        install_startup(self.ctx, self.startup, WarmStartCache(warm_cache, self.startup))
         # self.ctx.front_face = 'cw'  # Uncomment if needed
         self.ctx.enable(flags=mgl.DEPTH_TEST | mgl.CULL_FACE)
         
-        # Create an object to help track time
+        # Create an object to help track time (delta_time is the fixed simulation step)
         self.clock = pg.time.Clock()
         self.time = 0
-        self.delta_time = 0
+        self.delta_time = TICK_MS
+        self.frame_time = 0
+        self.accumulator = 0.0
+
+        # Clear color and the GPU frame time the resolution is scaled to hold (None for a fixed resolution)
+        self.clear_color = (0.08, 0.16, 0.18)
+        self.resolution_target = resolution_target
+
+        # Frame profiler (CPU timers and GPU timer queries)
+        self.profiler = Profiler(self.ctx, enabled=profile)
+        self.profiler.set_budget('collision', COLLISION_BUDGET_MS)
+        self.trace_path = 'profile_trace.json'
         
         # Initialize light
-        self.light = Light()
+        with startup('light'):
+            self.light = Light()
         
         # Initialize camera
-        self.camera = Camera(self)
+        with startup('camera'):
+            self.camera = Camera(self)
+        self.camera.walk = walk
         
-        # Initialize mesh
-        self.mesh = Mesh(self)
+        # GPU memory (in MB) the textures loaded from files are kept within (None for no limit)
+        self.texture_budget = texture_budget
+
+        # Defines of the default shader programs (the clustered lights are only shaded in scenes with lights)
+        self.shader_defines = {'CLUSTERED_LIGHTS': 1} if lights else {}
+
+        # Initialize mesh (and compile the declared shader variants up front if asked to)
+        with startup('mesh'):
+            self.mesh = Mesh(self)
+        if precompile_shaders:
+            with startup('shader precompile'):
+                self.mesh.vao.program.precompile()
         
-        # Initialize scene
-        self.scene = Scene(self)
+        # Initialize scene (a seed makes object placement reproducible, density multiplies the generated
+        # objects, a scene file is bulk-loaded (or instanced=True forces it), and the terrain replaces
+        # the flat ground planes, and lights adds campfires and headlights)
+        with startup('scene'):
+            self.scene = Scene(self, seed=seed, scene_file=scene_file, instanced=instanced, terrain=terrain,
+                               density=density, lights=lights)
         
         # Initialize renderer
-        self.scene_renderer = SceneRenderer(self)
+        with startup('renderer'):
+            self.scene_renderer = SceneRenderer(self)
 
+        # Pipeline overlapping the next frame's update with this frame's rendering (if enabled)
+        self.pipeline = FramePipeline(self) if pipelined else None
+
+        # Events that read or change the scene (picks, walk toggles), handled while no frame is being prepared
+        self.scene_events = []
+
+        # Shader file watcher (if enabled)
+        self.shader_reloader = ShaderReloader(self) if hot_reload else None
+
+        # Recording of the rendered frames into a directory (if enabled)
+        self.capture = FrameCapture(self.ctx, self.WIN_SIZE, capture, capture_format, fps=FPS_CAP) if capture else None
+
+        # End of the startup: report where its time went (if asked to) and write its Chrome trace
+        self.startup.finish()
+        if startup_report:
+            self.startup.print_report()
+            get_warm_cache(self.ctx).print_report()
+            self.mesh.vao.vbo.print_optimization_report()
+            self.startup.export_chrome_trace(STARTUP_TRACE_PATH)
 
     # Check for quit events
     def check_events(self):
         for event in pg.event.get():
             if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
+                if self.pipeline:
+                    self.pipeline.destroy()
+                if self.capture:
+                    self.capture.finish()
+                if self.profiler.events:
+                    self.profiler.export_chrome_trace(self.trace_path)
+                self.profiler.destroy()
+                self.scene.destroy()
                 self.mesh.destroy()
                 self.scene_renderer.destroy()
                 pg.quit()
                 sys.exit()
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                self.profiler.set_enabled(not self.profiler.enabled)
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F4:
+                self.profiler.print_summary()
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F5 and self.shader_reloader:
+                self.shader_reloader.reload(self.shader_reloader.get_mtimes().keys())
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F6:
+                self.scene_events.append(self.toggle_walk)
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F7:
+                get_gpu_memory(self.ctx).print_report()
+            elif event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
+                self.scene_events.append(self.pick)
+
+        # Without a pipeline no frame is being prepared, so the scene events can be handled right away
+        if not self.pipeline:
+            self.handle_scene_events()
+
+        # Swap in shaders edited since the last check (on the main thread, which owns the context)
+        if self.shader_reloader:
+            self.shader_reloader.poll()
 
 
-    # Render the scene
-    def render(self):
+    # Handle the queued events that read or change the scene (the pipeline calls this while its worker is idle)
+    def handle_scene_events(self):
+        events, self.scene_events = self.scene_events, []
+        for handle in events:
+            handle()
+
+    # Switch the camera between walking and flying
+    def toggle_walk(self):
+        self.camera.walk = not self.camera.walk
+
+    # Pick the object under the crosshair and print it
+    def pick(self):
+        with self.profiler.cpu('raycast'):
+            hit = self.scene.raycaster.pick()
+        print(f'picked {hit}, normal {tuple(round(n, 2) for n in hit.normal)}' if hit else 'picked nothing')
+
+    # Render the scene (from a packet prepared ahead of time, if given)
+    def render(self, packet=None):
+        profiler = self.profiler
+
         # Clear the framebuffer
-        self.ctx.clear(color=(0.08, 0.16, 0.18))
+        with profiler.cpu('clear'):
+            self.ctx.clear(color=self.clear_color)
         
         # Render the scene using the renderer
-        self.scene_renderer.render()
+        with profiler.cpu('SceneRenderer.render'):
+            self.scene_renderer.render(packet)
         
-        # Swap buffers
-        pg.display.flip()
+        # Start reading the frame back for the recording
+        if self.capture:
+            with profiler.cpu('capture'):
+                self.capture.capture(self.framebuffer)
+
+        # Swap buffers (there are none to swap without a window)
+        if not self.headless:
+            with profiler.cpu('display.flip'):
+                pg.display.flip()
 
     # Get the current time
     def get_time(self):
         self.time = pg.time.get_ticks() * 0.001
 
+    # Wait for the frame rate limit and return the frame time in milliseconds
+    def tick_clock(self):
+        with self.profiler.cpu('clock.tick'):
+            self.frame_time = self.clock.tick(FPS_CAP if self.frame_mode == 'capped' else 0)
+        return self.frame_time
+
+    # Advance the simulation by one fixed step
+    def simulate(self, keys=None, mouse_rel=None):
+        self.camera.tick(keys, mouse_rel)
+
+    # Run every simulation step that is due after frame_time milliseconds and
+    # return how far (0 to 1) the frame is into the next step
+    def advance(self, frame_time, keys=None, mouse_rel=None):
+
+        # Clamp the frame time so spikes do not snowball
+        self.accumulator += min(frame_time, MAX_FRAME_TIME)
+        while self.accumulator >= TICK_MS:
+            self.simulate(keys, mouse_rel)
+            self.accumulator -= TICK_MS
+
+            # The mouse motion of a snapshot is only applied once
+            mouse_rel = None if mouse_rel is None else (0, 0)
+        return self.accumulator / TICK_MS
+
+    # Run a single frame: pace it, catch the simulation up, and render an interpolated state
+    def step(self):
+        if self.pipeline:
+            self.pipeline.step()
+            return
+
+        profiler = self.profiler
+        profiler.begin_frame()
+        frame_time = self.tick_clock()
+
+        self.get_time()
+        with profiler.cpu('check_events'):
+            self.check_events()
+
+        # Run every simulation step that is due
+        with profiler.cpu('simulate'):
+            alpha = self.advance(frame_time)
+
+        # Show the camera between the last two simulation states
+        self.camera.interpolate(alpha)
+        self.render()
+        profiler.end_frame()
+
     # Run the graphics engine loop
     def run(self):
+        self.clock.tick()
         while True:
-            self.get_time()
-            self.check_events()
-            self.camera.update()
-            self.render()
-            self.delta_time = self.clock.tick(60)
+            self.step()
 
 # Entry point for the program
 if __name__ == '__main__':
+    # Optional settings: a seed for the generated world, or a scene file to load
+    parser = argparse.ArgumentParser(description='3D World')
+    parser.add_argument('--seed', type=int, help='seed for the scene generators')
+    parser.add_argument('--scene', help='scene file to load instead of generating the world')
+    parser.add_argument('--profile', action='store_true', help='start with the frame profiler enabled')
+    parser.add_argument('--frame-mode', choices=FRAME_MODES, default='capped',
+                        help=f'capped ({FPS_CAP} FPS), uncapped, or vsync')
+    parser.add_argument('--pipelined', action='store_true',
+                        help="update the next frame on a worker thread while rendering this one")
+    parser.add_argument('--dynamic-resolution', type=float, nargs='?', const=1000 / FPS_CAP, metavar='TARGET_MS',
+                        help='scale the render resolution to hold a GPU frame time (default: one frame at the FPS cap)')
+    parser.add_argument('--precompile-shaders', action='store_true',
+                        help='compile every declared shader variant at startup')
+    parser.add_argument('--hot-reload', action='store_true',
+                        help='recompile shaders when their files change (F5 reloads all of them)')
+    parser.add_argument('--terrain', action='store_true',
+                        help='replace the flat ground planes with a heightmap terrain')
+    parser.add_argument('--density', type=float, default=1.0,
+                        help='multiplier of the number of generated objects')
+    parser.add_argument('--instanced', action='store_true',
+                        help='draw the generated objects as one instanced model per type')
+    parser.add_argument('--walk', action='store_true',
+                        help='walk on the ground and collide with objects instead of flying (F6 toggles)')
+    parser.add_argument('--texture-budget', type=float, metavar='MB',
+                        help='GPU memory the textures are kept within (least recently used ones are shrunk or evicted)')
+    parser.add_argument('--capture', metavar='DIR',
+                        help='record every frame into DIR (read back asynchronously and written on a background thread)')
+    parser.add_argument('--capture-format', choices=FORMATS, default='png',
+                        help='write the frames as a PNG sequence or as one raw RGB video file')
+    parser.add_argument('--lights', action='store_true',
+                        help='add campfires by the tents and headlights on the vehicles (clustered point and spot lights)')
+    parser.add_argument('--startup-report', action='store_true',
+                        help=f'print where the startup time went and write it as a Chrome trace ({STARTUP_TRACE_PATH})')
+    parser.add_argument('--warm-cache', default=CACHE_DIR, metavar='DIR',
+                        help=f'directory of the warm-start cache of parsed and decoded assets (default: {CACHE_DIR})')
+    parser.add_argument('--no-warm-cache', action='store_true', help='derive every asset again, without the cache')
+    args = parser.parse_args()
+
     # Create an instance of the GraphicsEngine and run the application
-    app = GraphicsEngine((640, 640))
+    app = GraphicsEngine((640, 640), seed=args.seed, profile=args.profile, scene_file=args.scene,
+                         frame_mode=args.frame_mode, pipelined=args.pipelined,
+                         resolution_target=args.dynamic_resolution, precompile_shaders=args.precompile_shaders,
+                         hot_reload=args.hot_reload, terrain=args.terrain, density=args.density,
+                         instanced=args.instanced or None, walk=args.walk, texture_budget=args.texture_budget,
+                         lights=args.lights, capture=args.capture, capture_format=args.capture_format,
+                         warm_cache=None if args.no_warm_cache else args.warm_cache,
+                         startup_report=args.startup_report)
     app.run()
@@ -1,5 +1,6 @@
 from vao import VAO
 from texture import Texture
+from startup import get_startup_trace
 
 # Mesh class responsible for managing vertex array objects (VAO) and textures
 class Mesh:
@@ -30,8 +31,10 @@ class Mesh:
         self.app = app
         
         # Initialize Vertex Array Object (VAO) and Texture
-        self.vao = VAO(app.ctx)
-        self.texture = Texture(app)
+        with get_startup_trace(app.ctx).phase('vao'):
+            self.vao = VAO(app.ctx, app.shader_defines)
+        with get_startup_trace(app.ctx).phase('textures'):
+            self.texture = Texture(app)
 
     # Destroy the VAO and Texture
     def destroy(self):
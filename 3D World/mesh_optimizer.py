@@ -0,0 +1,197 @@
+import argparse
+import glob
+import sys
+from collections import deque
+import numpy as np
+
+# Entries of the post-transform vertex cache the triangle order is optimized for (and ACMR is measured with)
+CACHE_SIZE = 16
+
+# Triangles a cluster needs before the overdraw pass may start a new one
+MIN_CLUSTER = 16
+
+# Statistics of an optimized mesh, in the order of its report array
+REPORT_KEYS = ('triangles', 'source_vertices', 'vertices', 'acmr_before', 'acmr_after')
+
+
+# Get the vertices of a triangle list without duplicates (in order of first appearance), and the
+# indices of its triangles' corners into them
+def deduplicate(vertex_data, components):
+    vertices = np.ascontiguousarray(np.asarray(vertex_data, dtype='f4').reshape(-1, components))
+    rows = vertices.view(np.dtype((np.void, components * 4))).ravel()
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    remap = np.empty(len(order), dtype='u4')
+    remap[order] = np.arange(len(order), dtype='u4')
+    return vertices[first[order]], remap[inverse.ravel()]
+
+
+# Get the average cache miss ratio (vertices transformed per triangle) of drawing indices through a
+# FIFO post-transform cache of cache_size vertices (3.0 means every corner is transformed again)
+def get_acmr(indices, cache_size=CACHE_SIZE):
+    if len(indices) < 3:
+        return 0.0
+    cache = deque()
+    cached = set()
+    misses = 0
+    for index in indices.tolist():
+        if index in cached:
+            continue
+        misses += 1
+        cache.append(index)
+        cached.add(index)
+        if len(cache) > cache_size:
+            cached.discard(cache.popleft())
+    return misses / (len(indices) // 3)
+
+
+# Get the triangles (indices) reordered for the post-transform vertex cache with Tipsify (Sander et al.,
+# "Fast Triangle Reordering for Vertex Locality and Reduced Overdraw"), and the triangle the output's
+# clusters start at (where the fan ran into a dead end and the cache starts over)
+def optimize_vertex_cache(indices, vertex_count, cache_size=CACHE_SIZE):
+    triangle_count = len(indices) // 3
+    triangles = indices.reshape(-1, 3).tolist()
+
+    # Triangles using each vertex, and the live (not yet emitted) ones per vertex
+    counts = np.bincount(indices, minlength=vertex_count)
+    starts = np.concatenate(([0], np.cumsum(counts))).tolist()
+    adjacency = (np.argsort(indices, kind='stable') // 3).tolist()
+    live = counts.tolist()
+
+    # Time each vertex last entered the cache, the clock, emitted triangles and the dead-end stack
+    timestamps = [0] * vertex_count
+    clock = cache_size + 1
+    emitted = [False] * triangle_count
+    dead_end = []
+    cursor = 0
+    output = []
+    clusters = [0]
+
+    fanning = 0 if vertex_count else -1
+    while fanning >= 0:
+
+        # Emit every live triangle around the fanning vertex
+        candidates = []
+        for triangle in adjacency[starts[fanning]:starts[fanning + 1]]:
+            if emitted[triangle]:
+                continue
+            emitted[triangle] = True
+            corners = triangles[triangle]
+            output.extend(corners)
+            for vertex in corners:
+                dead_end.append(vertex)
+                candidates.append(vertex)
+                live[vertex] -= 1
+                if clock - timestamps[vertex] > cache_size:
+                    timestamps[vertex] = clock
+                    clock += 1
+
+        # Fan next around the candidate that stays longest in the cache (while its triangles are drawn)
+        fanning, priority = -1, -1
+        for vertex in candidates:
+            if live[vertex] > 0:
+                age = clock - timestamps[vertex]
+                score = age if age + 2 * live[vertex] <= cache_size else 0
+                if score > priority:
+                    fanning, priority = vertex, score
+        if fanning >= 0:
+            continue
+
+        # Dead end: go back to the latest vertex with live triangles, or on to the next one in order
+        while dead_end and fanning < 0:
+            vertex = dead_end.pop()
+            if live[vertex] > 0:
+                fanning = vertex
+        while fanning < 0 and cursor < vertex_count:
+            if live[cursor] > 0:
+                fanning = cursor
+            cursor += 1
+        if fanning >= 0 and len(output) // 3 - clusters[-1] >= MIN_CLUSTER:
+            clusters.append(len(output) // 3)
+
+    return np.array(output, dtype='u4'), clusters
+
+
+# Get the clusters of a triangle order sorted to reduce overdraw: clusters facing out from the mesh's
+# centre are drawn first, so they tend to hide the ones behind them from any viewpoint
+def optimize_overdraw(indices, positions, clusters):
+    triangles = indices.reshape(-1, 3)
+    if len(clusters) < 2:
+        return indices
+    corners = positions[triangles]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    areas = np.linalg.norm(normals, axis=1)
+    centroids = corners.mean(axis=1)
+    centre = centroids.mean(axis=0)
+
+    # Area-weighted centroid and normal of every cluster
+    weights = np.maximum(np.add.reduceat(areas, clusters), 1e-12)
+    cluster_centroids = np.add.reduceat(centroids * areas[:, None], clusters) / weights[:, None]
+    cluster_normals = np.add.reduceat(normals, clusters)
+    scores = np.einsum('ij,ij->i', cluster_centroids - centre, cluster_normals)
+    scores /= np.maximum(np.linalg.norm(cluster_normals, axis=1), 1e-12)
+
+    bounds = list(clusters) + [len(triangles)]
+    order = np.argsort(-scores, kind='stable')
+    return np.concatenate([triangles[bounds[i]:bounds[i + 1]] for i in order]).ravel()
+
+
+# Get the vertices renumbered in the order the indices first use them (so they are fetched front to
+# back), and the indices into them
+def optimize_vertex_fetch(vertices, indices):
+    _, first = np.unique(indices, return_index=True)
+    order = np.unique(indices)[np.argsort(first)]
+    remap = np.zeros(len(vertices), dtype='u4')
+    remap[order] = np.arange(len(order), dtype='u4')
+    return vertices[order], remap[indices]
+
+
+# Get a triangle list (vertex_data of components floats a vertex, positions last) as deduplicated
+# vertices and indices ordered for the vertex cache, overdraw and vertex fetch
+# Returns the vertices, the indices and the report array (REPORT_KEYS)
+def optimize_mesh(vertex_data, components, cache_size=CACHE_SIZE):
+    source_vertices = np.asarray(vertex_data, dtype='f4').size // components
+    vertices, indices = deduplicate(vertex_data, components)
+    acmr_before = get_acmr(indices, cache_size)
+    indices, clusters = optimize_vertex_cache(indices, len(vertices), cache_size)
+    indices = optimize_overdraw(indices, vertices[:, -3:], clusters)
+    vertices, indices = optimize_vertex_fetch(vertices, indices)
+    report = np.array([len(indices) // 3, source_vertices, len(vertices), acmr_before, get_acmr(indices, cache_size)],
+                      dtype='f8')
+    return vertices, indices, report
+
+
+# Get a report array as a dictionary
+def get_report(report):
+    return dict(zip(REPORT_KEYS, report.tolist()))
+
+
+# Print the optimization reports of meshes by name
+def print_reports(reports):
+    print(f"{'mesh':<28} {'triangles':>9} {'vertices':>15} {'ACMR before':>11} {'after':>6}")
+    for name, report in reports.items():
+        print(f"{name:<28} {report['triangles']:>9.0f} {report['source_vertices']:>7.0f} -> {report['vertices']:<5.0f} "
+              f"{report['acmr_before']:>11.3f} {report['acmr_after']:>6.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Report the vertex cache efficiency (ACMR) of Wavefront .obj '
+                                                 'meshes before and after optimization.')
+    parser.add_argument('paths', nargs='*', help='.obj files (default: objects/*.obj)')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='post-transform cache entries')
+    args = parser.parse_args(argv)
+
+    import pywavefront
+    reports = {}
+    for path in args.paths or sorted(glob.glob('objects/*.obj')):
+        material = pywavefront.Wavefront(path, cache=True, parse=True).materials.popitem()[1]
+        components = material.vertex_size
+        report = optimize_mesh(np.array(material.vertices, dtype='f4'), components, args.cache_size)[2]
+        reports[path] = get_report(report)
+    print_reports(reports)
+    return 0
+
+
+# Entry point for the mesh report
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,8 @@
 import moderngl as mgl
 import numpy as np
 import glm
+from gpu_memory import get_gpu_memory
+from culling import transform_boxes
 
 """
 PARENT OBJECTS
@@ -39,6 +41,12 @@ class BaseModel:
         object using its associated VAO.
     """
 
+    # Number of instances drawn by a single render call
+    instance_count = 1
+
+    # Whether the object is drawn into the shadow map
+    casts_shadows = True
+
     # Constructor for an object in the 3D scene
     def __init__(self, app, vao_name, tex_id, pos=(0, 0, 0), rot=(0, 0, 0), scale=(1, 1, 1)):
 
@@ -112,7 +120,7 @@ class ExtendedBaseModel(BaseModel):
 
         # Bind the texture and update shader uniforms for rendering
         self.texture.use(location=0)
-        self.program['camPos'].write(self.camera.position)
+        self.program['camPos'].write(self.camera.view_position)
         self.program['m_view'].write(self.camera.m_view)
         self.program['m_model'].write(self.m_model)
 
@@ -205,6 +213,10 @@ class Grass(ExtendedBaseModel):
 
 # Define a class named GrassPatch that inherits from ExtendedBaseModel
 class GrassPatch(ExtendedBaseModel):
+
+    # Flat ground cover, whose shadow would never be seen
+    casts_shadows = False
+
     # Constructor method to initialize the GrassPatch object
     def __init__(self, app, vao_name='grasspatch', tex_id='grasspatch',
                  pos=(0, -0.75, 0), rot=(0, 0, 0), scale=(0.1, 0.1, 0.1)):
@@ -332,6 +344,190 @@ class MovingCube(Cube):
         # Call the update method of the base class (Cube) to perform additional updates
         super().update()
 
+"""
+INSTANCED OBJECTS
+"""
+
+# InstancedModel class, inheriting from ExtendedBaseModel
+class InstancedModel(ExtendedBaseModel):
+
+    """
+    draws every placement of one model type 
+    with a single instanced draw call. Instead 
+    of a single m_model uniform, the model 
+    matrices of all instances are stored in an 
+    instance buffer that feeds the in_instance_model 
+    attribute of the instanced shaders.
+
+        * Constructor: Takes the VAO name and texture ID 
+        of the model type, a TransformStore and the range 
+        (start, end) of its transforms that are instances 
+        of this model. A whole scene can share one store, 
+        so that transforms of different model types can be 
+        parented to each other. It uploads the model matrices 
+        and builds instanced VAOs for the main and shadow passes.
+
+        * Syncing Instances: get_instance_update takes the range 
+        of transforms that the last TransformStore.update changed 
+        and copies out only the model matrices that overlap this 
+        model's instances, and write_instances uploads them. The 
+        copy can be made on a worker thread while the upload 
+        stays with the OpenGL context.
+
+        * Rendering: render and render_shadow draw the 
+        instances with one draw call each.
+
+        * Culling: get_visible_instances culls every instance's 
+        world box against the camera's frustum and copies out 
+        the model matrices of the ones in view. They are 
+        uploaded to a second instance buffer (visible_vbo) 
+        by write_visible_instances, which the main pass draws 
+        from, so instances out of view cost nothing there.
+
+        * Shadow Casting: get_instance_bounds transforms the 
+        mesh bounds by every instance's model matrix in one 
+        batch (kept until the instances move), and has_casters 
+        tells the renderer whether any instance large enough 
+        reaches the light's frustum. As the instances are drawn 
+        together, the shadow pass keeps or skips them as a whole.
+    """
+
+    def __init__(self, app, vao_name, tex_id, transforms, start=0, end=None):
+
+        # Reference to the application and the camera
+        self.app = app
+        self.camera = app.camera
+
+        # Texture ID and Vertex Array Object (VAO) information
+        self.tex_id = tex_id
+        self.vao_name = vao_name
+
+        # Transforms of the instances (a range of the store) and the instance buffer holding their model matrices
+        self.transforms = transforms
+        self.start = start
+        self.end = len(transforms) if end is None else end
+        transforms.update()
+        matrices = transforms.get_matrices()[self.start:self.end]
+        self.instance_vbo = app.ctx.buffer(reserve=max(matrices.nbytes, 64), dynamic=True)
+        self.instance_vbo.write(matrices)
+        get_gpu_memory(app.ctx).add_buffer(f'instances {vao_name}', self.instance_vbo)
+        self.mesh_bounds = app.mesh.vao.vbo.vbos[vao_name].bounds
+        self.instance_bounds = None
+
+        # Model matrices of the instances in view (drawn by the main pass, while the shadow pass draws every
+        # instance from the instance buffer), and their number
+        self.visible_vbo = app.ctx.buffer(reserve=max(matrices.nbytes, 64), dynamic=True)
+        self.visible_count = 0
+        get_gpu_memory(app.ctx).add_buffer(f'visible instances {vao_name}', self.visible_vbo)
+        self.vao, self.shadow_vao = app.mesh.vao.get_instanced_vaos(vao_name, self.visible_vbo, self.instance_vbo)
+
+        self.program = self.vao.program
+        self.shadow_program = self.shadow_vao.program
+
+        self.on_init()
+
+    # Number of instances drawn by a single render call
+    @property
+    def instance_count(self):
+        return self.end - self.start
+
+    # Method to copy the model matrices of the instances within the changed (start, end) range of the store
+    # Returns (first instance, matrices), or None if none of this model's instances changed
+    def get_instance_update(self, changed):
+        if changed is None:
+            return None
+        start, end = max(changed[0], self.start), min(changed[1], self.end)
+        if start >= end:
+            return None
+        self.instance_bounds = None
+        return start - self.start, self.transforms.get_matrices()[start:end].copy()
+
+    # Method to get the world boxes of the instances as (N, 3) arrays of minimums and maximums
+    def get_instance_bounds(self):
+        if self.instance_bounds is None:
+            matrices = self.transforms.get_matrices()[self.start:self.end]
+            count = len(matrices)
+            b_min = np.broadcast_to(np.array(self.mesh_bounds[0], dtype='f4'), (count, 3))
+            b_max = np.broadcast_to(np.array(self.mesh_bounds[1], dtype='f4'), (count, 3))
+            self.instance_bounds = transform_boxes(matrices, b_min, b_max)
+        return self.instance_bounds
+
+    # Method to tell whether any instance at least min_size across (its largest side) is in a frustum
+    def has_casters(self, frustum, min_size=0.0):
+        b_min, b_max = self.get_instance_bounds()
+        large = (b_max - b_min).max(axis=1) >= min_size
+        return bool(large.any() and frustum.cull_boxes(b_min[large], b_max[large]).any())
+
+    # Method to copy the model matrices of the instances in a frustum (None if none of them is in it)
+    def get_visible_instances(self, frustum):
+        b_min, b_max = self.get_instance_bounds()
+        visible = frustum.cull_boxes(b_min, b_max)
+        if not visible.any():
+            return None
+        return self.transforms.get_matrices()[self.start:self.end][visible]
+
+    # Method to upload model matrices to the instance buffer, starting at the given instance
+    def write_instances(self, first, matrices):
+        self.instance_vbo.write(matrices, offset=first * matrices.itemsize * 16)
+
+    # Method to upload the model matrices of the instances in view, drawn by the main pass
+    def write_visible_instances(self, matrices):
+        self.visible_vbo.write(matrices)
+        self.visible_count = len(matrices)
+
+    # Method to update the shader uniforms for rendering
+    def update(self):
+        self.texture.use(location=0)
+        self.program['camPos'].write(self.camera.view_position)
+        self.program['m_view'].write(self.camera.m_view)
+
+    # The model matrices live in the instance buffer, so there is nothing to update for shadows
+    def update_shadow(self): ...
+
+    # Method to render the instances in view
+    def render(self):
+        self.update()
+        self.vao.render(instances=self.visible_count)
+
+    # Method to render all instances for shadow mapping
+    def render_shadow(self):
+        self.shadow_vao.render(instances=self.instance_count)
+
+    # Method to perform additional initialization
+    def on_init(self):
+
+        # Light and shadow uniforms for the main rendering program
+        self.program['m_view_light'].write(self.app.light.m_view_light)
+        self.program['u_resolution'].write(glm.vec2(self.app.WIN_SIZE))
+        self.depth_texture = self.app.mesh.texture.textures['depth_texture']
+        self.program['shadowMap'] = 1
+        self.depth_texture.use(location=1)
+
+        # Shadow mapping program
+        self.shadow_program['m_proj'].write(self.camera.m_proj)
+        self.shadow_program['m_view_light'].write(self.app.light.m_view_light)
+
+        # Texture and projection for the main rendering program
+        self.texture = self.app.mesh.texture.textures[self.tex_id]
+        self.program['u_texture_0'] = 0
+        self.texture.use(location=0)
+        self.program['m_proj'].write(self.camera.m_proj)
+        self.program['m_view'].write(self.camera.m_view)
+
+        # Light-related shader uniforms
+        self.program['light.position'].write(self.app.light.position)
+        self.program['light.Ia'].write(self.app.light.Ia)
+        self.program['light.Id'].write(self.app.light.Id)
+        self.program['light.Is'].write(self.app.light.Is)
+
+    # Method to release the instance buffers and the instanced VAOs
+    def destroy(self):
+        self.vao.release()
+        self.shadow_vao.release()
+        for buffer in (self.instance_vbo, self.visible_vbo):
+            get_gpu_memory(self.app.ctx).remove(buffer)
+            buffer.release()
+
 """
 SKYBOXES
 """
@@ -0,0 +1,91 @@
+import pygame as pg
+from concurrent.futures import ThreadPoolExecutor
+from scene_renderer import FramePacket
+
+
+# FramePipeline class
+class FramePipeline:
+
+    """
+    overlaps the CPU work of the next frame
+    with the OpenGL submission of the current
+    one. Here's a summary of its key features:
+
+        * Worker Thread: The simulation steps, the scene
+          update, culling, sorting and instance-data packing
+          of a frame (SceneRenderer.prepare) run on a single
+          worker thread. None of them make OpenGL calls, and
+          the NumPy parts release the GIL while they run.
+
+        * Main Thread: Event handling, input snapshots, and
+          all OpenGL calls (SceneRenderer.submit and the buffer
+          swap) stay on the main thread, which owns the context.
+          Events that read or change the scene (picks and walk
+          toggles) are queued by check_events and handled
+          between frames, while the worker is idle.
+
+        * Double-Buffered Packets: Two FramePackets take turns.
+          While the main thread submits frame N from one packet,
+          the worker fills the other with frame N + 1, so the CPU
+          time of a frame tends towards the larger of prepare and
+          submit instead of their sum. The price is one frame of
+          extra input latency.
+    """
+
+    def __init__(self, app):
+
+        # Reference to the application and its renderer
+        self.app = app
+        self.renderer = app.scene_renderer
+
+        # Worker thread, the two packets, and the frame being prepared
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='frame-worker')
+        self.packets = [FramePacket(), FramePacket()]
+        self.index = 0
+        self.pending = None
+
+    # Method to run the simulation and prepare a frame (runs on the worker thread)
+    def prepare(self, packet, frame_time, keys, mouse_rel):
+        app = self.app
+        with app.profiler.cpu('simulate'):
+            alpha = app.advance(frame_time, keys, mouse_rel)
+        m_view, position = app.camera.get_interpolated_view(alpha)
+        self.renderer.prepare(packet, m_view, position)
+        return packet
+
+    # Method to run a single frame
+    def step(self):
+        app = self.app
+        profiler = app.profiler
+        profiler.begin_frame()
+
+        # Pace the frame and handle events on the main thread
+        frame_time = app.tick_clock()
+        app.get_time()
+        with profiler.cpu('check_events'):
+            app.check_events()
+        keys, mouse_rel = pg.key.get_pressed(), pg.mouse.get_rel()
+
+        # The first frame has nothing in flight yet
+        if self.pending is None:
+            self.pending = self.executor.submit(self.prepare, self.packets[self.index], 0, keys, (0, 0))
+
+        # Wait for this frame's packet, and start preparing the next one from this frame's input
+        with profiler.cpu('wait_for_worker'):
+            packet = self.pending.result()
+
+        # The worker is idle until the next frame is started, so the scene can be picked and changed now
+        app.handle_scene_events()
+        self.index ^= 1
+        self.pending = self.executor.submit(self.prepare, self.packets[self.index], frame_time, keys, mouse_rel)
+
+        # Submit this frame while the worker prepares the next
+        app.render(packet)
+        profiler.end_frame()
+
+    # Method to stop the worker thread (after it finishes the frame in flight)
+    def destroy(self):
+        if self.pending is not None:
+            self.pending.result()
+            self.pending = None
+        self.executor.shutdown()
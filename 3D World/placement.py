@@ -0,0 +1,190 @@
+import numpy as np
+
+# Extra candidate cells generated per requested object, so candidates that collide can be replaced
+OVERSAMPLE = 1.5
+
+# Rounds of fresh candidates for the objects whose candidates all collided
+ATTEMPTS = 4
+
+# Smallest cell size of the spatial hash's grids
+MIN_CELL_SIZE = 0.25
+
+# Offset and bit width that turn signed cell coordinates into a single int64 key
+KEY_OFFSET = 1 << 20
+KEY_BITS = 21
+
+
+# SpatialHash class
+class SpatialHash:
+
+    """
+    uniform grids of the footprints (circles on
+    the ground plane) of placed objects, for
+    testing whole batches of new footprints for
+    overlaps at once. Here's a summary of its
+    key features:
+
+        * Grid Levels: Footprints go into the grid whose cell
+          size is the power of two just above their diameter,
+          so small stones and large tents are each bucketed at
+          their own scale and a cell never holds more than a
+          handful of footprints.
+
+        * Sorted Keys: Footprints are bucketed by the cell their
+          center is in. Instead of a dictionary, each grid keeps
+          its cell keys sorted (with the order that sorts them),
+          so finding the footprints in a cell is a binary search,
+          and a whole batch of cells is one np.searchsorted call.
+
+        * Batched Queries: overlaps looks up the cells around
+          each new footprint in the grids of larger footprints
+          (and the other way round for the grids of smaller
+          ones, which probe a grid of the new footprints),
+          expands the matches into pairs with np.repeat and
+          tests their distances in one go.
+    """
+
+    def __init__(self, min_cell_size=MIN_CELL_SIZE):
+
+        # Smallest cell size, and the grids by cell size as [points, radii, sorted keys, order] lists
+        self.min_cell_size = min_cell_size
+        self.grids = {}
+
+    # Number of footprints in the hash
+    def __len__(self):
+        return sum(len(grid[1]) for grid in self.grids.values())
+
+    # Method to get the cell size of the grid holding footprints of a radius
+    def get_cell_size(self, radius):
+        return max(self.min_cell_size, 2.0 ** np.ceil(np.log2(max(2 * radius, 1e-6))))
+
+    # Method to get the keys of (N, 2) grid cells
+    @staticmethod
+    def get_keys(cells):
+        return ((cells[:, 0] + KEY_OFFSET) << KEY_BITS) + (cells[:, 1] + KEY_OFFSET)
+
+    # Method to bucket footprints into a grid: [points, radii, sorted cell keys, order that sorts them]
+    def build_grid(self, points, radii, cell_size):
+        keys = self.get_keys(np.floor(points / cell_size).astype('i8'))
+        order = np.argsort(keys, kind='stable')
+        return [points, radii, keys[order], order]
+
+    # Method to add footprints from (N, 2) centers and (N,) radii
+    def insert(self, points, radii):
+        points = np.asarray(points, dtype='f4')
+        radii = np.broadcast_to(np.asarray(radii, dtype='f4'), (len(points),))
+        cell_sizes = np.array([self.get_cell_size(radius) for radius in radii.tolist()])
+        for cell_size in np.unique(cell_sizes).tolist():
+            mask = cell_sizes == cell_size
+            grid = self.grids.get(cell_size)
+            if grid is not None:
+                self.grids[cell_size] = self.build_grid(np.concatenate([grid[0], points[mask]]),
+                                                        np.concatenate([grid[1], radii[mask]]), cell_size)
+            else:
+                self.grids[cell_size] = self.build_grid(points[mask], radii[mask].copy(), cell_size)
+
+    # Method to find the overlapping (footprint, grid footprint) pairs between footprints and a grid
+    # whose cells are at least as large as the footprints' diameters
+    def find_pairs(self, points, radii, grid, cell_size):
+        grid_points, grid_radii, grid_keys, order = grid
+        cells = np.floor(points / cell_size).astype('i8')
+        pairs = []
+
+        # Visit the footprints in cell order, so the binary searches walk the grid's keys in order
+        visit = np.argsort(self.get_keys(cells), kind='stable')
+        cells = cells[visit]
+
+        # Cells within reach of the largest footprint (the grid's footprints are at most half a cell wide)
+        reach = int(np.ceil((radii.max() + cell_size / 2) / cell_size))
+        for dx in range(-reach, reach + 1):
+            for dz in range(-reach, reach + 1):
+                keys = self.get_keys(cells + (dx, dz))
+                first = np.searchsorted(grid_keys, keys, side='left')
+                counts = np.searchsorted(grid_keys, keys, side='right') - first
+                total = int(counts.sum())
+                if not total:
+                    continue
+
+                # (footprint, grid footprint) pairs for every grid footprint in the cell
+                query = np.repeat(visit, counts)
+                offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                other = order[np.repeat(first, counts) + offsets]
+
+                delta = points[query] - grid_points[other]
+                distance = radii[query] + grid_radii[other]
+                overlap = (delta * delta).sum(axis=1) < distance * distance
+                pairs.append((query[overlap], other[overlap]))
+        return pairs
+
+    # Method to test footprints from (N, 2) centers and (N,) radii against the hash
+    # Returns the mask of the footprints that overlap one already in it
+    def overlaps(self, points, radii):
+        points = np.asarray(points, dtype='f4')
+        radii = np.broadcast_to(np.asarray(radii, dtype='f4'), (len(points),))
+        hits = np.zeros(len(points), dtype=bool)
+        if not len(points):
+            return hits
+
+        # Grids of larger footprints are probed with the new ones, and grids of smaller footprints
+        # probe a grid of the new ones, so the search never spans more than a few cells
+        query_cell_size = self.get_cell_size(float(radii.max()))
+        query_grid = None
+        for cell_size, grid in self.grids.items():
+            if cell_size >= query_cell_size:
+                for query, other in self.find_pairs(points, radii, grid, cell_size):
+                    hits[query] = True
+            else:
+                if query_grid is None:
+                    query_grid = self.build_grid(points, radii, query_cell_size)
+                for other, query in self.find_pairs(grid[0], grid[1], query_grid, query_cell_size):
+                    hits[query] = True
+        return hits
+
+
+# Make count * OVERSAMPLE candidate positions in a rectangle (x_min, x_max, z_min, z_max), one per
+# cell of a jittered grid, in random order; each is kept radius away from its cell's sides, so that
+# (as long as the cells are at least the footprint's diameter across) no two of them overlap
+def jittered_grid(rng, bounds, count, radius=0.0):
+    x_min, x_max, z_min, z_max = bounds
+    width, depth = x_max - x_min, z_max - z_min
+    if count <= 0 or width <= 0 or depth <= 0:
+        return np.zeros((0, 2), dtype='f4')
+
+    # Grid of candidate cells, never narrower than the footprint
+    cell_size = np.sqrt(width * depth / (count * OVERSAMPLE))
+    columns, rows = int(np.ceil(width / cell_size)), int(np.ceil(depth / cell_size))
+    if radius > 0:
+        columns = max(1, min(columns, int(width // (2 * radius))))
+        rows = max(1, min(rows, int(depth // (2 * radius))))
+    cell_width, cell_depth = width / columns, depth / rows
+
+    # One candidate per cell, visiting the cells in random order
+    cells = rng.permutation(columns * rows)
+    margin_x, margin_z = min(radius / cell_width, 0.5), min(radius / cell_depth, 0.5)
+    jitter = rng.random((len(cells), 2))
+    points = np.empty((len(cells), 2), dtype='f4')
+    points[:, 0] = x_min + (cells % columns + margin_x + jitter[:, 0] * (1 - 2 * margin_x)) * cell_width
+    points[:, 1] = z_min + (cells // columns + margin_z + jitter[:, 1] * (1 - 2 * margin_z)) * cell_depth
+    return points
+
+
+# Scatter count objects with a footprint radius over a rectangle (x_min, x_max, z_min, z_max) and
+# return an (N, 2) array of their x, z positions (fewer than count if they do not fit). Footprints of
+# a radius above 0 avoid those in the spatial hash and are added to it, and candidates that collide
+# are replaced from a fresh grid, up to ATTEMPTS times. A radius of 0 places ground cover, which is
+# neither tested nor added.
+def scatter(rng, bounds, count, radius=0.0, spatial_hash=None):
+    if radius <= 0:
+        return jittered_grid(rng, bounds, count)[:count]
+
+    spatial_hash = SpatialHash() if spatial_hash is None else spatial_hash
+    placed, remaining = [], count
+    for attempt in range(ATTEMPTS):
+        points = jittered_grid(rng, bounds, remaining, radius)
+        points = points[~spatial_hash.overlaps(points, radius)][:remaining]
+        spatial_hash.insert(points, radius)
+        placed.append(points)
+        remaining -= len(points)
+        if not remaining or not len(points):
+            break
+    return np.concatenate(placed) if placed else np.zeros((0, 2), dtype='f4')
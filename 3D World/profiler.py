@@ -0,0 +1,259 @@
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+# Profiler settings
+HISTORY = 120  # Frames kept for the rolling summary
+QUERY_LATENCY = 3  # Frames to wait before reading back a GPU timer query
+MAX_TRACE_EVENTS = 200000  # Trace events kept for the Chrome trace export
+
+# Thread ids used for the Chrome trace
+CPU_TID = 1
+GPU_TID = 2
+WORKER_TID = 3
+
+
+# Scope that does nothing (returned while the profiler is disabled)
+class NullScope:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SCOPE = NullScope()
+
+
+# Scope timing a block of CPU work
+class CpuScope:
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add_cpu_sample(self.name, self.start, time.perf_counter())
+        return False
+
+
+# Scope timing a block of GPU work with a timer query
+class GpuScope:
+
+    def __init__(self, profiler, name, query):
+        self.profiler = profiler
+        self.name = name
+        self.query = query
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.query.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.query.__exit__(*exc)
+        self.profiler.pending[-1].append((self.name, self.start, self.query))
+        return False
+
+
+# Profiler class
+class Profiler:
+
+    """
+    collects CPU and GPU timings for each
+    phase of a frame. Here's a summary of
+    its key features:
+
+        * CPU Timers: The cpu method returns a
+          context manager that measures the wall
+          time of the enclosed block with
+          time.perf_counter.
+
+        * GPU Timers: The gpu method wraps the enclosed
+          rendering pass in an OpenGL timer query. Queries
+          come from a small ring per pass and are read back
+          QUERY_LATENCY frames later, when the result is
+          already available, so reading them never stalls
+          the pipeline.
+
+        * Rolling Summary: Per-frame totals of every scope are
+          kept for the last HISTORY frames. The summary method
+          returns their mean and maximum, and print_summary
+          writes them as a table.
+
+        * Chrome Trace Export: Every measured scope is also stored
+          as a trace event, and export_chrome_trace writes them as
+          Chrome trace-event JSON (open it in chrome://tracing or
+          Perfetto). CPU scopes measured off the main thread (e.g.
+          by the frame pipeline's worker) get their own track.
+
+        * Worker Threads: CPU scopes may finish on any thread. The
+          frame totals are guarded by a lock, and end_frame swaps them
+          out for an empty set, so a scope finishing between two frames
+          (as the worker's often do) counts toward the next frame
+          instead of being lost.
+
+        * Budgets: set_budget gives a scope a per-frame budget in
+          milliseconds. Frames whose total for the scope goes over
+          it are counted (over_budget), and print_summary shows the
+          budget and the count next to the scope.
+
+        * Negligible Overhead: While disabled, cpu and gpu return a
+          shared no-op scope, so instrumented code costs one method
+          call per scope.
+    """
+
+    def __init__(self, ctx, enabled=False, history=HISTORY, latency=QUERY_LATENCY):
+
+        # Reference to the context (for timer queries) and settings
+        self.ctx = ctx
+        self.enabled = enabled
+        self.latency = latency
+
+        # Rolling per-frame totals (in milliseconds) for every scope, the totals of the frame being
+        # measured, and the lock guarding them (scopes finish on worker threads too)
+        self.history = defaultdict(lambda: deque(maxlen=history))
+        self.frame_totals = defaultdict(float)
+        self.lock = threading.Lock()
+
+        # Per-frame budgets (in milliseconds) of scopes, and the number of frames that went over them
+        self.budgets = {}
+        self.over_budget = defaultdict(int)
+
+        # GPU timer queries: a pool of free queries and the queries issued in recent frames
+        self.free_queries = []
+        self.pending = deque()
+
+        # GPU time of the most recently resolved frame, and the number of frames resolved
+        self.last_gpu_frame_ms = 0.0
+        self.gpu_frames = 0
+
+        # Trace events for the Chrome trace export
+        self.events = deque(maxlen=MAX_TRACE_EVENTS)
+        self.origin = time.perf_counter()
+        self.frame_start = None
+        self.frame_index = 0
+
+    # Method to turn the profiler on or off
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        if not enabled:
+            self.flush_queries()
+            with self.lock:
+                self.frame_totals.clear()
+
+    # Method to give a scope a per-frame budget in milliseconds
+    def set_budget(self, name, budget_ms):
+        self.budgets[name] = budget_ms
+
+    # Method to get a scope timing CPU work
+    def cpu(self, name):
+        if not self.enabled:
+            return NULL_SCOPE
+        return CpuScope(self, name)
+
+    # Method to get a scope timing GPU work (a rendering pass)
+    def gpu(self, name):
+        if not self.enabled or self.frame_start is None:
+            return NULL_SCOPE
+        query = self.free_queries.pop() if self.free_queries else self.ctx.query(time=True)
+        return GpuScope(self, name, query)
+
+    # Method to mark the start of a frame
+    def begin_frame(self):
+        if not self.enabled:
+            self.frame_start = None
+            return
+        self.frame_start = time.perf_counter()
+        self.pending.append([])
+
+        # Read back the queries issued QUERY_LATENCY frames ago
+        while len(self.pending) > self.latency + 1:
+            self.resolve_queries(self.pending.popleft())
+
+    # Method to mark the end of a frame and push the frame totals into the history
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        end = time.perf_counter()
+        self.add_cpu_sample('frame', self.frame_start, end)
+        with self.lock:
+            frame_totals, self.frame_totals = self.frame_totals, defaultdict(float)
+        for name, total in frame_totals.items():
+            self.history[name].append(total)
+            if total > self.budgets.get(name, total):
+                self.over_budget[name] += 1
+        self.frame_start = None
+        self.frame_index += 1
+
+    # Method to record a finished CPU scope (from any thread)
+    def add_cpu_sample(self, name, start, end):
+        duration_ms = (end - start) * 1000.0
+        with self.lock:
+            self.frame_totals[name] += duration_ms
+        tid = CPU_TID if threading.current_thread() is threading.main_thread() else WORKER_TID
+        self.add_event(name, 'cpu', tid, start, duration_ms)
+
+    # Method to read back a frame's GPU queries and return them to the pool
+    def resolve_queries(self, queries):
+        total_ms = 0.0
+        for name, start, query in queries:
+            duration_ms = query.elapsed / 1e6
+            total_ms += duration_ms
+            self.history['gpu.' + name].append(duration_ms)
+            self.add_event(name, 'gpu', GPU_TID, start, duration_ms)
+            self.free_queries.append(query)
+        if queries:
+            self.last_gpu_frame_ms = total_ms
+            self.gpu_frames += 1
+
+    # Method to read back every outstanding query (e.g. before exporting or disabling)
+    def flush_queries(self):
+        while self.pending:
+            self.resolve_queries(self.pending.popleft())
+
+    # Method to store a trace event (GPU events are placed at the CPU time their pass was submitted)
+    def add_event(self, name, category, tid, start, duration_ms):
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'X', 'pid': 1, 'tid': tid,
+            'ts': (start - self.origin) * 1e6, 'dur': duration_ms * 1000.0,
+        })
+
+    # Method to get the rolling mean and maximum (in milliseconds) of every scope
+    def summary(self):
+        return {name: (sum(values) / len(values), max(values))
+                for name, values in self.history.items() if values}
+
+    # Method to print the rolling summary as a table
+    def print_summary(self):
+        summary = self.summary()
+        frames = len(self.history['frame'])
+        print(f'--- profiler: last {frames} frames ---')
+        print(f"{'scope':<24} {'mean ms':>9} {'max ms':>9} {'budget ms':>10} {'over':>6}")
+        for name, (mean, peak) in sorted(summary.items(), key=lambda item: -item[1][0]):
+            budget = f'{self.budgets[name]:>10.3f} {self.over_budget[name]:>6}' if name in self.budgets else ''
+            print(f'{name:<24} {mean:>9.3f} {peak:>9.3f} {budget}')
+
+    # Method to write the recorded events as Chrome trace-event JSON
+    def export_chrome_trace(self, path):
+        self.flush_queries()
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': CPU_TID, 'args': {'name': 'CPU'}},
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': GPU_TID, 'args': {'name': 'GPU'}},
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': WORKER_TID, 'args': {'name': 'Worker'}},
+        ]
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': metadata + list(self.events), 'displayTimeUnit': 'ms'}, file)
+
+    # Method to drop the timer queries
+    def destroy(self):
+        self.flush_queries()
+        self.free_queries.clear()
@@ -0,0 +1,206 @@
+import numpy as np
+import glm
+from bvh import BVH, BIG, OBJECT_LEAF_SIZE, enter_boxes
+from camera import FAR
+from culling import transform_boxes
+from model import InstancedModel
+
+# Placements collected from the broad phase before their meshes are intersected (as one batch)
+NARROW_BATCH = 64
+
+# Placements of a batch using the same mesh from which they are intersected with it together (with NumPy)
+BATCHED_RAYS = 4
+
+
+# RayHit class
+class RayHit:
+
+    """
+    what a raycast hit: the object (a model, an
+    InstancedModel together with the index of the
+    instance, or the terrain), how far along the
+    ray, where, the normal of the surface (whose
+    front faces the ray), and the triangle of the
+    mesh.
+    """
+
+    def __init__(self, obj, instance, distance, position, normal, triangle=None):
+        self.obj = obj
+        self.instance = instance
+        self.distance = distance
+        self.position = position
+        self.normal = normal
+        self.triangle = triangle
+
+    def __repr__(self):
+        name = type(self.obj).__name__ if not isinstance(self.obj, InstancedModel) else self.obj.vao_name
+        instance = '' if self.instance is None else f'[{self.instance}]'
+        return f'RayHit({name}{instance}, distance={self.distance:.2f})'
+
+
+# Raycaster class
+class Raycaster:
+
+    """
+    answers raycast queries against the objects
+    of a scene and the triangles of their meshes.
+    Here's a summary of its key features:
+
+        * Broad Phase: Every placement (each model, and
+          each instance of an InstancedModel) gets a world
+          bounding box, transformed from its mesh bounds in
+          one vectorized pass, and a BVH is built over the
+          boxes. The BVH is built on the first raycast and
+          rebuilt after invalidate (which Scene.update calls
+          when transforms change).
+
+        * Narrow Phase: The placements of the leaves the
+          broad phase reaches are collected into batches of
+          about NARROW_BATCH, and the ray is tested against
+          all of their boxes at once. It is moved into the
+          model space of the ones it enters (with the inverse
+          model matrices, computed in one batch) and
+          intersected with the triangle BVH of their mesh;
+          when BATCHED_RAYS or more of them use the same
+          mesh, with NumPy, for all of them at once.
+          Distances are the same in both spaces, so the
+          closest hit of a batch prunes the rest of the
+          broad phase.
+
+        * Triangle BVHs: The mesh's VBO builds its triangle
+          BVH (or reads it from the warm-start cache) and
+          shares it between all objects using the mesh. The
+          raycaster gets the BVHs of the scene's meshes when
+          it is created, so no pick waits for one.
+
+        * Terrain: With a terrain, the ray is first tested
+          against the heightmap, and only objects closer than
+          the ground hit are tested.
+
+        * Picking: pick casts the ray through a pixel of the
+          window (the center of the view by default).
+    """
+
+    def __init__(self, scene):
+
+        # Reference to the scene and the VBOs of the meshes
+        self.scene = scene
+        self.vbos = scene.app.mesh.vao.vbo.vbos
+
+        # Broad phase (built on first use): placements as (object, instance) pairs, their meshes (and their
+        # indices into self.mesh_vbos), their inverse model matrices (column-major, like the store) and
+        # their world boxes (also indexed [axis, placement], for testing batches of them)
+        self.bvh = None
+        self.placements = []
+        self.meshes = []
+        self.mesh_vbos = []
+        self.mesh_ids = None
+        self.inverse = None
+        self.b_min = self.b_max = None
+        self.box_min = self.box_max = None
+
+        # Triangle BVHs of the scene's meshes
+        for vao_name in dict.fromkeys(obj.vao_name for obj in scene.objects):
+            self.vbos[vao_name].get_bvh()
+
+    # Method to drop the broad phase, so it is rebuilt from the current transforms by the next raycast
+    def invalidate(self):
+        self.bvh = None
+
+    # Method to build the broad phase from the scene's objects
+    def build(self):
+        placements, meshes, matrices = [], [], []
+        for obj in self.scene.objects:
+            vbo = self.vbos[obj.vao_name]
+            if isinstance(obj, InstancedModel):
+                count = obj.instance_count
+                placements += [(obj, instance) for instance in range(count)]
+                meshes += [vbo] * count
+                matrices.append(obj.transforms.get_matrices()[obj.start:obj.end])
+            else:
+                placements.append((obj, None))
+                meshes.append(vbo)
+                matrices.append(np.array(obj.m_model, dtype='f4').T[None])
+        matrices = np.concatenate(matrices) if matrices else np.zeros((0, 4, 4), dtype='f4')
+
+        # World boxes: the mesh boxes moved by the matrices
+        b_min = np.array([vbo.bounds[0] for vbo in meshes], dtype='f4').reshape(-1, 3)
+        b_max = np.array([vbo.bounds[1] for vbo in meshes], dtype='f4').reshape(-1, 3)
+        self.placements = placements
+        self.meshes = meshes
+        self.mesh_vbos = list(dict.fromkeys(meshes))
+        mesh_index = {vbo: i for i, vbo in enumerate(self.mesh_vbos)}
+        self.mesh_ids = np.array([mesh_index[vbo] for vbo in meshes], dtype='i8')
+        self.inverse = np.linalg.inv(matrices) if len(matrices) else matrices
+        self.b_min, self.b_max = transform_boxes(matrices, b_min, b_max)
+        self.box_min, self.box_max = self.b_min.T.astype('f8'), self.b_max.T.astype('f8')
+        self.bvh = BVH(self.b_min, self.b_max)
+
+    # Method to find the closest hit of a ray (origin, direction) within max_distance, or None
+    def raycast(self, origin, direction, max_distance=FAR):
+        if self.bvh is None:
+            self.build()
+        origin, direction = glm.vec3(origin), glm.normalize(glm.vec3(direction))
+        ox, oy, oz = origin
+        dx, dy, dz = direction
+
+        # The ground bounds how far objects are tested
+        terrain = self.scene.terrain
+        ground = None
+        if terrain is not None:
+            ground = self.scene.heightmap.raycast(origin, direction, max_distance)
+            if ground is not None:
+                max_distance = ground[0]
+
+        # Intersect the meshes of a batch of placements with the ray, in their model spaces
+        origin_axes, inverse_axes = (ox, oy, oz), tuple(1.0 / d if d else BIG for d in (dx, dy, dz))
+        closest = [None, None]
+        def intersect(batch, t_max):
+            batch = batch[enter_boxes(origin_axes, inverse_axes, self.box_min[:, batch], self.box_max[:, batch],
+                                      t_max) < np.inf]
+            m = self.inverse[batch]
+            local_origins = np.einsum('j,kjl->kl', (ox, oy, oz), m[:, :3, :3]) + m[:, 3, :3]
+            local_directions = np.einsum('j,kjl->kl', (dx, dy, dz), m[:, :3, :3])
+            mesh_ids = self.mesh_ids[batch]
+            for mesh_id in np.unique(mesh_ids).tolist():
+                rays = np.flatnonzero(mesh_ids == mesh_id)
+                mesh = self.mesh_vbos[mesh_id].get_bvh()
+
+                # A few rays are cheaper to walk through the mesh's BVH one at a time
+                if len(rays) < BATCHED_RAYS:
+                    for ray in rays.tolist():
+                        hit = mesh.intersect(local_origins[ray].tolist(), local_directions[ray].tolist(), t_max)
+                        if hit is not None:
+                            t_max, closest[:] = hit[0], (int(batch[ray]), hit[1])
+                    continue
+                distances, triangles = mesh.intersect_many(local_origins[rays], local_directions[rays], t_max)
+                ray = int(np.argmin(distances))
+                if distances[ray] < t_max:
+                    t_max, closest[:] = float(distances[ray]), (int(batch[rays[ray]]), int(triangles[ray]))
+            return t_max
+
+        # Collect the placements of the leaves the ray reaches, and intersect them once a batch is full
+        pending = []
+        def test(first, count, t_max):
+            pending.append(self.bvh.order[first:first + count])
+            if len(pending) * OBJECT_LEAF_SIZE >= NARROW_BATCH:
+                t_max = intersect(np.concatenate(pending), t_max)
+                pending.clear()
+            return t_max
+
+        distance = self.bvh.traverse((ox, oy, oz), (dx, dy, dz), max_distance, test)
+        if pending:
+            distance = intersect(np.concatenate(pending), distance)
+        index, triangle = closest
+        if index is None:
+            return None if ground is None else RayHit(terrain, None, ground[0], origin + direction * ground[0], ground[1])
+
+        # Normals go back to world space by the inverse transpose
+        mesh = self.meshes[index].get_bvh()
+        normal = glm.normalize(glm.vec3(*(self.inverse[index][:3, :3] @ mesh.normal(triangle)).tolist()))
+        obj, instance = self.placements[index]
+        return RayHit(obj, instance, distance, origin + direction * distance, normal, int(mesh.bvh.order[triangle]))
+
+    # Method to cast the ray through a window pixel (the center of the view if not given)
+    def pick(self, screen_pos=None, max_distance=FAR):
+        return self.raycast(*self.scene.app.camera.get_ray(screen_pos), max_distance)
@@ -0,0 +1,122 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+import pygame as pg
+
+# Render farm settings
+DEFAULT_SEED = 1234  # Seed used for scene generation (every worker generates the same world from it)
+CHUNK_SIZE = 8  # Poses handed to a worker at a time
+IMAGE_FORMATS = ('png', 'jpg', 'bmp')
+
+# Engine of the worker process (created once by init_worker), or the error that stopped it being created
+engine = None
+engine_error = None
+
+
+# Load camera poses from JSON: a list of {'position': [x, y, z], 'yaw': ..., 'pitch': ...}, either as
+# the whole file or under 'poses' (the keyframes of a recorded camera path are accepted too)
+def load_poses(path):
+    with open(path) as file:
+        data = json.load(file)
+    if isinstance(data, dict):
+        data = data.get('poses', data.get('keyframes', []))
+    return [(tuple(pose['position']), pose['yaw'], pose['pitch']) for pose in data]
+
+
+# Set up a worker process: a headless engine with the scene every worker shares
+# (a pool restarts workers whose initializer fails forever, so the error is kept and raised by render_pose)
+def init_worker(win_size, engine_options):
+    global engine, engine_error
+
+    # SDL would catch SIGTERM, and the pool could not terminate the worker
+    os.environ['SDL_NO_SIGNAL_HANDLERS'] = '1'
+    try:
+        from main import GraphicsEngine
+        engine = GraphicsEngine(win_size, frame_mode='uncapped', headless=True, **engine_options)
+    except Exception as error:
+        engine_error = error
+
+
+# Render one (index, pose) task in a worker and write the image into a directory
+# Returns the task's manifest entry
+def render_pose(task):
+    index, (position, yaw, pitch), directory, image_format = task
+    if engine is None:
+        raise RuntimeError(f'render farm worker {os.getpid()} has no engine: {engine_error!r}')
+    start = time.perf_counter()
+    engine.camera.set_pose(position, yaw, pitch)
+    engine.render()
+
+    # Read the frame back and store it upright
+    width, height = engine.WIN_SIZE
+    data = engine.framebuffer.read(components=3, alignment=1)
+    pixels = np.frombuffer(data, dtype='u1').reshape(height, width, 3)[::-1]
+    file_name = f'view_{index:06d}.{image_format}'
+    pg.image.save(pg.image.frombuffer(pixels.tobytes(), (width, height), 'RGB'), os.path.join(directory, file_name))
+
+    stats = engine.scene_renderer.stats
+    return {'index': index, 'file': file_name, 'position': list(position), 'yaw': yaw, 'pitch': pitch,
+            'worker': os.getpid(), 'render_ms': (time.perf_counter() - start) * 1000.0,
+            'draw_calls': stats['draw_calls'], 'triangles': stats['triangles']}
+
+
+# Render every pose across a pool of worker processes and write the images and a manifest into a directory
+# Returns the manifest
+def render_poses(poses, directory, workers=None, win_size=(1600, 900), image_format='png', chunk_size=CHUNK_SIZE,
+                 **engine_options):
+    os.makedirs(directory, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    tasks = [(index, pose, directory, image_format) for index, pose in enumerate(poses)]
+    chunk_size = max(1, min(chunk_size, -(-len(tasks) // workers)))
+
+    # Every worker builds its engine once (spawned, so no OpenGL or SDL state is inherited), then renders
+    # chunks of poses as they come (smaller chunks for small batches, so every worker gets some)
+    start = time.perf_counter()
+    entries = []
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=init_worker, initargs=(win_size, engine_options)) as pool:
+        for entry in pool.imap_unordered(render_pose, tasks, chunksize=chunk_size):
+            entries.append(entry)
+            if len(entries) % 100 == 0:
+                print(f'{len(entries)}/{len(tasks)} views rendered', flush=True)
+    elapsed = time.perf_counter() - start
+
+    manifest = {'win_size': list(win_size), 'workers': workers, 'engine': engine_options,
+                'seconds': elapsed, 'views_per_second': len(entries) / elapsed if elapsed > 0 else 0.0,
+                'views': sorted(entries, key=lambda entry: entry['index'])}
+    with open(os.path.join(directory, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render batches of camera poses across a pool of headless engines.')
+    parser.add_argument('poses', help='JSON file of camera poses (position, yaw and pitch, as used by Camera)')
+    parser.add_argument('output', help='directory the images and manifest.json are written to')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU core)')
+    parser.add_argument('--size', type=int, nargs=2, default=(1600, 900), metavar=('W', 'H'), help='image size')
+    parser.add_argument('--format', choices=IMAGE_FORMATS, default='png', help='image file format')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='scene generation seed')
+    parser.add_argument('--scene', help='bulk-load this scene file instead of running the generators')
+    parser.add_argument('--terrain', action='store_true', help='replace the flat ground planes with a terrain')
+    parser.add_argument('--density', type=float, default=1.0, help='multiplier of the number of generated objects')
+    parser.add_argument('--instanced', action='store_true',
+                        help='draw the generated objects as one instanced model per type')
+    args = parser.parse_args(argv)
+
+    poses = load_poses(args.poses)
+    manifest = render_poses(poses, args.output, args.workers, tuple(args.size), args.format, seed=args.seed,
+                            scene_file=args.scene, terrain=args.terrain, density=args.density,
+                            instanced=args.instanced or None)
+    print(f"rendered {len(manifest['views'])} views with {manifest['workers']} workers in "
+          f"{manifest['seconds']:.1f} s ({manifest['views_per_second']:.1f} views/s)")
+    return 0
+
+
+# Entry point for the render farm
+if __name__ == '__main__':
+    sys.exit(main())
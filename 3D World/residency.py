@@ -0,0 +1,225 @@
+from collections import OrderedDict
+from gpu_memory import get_gpu_memory, get_image_bytes, MB
+
+# Texture residency settings
+MAX_DROPPED_MIPS = 2  # Top mip levels dropped from an unused texture before it is evicted (each quarters its size)
+CACHE_MB = 256  # Size of the CPU cache of full resolution pixels of demoted and evicted textures
+TEXEL_BYTES = 3  # Bytes per texel of the managed (RGB) textures
+
+
+# ResidentTexture class
+class ResidentTexture:
+
+    """
+    a texture loaded from a file whose GPU copy
+    the TextureResidency manager may shrink or
+    release. It stands in for the moderngl
+    texture: use binds it (reloading it first
+    if it was evicted) and marks it as used in
+    the current frame, so the models and the
+    terrain never hold the texture itself.
+    """
+
+    def __init__(self, path, texture):
+
+        # File it was loaded from, full resolution size, and the current GPU texture (None if evicted)
+        self.path = path
+        self.size = texture.size
+        self.texture = texture
+
+        # Name in reports, owning manager, top mip levels dropped, and the last frame it was used in
+        self.name = path
+        self.residency = None
+        self.dropped = 0
+        self.last_used = 0
+
+    # Bytes the texture holds on the GPU (with its mip chain) with a number of top levels dropped
+    def get_bytes(self, dropped=None):
+        dropped = self.dropped if dropped is None else dropped
+        width, height = self.size
+        return get_image_bytes((max(1, width >> dropped), max(1, height >> dropped)), TEXEL_BYTES, mipmaps=True)
+
+    # Whether the texture is on the GPU
+    @property
+    def resident(self):
+        return self.texture is not None
+
+    # Method to bind the texture to a texture unit (reloading it if it was evicted)
+    def use(self, location=0):
+        self.residency.touch(self)
+        self.texture.use(location=location)
+
+    # Method to release the GPU texture
+    def release(self):
+        if self.texture is not None:
+            self.texture.release()
+            self.texture = None
+
+
+# TextureResidency class
+class TextureResidency:
+
+    """
+    keeps the textures loaded from files within
+    a GPU memory budget. Here's a summary of its
+    key features:
+
+        * Usage Tracking: Every ResidentTexture records
+          the last frame it was bound in. begin_frame
+          (called by the renderer at the start of each
+          frame) advances the frame counter and brings
+          the textures back within the budget.
+
+        * Shrinking: Textures not used in the last frame
+          are shrunk oldest first: one top mip level is
+          dropped from each (a texture half as wide and high,
+          a quarter of the memory) until the total fits, up
+          to MAX_DROPPED_MIPS levels, and only then are they
+          evicted altogether, least recently used first.
+
+        * Transparent Reloading: A shrunk texture is drawn
+          as it is, and restored to full resolution at the
+          start of a frame once it is used again and fits.
+          An evicted texture is reloaded as soon as it is
+          bound. Full resolution pixels are read back from
+          the GPU before a texture is first shrunk, and kept
+          in a CPU cache of CACHE_MB (least recently used
+          entries dropped first), so reloading skips decoding
+          the image; on a cache miss it is read from its file.
+
+        * Budget: With no budget (budget_mb=None), textures
+          stay resident and are only tracked. Textures used
+          in the current frame are never touched, so a frame
+          needing more than the budget goes over it.
+
+        * Accounting: Every change is reflected in the GPU
+          memory registry, and the number of textures shrunk,
+          evicted and reloaded is counted for the stats.
+    """
+
+    def __init__(self, loader, budget_mb=None, cache_mb=CACHE_MB):
+
+        # Texture loader (creates textures from files or pixels) and the GPU memory registry
+        self.loader = loader
+        self.memory = get_gpu_memory(loader.ctx)
+
+        # Budget and CPU cache size in bytes, and the cache as name -> (size, pixels) in least recently used order
+        self.budget = None if budget_mb is None else budget_mb * MB
+        self.cache_size = cache_mb * MB
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+
+        # Managed textures and the current frame
+        self.textures = []
+        self.frame = 0
+
+        # Counters of the textures shrunk, evicted, restored and reloaded
+        self.counts = {'shrunk': 0, 'evicted': 0, 'restored': 0, 'reloaded': 0}
+
+    # Method to start managing a texture
+    def add(self, name, handle):
+        handle.name = name
+        handle.residency = self
+        handle.last_used = self.frame
+        self.textures.append(handle)
+        self.memory.add_texture(name, handle.texture, mipmaps=True)
+
+    # Bytes of the managed textures on the GPU
+    @property
+    def resident_bytes(self):
+        return sum(handle.get_bytes() for handle in self.textures if handle.resident)
+
+    # Method to mark a texture as used this frame (reloading it if it was evicted)
+    def touch(self, handle):
+        handle.last_used = self.frame
+        if handle.texture is None:
+            self.replace(handle, self.create(handle), 0)
+            self.counts['reloaded'] += 1
+
+    # Method to advance to the next frame and bring the textures within the budget
+    def begin_frame(self):
+        self.frame += 1
+        if self.budget is None:
+            return
+
+        # Shrink and evict the textures not used in the last frame, then restore used ones that fit
+        self.enforce()
+        total = self.resident_bytes
+        for handle in sorted(self.textures, key=lambda handle: -handle.last_used):
+            if handle.resident and handle.dropped and handle.last_used >= self.frame - 1:
+                grown = total - handle.get_bytes() + handle.get_bytes(0)
+                if grown <= self.budget:
+                    self.replace(handle, self.create(handle), 0)
+                    self.counts['restored'] += 1
+                    total = grown
+
+    # Method to shrink, then evict, the least recently used textures until the total fits the budget
+    def enforce(self):
+        total = self.resident_bytes
+        unused = sorted((handle for handle in self.textures if handle.resident and handle.last_used < self.frame - 1),
+                        key=lambda handle: handle.last_used)
+
+        # Drop a top mip level from each unused texture (oldest first), one level per round
+        for level in range(MAX_DROPPED_MIPS):
+            for handle in unused:
+                if total <= self.budget:
+                    return
+                if handle.dropped <= level:
+                    before = handle.get_bytes()
+                    self.replace(handle, self.shrink(handle), handle.dropped + 1)
+                    total += handle.get_bytes() - before
+                    self.counts['shrunk'] += 1
+
+        # Evict them (oldest first), keeping their full resolution pixels
+        for handle in unused:
+            if total <= self.budget:
+                return
+            if handle.dropped == 0:
+                self.store(handle.name, handle.size, handle.texture.read(level=0, alignment=1))
+            total -= handle.get_bytes()
+            self.replace(handle, None, 0)
+            self.counts['evicted'] += 1
+
+    # Method to swap a texture's GPU copy (None to evict it), keeping the registry up to date
+    def replace(self, handle, texture, dropped):
+        if handle.texture is not None:
+            self.memory.remove(handle.texture)
+            handle.texture.release()
+        handle.texture, handle.dropped = texture, dropped
+        if texture is not None:
+            self.memory.add_texture(handle.name, texture, mipmaps=True)
+
+    # Method to make a copy of a texture with one more top mip level dropped (from its next level)
+    def shrink(self, handle):
+        if handle.dropped == 0:
+            self.store(handle.name, handle.size, handle.texture.read(level=0, alignment=1))
+        width, height = handle.texture.size
+        size = max(1, width // 2), max(1, height // 2)
+        return self.loader.create_texture(size, handle.texture.read(level=1, alignment=1))
+
+    # Method to create a texture at full resolution from the cached pixels (or the file on a cache miss)
+    def create(self, handle):
+        entry = self.cache.get(handle.name)
+        if entry is not None:
+            self.cache.move_to_end(handle.name)
+            return self.loader.create_texture(*entry)
+        return self.loader.create_texture(*self.loader.load_image(handle.path))
+
+    # Method to keep full resolution pixels in the cache, dropping the least recently used entries to fit
+    def store(self, name, size, pixels):
+        if name in self.cache:
+            self.cache.move_to_end(name)
+            return
+        self.cache[name] = (size, pixels)
+        self.cache_bytes += len(pixels)
+        while self.cache_bytes > self.cache_size and len(self.cache) > 1:
+            self.cache_bytes -= len(self.cache.popitem(last=False)[1][1])
+
+    # Method to release every managed texture
+    def destroy(self):
+        for handle in self.textures:
+            if handle.texture is not None:
+                self.memory.remove(handle.texture)
+            handle.release()
+        self.cache.clear()
+        self.cache_bytes = 0
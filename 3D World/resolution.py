@@ -0,0 +1,149 @@
+import moderngl as mgl
+import glm
+from collections import deque
+from gpu_memory import get_gpu_memory
+
+# Dynamic resolution settings
+TARGET_MS = 1000 / 60  # GPU frame time to hold
+MIN_SCALE = 0.5  # Smallest fraction of the window resolution (per axis)
+MAX_SCALE = 1.0  # Largest fraction of the window resolution (per axis)
+SCALE_STEP = 0.05  # Scale change per adjustment (scales are kept on multiples of it)
+HEADROOM = 0.85  # Scale up only when frames take less than this fraction of the target
+QUERY_LATENCY = 2  # Frames to wait before reading back a GPU frame time
+HISTORY = 120  # Frames used for the target hit rate
+
+
+# DynamicResolution class
+class DynamicResolution:
+
+    """
+    renders the main pass into an offscreen
+    framebuffer whose resolution follows the
+    GPU frame time. Here's a summary of its
+    key features:
+
+        * Offscreen Target: A color texture and depth
+          renderbuffer the size of the window are created
+          once. A lower resolution is rendered by shrinking
+          the framebuffer's viewport, so changing the scale
+          never reallocates anything.
+
+        * GPU Frame Time: Every frame is wrapped in a timer query,
+          read back QUERY_LATENCY frames later so it never stalls.
+          Timer queries cannot be nested, so while the profiler is
+          timing the passes the frame time is taken from it instead.
+
+        * Scale Controller: When the GPU frame time goes over the
+          target the scale drops by SCALE_STEP, and when it stays
+          under HEADROOM of the target it rises again, between
+          MIN_SCALE and MAX_SCALE.
+
+        * Upscale: present stretches the rendered part of the
+          texture over the screen with bilinear filtering.
+
+        * Statistics: Besides the current scale, the last GPU frame
+          time (gpu_ms) and the fraction of recent frames that met
+          the target (hit_rate) are kept for the renderer's stats.
+    """
+
+    def __init__(self, app, target_ms=TARGET_MS, min_scale=MIN_SCALE, max_scale=MAX_SCALE):
+
+        # Reference to the application and the context
+        self.app = app
+        self.ctx = app.ctx
+        self.size = app.WIN_SIZE
+
+        # Frame time target and scale limits
+        self.target_ms = target_ms
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.scale = max_scale
+
+        # Offscreen framebuffer (full window size, rendered into through a scaled viewport)
+        self.color_texture = self.ctx.texture(self.size, 4)
+        self.color_texture.filter = (mgl.LINEAR, mgl.LINEAR)
+        self.color_texture.repeat_x = self.color_texture.repeat_y = False
+        self.depth_buffer = self.ctx.depth_renderbuffer(self.size)
+        self.framebuffer = self.ctx.framebuffer(color_attachments=[self.color_texture],
+                                                depth_attachment=self.depth_buffer)
+        memory = get_gpu_memory(self.ctx)
+        memory.add_texture('dynamic resolution color', self.color_texture)
+        memory.add_framebuffer('dynamic resolution', self.framebuffer)
+
+        # Upscale pass
+        self.vao = app.mesh.vao.vaos['upscale']
+        self.program = self.vao.program
+        self.program['u_texture_0'] = 0
+
+        # GPU timer queries in flight (free ones are reused) and the recent frame times
+        self.profiler = app.profiler
+        self.profiler_frames = 0
+        self.free_queries = []
+        self.pending = deque()
+        self.current = None
+        self.frame_times = deque(maxlen=HISTORY)
+        self.gpu_ms = 0.0
+        self.hit_rate = 1.0
+
+    # Size of the rendered frame at the current scale
+    @property
+    def render_size(self):
+        return max(1, round(self.size[0] * self.scale)), max(1, round(self.size[1] * self.scale))
+
+    # Method to start timing a frame (unless the profiler is timing it)
+    def begin_frame(self):
+        if self.profiler.enabled:
+            return
+        self.current = self.free_queries.pop() if self.free_queries else self.ctx.query(time=True)
+        self.current.__enter__()
+
+    # Method to stop timing the frame and adjust the scale from the frame times that are ready
+    def end_frame(self):
+        if self.profiler.gpu_frames != self.profiler_frames:
+            self.profiler_frames = self.profiler.gpu_frames
+            self.adjust(self.profiler.last_gpu_frame_ms)
+        if self.current is None:
+            return
+        self.current.__exit__(None, None, None)
+        self.pending.append(self.current)
+        self.current = None
+        while len(self.pending) > QUERY_LATENCY:
+            query = self.pending.popleft()
+            self.adjust(query.elapsed / 1e6)
+            self.free_queries.append(query)
+
+    # Method to change the scale by one step if the frame time calls for it
+    def adjust(self, gpu_ms):
+        self.frame_times.append(gpu_ms)
+        if gpu_ms > self.target_ms:
+            self.scale = max(self.min_scale, round((self.scale - SCALE_STEP) / SCALE_STEP) * SCALE_STEP)
+        elif gpu_ms < self.target_ms * HEADROOM:
+            self.scale = min(self.max_scale, round((self.scale + SCALE_STEP) / SCALE_STEP) * SCALE_STEP)
+
+        self.gpu_ms = gpu_ms
+        self.hit_rate = sum(1 for frame_time in self.frame_times if frame_time <= self.target_ms) / len(self.frame_times)
+
+    # Method to bind and clear the offscreen framebuffer at the current scale
+    def use(self, color):
+        self.framebuffer.viewport = (0, 0, *self.render_size)
+        self.framebuffer.use()
+        self.framebuffer.clear(*color, viewport=self.framebuffer.viewport)
+
+    # Method to stretch the rendered frame over the screen
+    def present(self):
+        self.app.framebuffer.use()
+        self.color_texture.use(location=0)
+        width, height = self.render_size
+        self.program['u_scale'].write(glm.vec2(width / self.size[0], height / self.size[1]))
+        self.ctx.disable(mgl.DEPTH_TEST)
+        self.vao.render()
+        self.ctx.enable(mgl.DEPTH_TEST)
+
+    # Method to release the offscreen framebuffer
+    def destroy(self):
+        memory = get_gpu_memory(self.ctx)
+        memory.remove(self.color_texture)
+        memory.remove(self.framebuffer)
+        self.framebuffer.release()
+        self.color_texture.release()
+        self.depth_buffer.release()
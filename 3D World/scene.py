@@ -1,6 +1,16 @@
 from model import *
+from scene_file import SceneLayout, get_model_type, get_model_default
+from transform import TransformStore
+from scene_graph import SceneNode
+from terrain import Heightmap, Terrain, CHUNK_CELLS
+from placement import SpatialHash, scatter
+from raycast import Raycaster
+from collision import CollisionWorld
+from light_clusters import LightManager
+from startup import get_startup_trace, get_warm_cache
+import inspect
+import numpy as np
 import glm
-import random
 
 # BOUNDS About X-Axis
 X_MIN, X_MAX = -115, -25
@@ -10,6 +20,62 @@ ENV1_Z_MIN, ENV1_Z_MAX = -45, 45
 ENV2_Z_MIN, ENV2_Z_MAX = -160, -70
 ENV3_Z_MIN, ENV3_Z_MAX = 68, 160
 
+# Heights objects are placed at (just above the ground planes)
+HEIGHT_1, HEIGHT_2 = -0.87, -0.75
+
+# Radius of the footprint each object type keeps clear of other objects (at the scale it is placed at)
+# A radius of 0 marks ground cover, which may overlap anything
+FOOTPRINTS = {
+    'GrassPatch': 0, 'Grass': 0, 'SmallRock': 0.75, 'TreeBottom': 1.5, 'TreeTop': 3.0,
+    'TreeTrunk': 3.3, 'MilitaryVehicle': 0.7, 'Tent': 3.5, 'Stone_A': 2.4, 'Stone_B': 0.1,
+    'Stone_C': 0.9, 'Cactus': 0.25, 'Pyramid': 2.5, 'Camel': 1.0,
+}
+
+# Offset of a tree top from its trunk, in the trunk's local (unscaled) space
+TREE_TOP_OFFSET = (0, 9, 0)
+
+# Size of the square cells that group the scene graph's root nodes for culling
+GRAPH_CELL_SIZE = 30
+
+# Terrain: position of its (min x, min z) corner, size in chunks along x and z, and height of the flat planes it replaces
+TERRAIN_ORIGIN = (-140, -176)
+TERRAIN_CHUNKS = (5, 11)
+GROUND_Y = -1
+
+# Campfires by the tents: offset (in the tent's local, unscaled space), color and radius
+CAMPFIRE_OFFSET = (0, 0.5, 6)
+CAMPFIRE_COLOR = (6.0, 2.6, 0.8)
+CAMPFIRE_RADIUS = 10
+
+# Headlights of the military vehicles: offsets and direction (in the vehicle's local space), color, radius
+# and cone angle
+HEADLIGHT_OFFSETS = ((1.3, 0.7, 0.5), (1.3, 0.7, -0.5))
+HEADLIGHT_DIRECTION = (1, -0.15, 0)
+HEADLIGHT_COLOR = (8.0, 7.6, 6.4)
+HEADLIGHT_RADIUS = 25
+HEADLIGHT_ANGLE = 25
+
+# Texture of the terrain around each environment (by range of z)
+TERRAIN_REGIONS = [((ENV1_Z_MIN, ENV1_Z_MAX), 'plane_grass'),
+                   ((ENV2_Z_MIN, ENV2_Z_MAX), 'plane_dirt'),
+                   ((ENV3_Z_MIN, ENV3_Z_MAX), 'plane_sand')]
+
+
+# Get the heightmap of the terrain for a seed (None for a random one)
+def get_heightmap(seed=None):
+    cells = (TERRAIN_CHUNKS[0] * CHUNK_CELLS, TERRAIN_CHUNKS[1] * CHUNK_CELLS)
+    return Heightmap.generate(cells, origin=TERRAIN_ORIGIN, seed=seed, base=GROUND_Y)
+
+
+# Move every root placement of a flat layout from the planes' height onto a heightmap
+def snap_to_ground(layout, heightmap):
+    type_ids, pos, rot, scale, parents = layout.get_arrays()
+    pos = pos.copy()
+    roots = parents < 0
+    pos[roots, 1] += heightmap.get_height(pos[roots, 0], pos[roots, 2]) - GROUND_Y
+    layout.set_arrays(type_ids, pos, rot, scale, parents)
+    layout.terrain = True
+
 
 # Scene class
 class Scene:
@@ -27,29 +93,113 @@ class Scene:
           and initializes an empty list to store objects. It loads 
           initial objects into the scene and creates an advanced skybox.
 
+        * Seeding: Placements come from a SceneGenerator, which draws 
+          from its own seeded random number generator. Passing a seed 
+          makes the generated world identical from run to run, which 
+          benchmarks rely on. density multiplies the number of 
+          generated objects (for stress tests). A seeded layout is 
+          kept in the warm-start cache, so later launches with the 
+          same seed read it back instead of generating it again.
+
         * Adding Objects: Provides a method (add_object) to add objects 
           to the scene by appending them to the list of objects.
 
         * Loading Initial Objects: Defines a load method to populate 
-          the scene with objects. In the given example, it creates a 
-          floor with a grid of cubes.
+          the scene with objects. The placements either come from a 
+          scene file or from the SceneGenerator, and are described by 
+          a SceneLayout (packed arrays of type, position, rotation, 
+          and scale).
+
+        * Instantiating Placements: load_objects creates one model 
+          object per placement, each attached to a SceneNode of the 
+          scene graph (self.graph), while load_instanced bulk-loads 
+          the layout as a single InstancedModel per model type, all 
+          backed by one shared TransformStore, without creating a 
+          Python object per placement.
+
+        * Scene Graph: Placements with a parent become child nodes 
+          (e.g. tree tops hang off their trunks). Root nodes are 
+          grouped into GRAPH_CELL_SIZE cells, so the bounds of a 
+          cell let the renderer cull all of its objects at once 
+          with get_visible_objects. Instanced models are culled 
+          instance by instance, and only the instances in view 
+          are drawn.
+
+        * Terrain: With terrain=True, the flat ground planes are 
+          replaced by a Terrain built from the heightmap for the 
+          scene's seed, and generated placements are snapped to 
+          its surface. Scene files generated on a terrain record 
+          it (and their seed rebuilds the same heightmap); flat 
+          ones are snapped onto the heightmap when loaded. Terrain chunks are not part of the scene 
+          graph; the renderer selects and draws them separately.
+
+        * Raycasts: self.raycaster answers raycast and pick queries 
+          against the objects and the terrain; update tells it when 
+          transforms changed, so its broad phase is rebuilt.
+
+        * Shadow Casters: get_shadow_casters culls the objects 
+          against the light's frustum like get_visible_objects, 
+          and leaves out the ones that do not cast shadows or 
+          are smaller than a minimum size.
+
+        * Lights: self.lights holds the scene's point and spot 
+          lights (a LightManager). With lights=True, every tent 
+          gets a campfire and every military vehicle a pair of 
+          headlights.
+
+        * Collisions: self.collision keeps the camera on the ground 
+          and out of the objects in walk mode, with a grid of the 
+          raycaster's object boxes.
 
         * Updating the Scene: Implements an update method to update 
-          the scene. In this case, it checks if a moving cube exists 
-          in the scene and, if so, updates its rotation based on the 
-          application's time.
+          the scene. The scene graph recomputes the matrices and 
+          bounds of the nodes that changed, and the transform store 
+          recomputes the model matrices of transforms that changed 
+          since the last frame in one batch. update makes no OpenGL 
+          calls (so it can run on a worker thread); it returns the 
+          range of instances that changed, for the renderer to upload.
     """
     
     # Constructor
-    def __init__(self, app):
+    def __init__(self, app, seed=None, scene_file=None, instanced=None, terrain=False, density=1.0, lights=False):
         # Reference to the application
         self.app = app
 
-        # List to store objects in the scene
+        # Where placements come from: a scene file, or the generators with this seed (and object density)
+        self.seed = seed
+        self.scene_file = scene_file
+        self.density = density
+
+        # Scene files are bulk-loaded as instanced draws unless told otherwise
+        self.instanced = scene_file is not None if instanced is None else instanced
+
+        # Heightmap terrain instead of the flat planes (if enabled)
+        self.terrain_enabled = terrain
+        self.heightmap = None
+        self.terrain = None
+
+        # List to store objects in the scene, the scene graph, and the transforms of instanced objects
         self.objects = []
+        self.graph = SceneNode()
+        self.transforms = None
+
+        # Point and spot lights (shaded with clustered forward lighting)
+        self.lights = LightManager(app.ctx)
 
-        # Load objects into the scene
+        # Load objects into the scene (and their lights, if enabled)
+        trace = get_startup_trace(app.ctx)
         self.load()
+        if lights:
+            with trace.phase('lights'):
+                self.add_lights(self.layout)
+
+        # Raycast queries against the objects and the terrain
+        with trace.phase('raycaster'):
+            self.raycaster = Raycaster(self)
+
+        # Collisions of the walking camera with the objects (and its height above the ground)
+        with trace.phase('collision'):
+            self.collision = CollisionWorld(self, GROUND_Y)
 
         # Create and set up the advanced skybox
         self.skybox = AdvancedSkyBox(app)
@@ -70,41 +220,228 @@ class Scene:
     # Method to load initial objects into the scene (e.g., floor)
     def load(self):
 
+        # Read the placements from the scene file, or run the generators (on the terrain, if enabled)
+        trace = get_startup_trace(self.app.ctx)
+        with trace.phase('layout'):
+            if self.scene_file:
+                self.layout = SceneLayout.load(self.scene_file)
+                if self.terrain_enabled:
+                    self.heightmap = self.get_layout_heightmap(self.layout)
+            else:
+                if self.terrain_enabled:
+                    self.heightmap = get_heightmap(self.seed)
+                self.layout = self.generate_layout()
+
+        # Build the terrain's chunks
+        if self.heightmap is not None:
+            with trace.phase('terrain'):
+                self.terrain = Terrain(self.app, self.heightmap, TERRAIN_REGIONS)
+
+        # Turn the placements into renderable objects
+        with trace.phase('objects'):
+            if self.instanced:
+                self.load_instanced(self.layout)
+            else:
+                self.load_objects(self.layout)
+
+    # Method to get the heightmap a loaded layout stands on: the one it was generated on, or (for flat
+    # layouts) the heightmap of its seed, or of the scene's, with the placements snapped onto it
+    def get_layout_heightmap(self, layout):
+        if layout.terrain:
+            if layout.seed is None:
+                raise ValueError(f'{self.scene_file}: layout on a terrain has no seed to rebuild the heightmap from')
+            return get_heightmap(layout.seed)
+        heightmap = get_heightmap(self.seed if layout.seed is None else layout.seed)
+        snap_to_ground(layout, heightmap)
+        return heightmap
+
+    # Method to run the generators, or read the layout from the warm-start cache when a seeded layout was
+    # generated by an earlier launch (keyed by the seed, density and terrain, and the generators' sources)
+    def generate_layout(self):
+        generate = lambda: SceneGenerator(self.seed, self.heightmap, self.density).generate()
+        if self.seed is None:
+            return generate()
+        sources = [inspect.getsourcefile(source) for source in (SceneGenerator, scatter, BaseModel, Heightmap)]
+        params = (self.seed, self.density, self.heightmap is not None)
+        arrays = get_warm_cache(self.app.ctx).get('layout', f'seed {self.seed}', lambda: generate().to_arrays(),
+                                                  sources, params)
+        return SceneLayout.from_arrays(arrays)
+
+    # Method to create one model object (and scene graph node) per placement of a layout
+    def load_objects(self, layout):
+        app = self.app
+        nodes, cells = [], {}
+        trace = get_startup_trace(app.ctx)
+        for name, pos, rot, scale, parent in layout.records():
+            model_type = get_model_type(name)
+            pos, rot, scale = tuple(pos.tolist()), tuple(rot.tolist()), tuple(scale.tolist())
+            with trace.asset('construct', name):
+                obj = model_type(app, pos=pos, rot=rot, scale=scale)
+            self.add_object(obj)
+            node = SceneNode(pos, rot, scale, model=obj)
+            nodes.append((node, parent))
+
+        # Attach children to their parents and root nodes to the cell they stand in
+        for node, parent in nodes:
+            if parent >= 0:
+                nodes[parent][0].add_child(node)
+                continue
+            cell = (int(node.pos.x // GRAPH_CELL_SIZE), int(node.pos.z // GRAPH_CELL_SIZE))
+            if cell not in cells:
+                cells[cell] = self.graph.add_child(SceneNode())
+            cells[cell].add_child(node)
+        self.graph.update()
+
+    # Method to bulk-load a layout as one instanced model per model type
+    def load_instanced(self, layout):
         app = self.app
-        add = self.add_object
+        pos, rot, scale, parents, ranges = layout.get_sorted_arrays()
+        self.transforms = TransformStore(len(pos))
+        self.transforms.add_many(pos, rot, scale, parents)
+        trace = get_startup_trace(app.ctx)
+        for name, start, end in ranges:
+            model_type = get_model_type(name)
+            vao_name = get_model_default(model_type, 'vao_name')
+            tex_id = get_model_default(model_type, 'tex_id')
+            with trace.asset('construct', name):
+                self.add_object(InstancedModel(app, vao_name, tex_id, self.transforms, start, end))
+
+    # Method to add the lights of a layout's placements: campfires by the tents and headlights on the vehicles
+    def add_lights(self, layout):
+        for name, pos, rot, scale, parent in layout.records():
+            if name not in ('Tent', 'MilitaryVehicle'):
+                continue
+            m_model = SceneNode(pos, rot, scale).get_local_matrix()
+            if name == 'Tent':
+                self.lights.add_point_light(glm.vec3(m_model * glm.vec4(*CAMPFIRE_OFFSET, 1)), CAMPFIRE_COLOR,
+                                            CAMPFIRE_RADIUS)
+                continue
+            direction = glm.normalize(glm.vec3(m_model * glm.vec4(*HEADLIGHT_DIRECTION, 0)))
+            for offset in HEADLIGHT_OFFSETS:
+                self.lights.add_spot_light(glm.vec3(m_model * glm.vec4(*offset, 1)), direction, HEADLIGHT_COLOR,
+                                           HEADLIGHT_RADIUS, HEADLIGHT_ANGLE)
+
+    # Method to update the scene (the scene graph and the instanced transforms that changed)
+    # Returns the (start, end) range of instanced transforms that changed, or None
+    def update(self):
+        moved = self.graph.dirty or self.graph.child_dirty
+        self.graph.update()
+        changed = self.transforms.update() if self.transforms is not None else None
+
+        # Raycasts rebuild their broad phase once something moved
+        if moved or changed is not None:
+            self.raycaster.invalidate()
+        return changed
+
+    # Method to get the objects that may be visible in a frustum (instanced models, outside the scene graph,
+    # are culled per instance, and the model matrices of their instances in view are added to instances as
+    # (model, matrices) pairs)
+    def get_visible_objects(self, frustum, instances=None):
+        visible = []
+        for obj in self.objects:
+            if isinstance(obj, InstancedModel):
+                matrices = obj.get_visible_instances(frustum)
+                if matrices is not None:
+                    visible.append(obj)
+                    if instances is not None:
+                        instances.append((obj, matrices))
+        self.graph.collect_visible(frustum, visible)
+        return visible
+
+    # Method to get the shadow casters in the light's frustum that are at least min_size across
+    def get_shadow_casters(self, frustum, min_size=0.0):
+        casters = [obj for obj in self.objects
+                   if isinstance(obj, InstancedModel) and obj.casts_shadows and obj.has_casters(frustum, min_size)]
+        self.graph.collect_visible(frustum, casters, min_size=min_size)
+        return casters
+
+    # Method to release the instance buffers of bulk-loaded objects and the terrain
+    def destroy(self):
+        [obj.destroy() for obj in self.objects if isinstance(obj, InstancedModel)]
+        self.lights.destroy()
+        if self.terrain:
+            self.terrain.destroy()
+
+
+# SceneGenerator class
+class SceneGenerator:
+
+    """
+    produces the placements of the default world 
+    (the forest, rocky terrain, and desert 
+    environments) as a SceneLayout. It does not 
+    create any model objects or touch OpenGL, so 
+    it can also be run offline to write scene files.
+
+    Key functionalities of the SceneGenerator class:
+
+        * Seeding: All random placement goes through a 
+          private NumPy random number generator (self.rng), 
+          so the same seed always produces the same layout.
+
+        * Generators: Each generate_* method places a number 
+          of objects of one model type inside the given bounds 
+          about the Z-Axis in a single vectorized pass (place), 
+          and adds them to the layout as arrays with add_many.
+
+        * Collision-Aware Placement: Positions come from 
+          placement.scatter (jittered-grid sampling), which 
+          keeps every object's footprint (FOOTPRINTS) clear of 
+          the footprints placed before it, tracked in a shared 
+          SpatialHash. Environments place their largest objects 
+          first, and ground cover (a footprint of 0) last.
+
+        * Density: The counts given to the generate_* methods 
+          are each type's density per environment, and are all 
+          multiplied by density, so the same world can be made 
+          sparser or (for stress tests) many times denser.
+
+        * Environments: The render_* methods describe what 
+          each environment contains, and generate runs all 
+          of them into a fresh SceneLayout.
+
+        * Terrain: Given a heightmap, the ground planes are left 
+          out and every root placement is raised or lowered in 
+          one batch by the height of the ground below it, keeping 
+          its offset above the planes' height (GROUND_Y).
+    """
+
+    # Constructor
+    def __init__(self, seed=None, heightmap=None, density=1.0):
+        # Random number generator used for every placement (seeded for reproducible worlds)
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        # Multiplier of every object count, and the footprints placed so far
+        self.density = density
+        self.spatial_hash = None
+
+        # Heightmap to place objects on (None for the flat planes)
+        self.heightmap = heightmap
+
+    # Method to generate the placements of every environment
+    def generate(self):
+
+        layout = SceneLayout(seed=self.seed)
+        self.spatial_hash = SpatialHash()
 
         # Default Environment
-        self.render_DefaultEnvironment(app, add)
+        self.render_DefaultEnvironment(layout)
 
         # Environment1 - Forest
-        self.render_Environment1(app, add)
+        self.render_Environment1(layout)
 
         # Environment2 - Rocky Terrain
-        self.render_Environment2(app, add)
+        self.render_Environment2(layout)
 
         # Environment3 - Desert
-        self.render_Environment3(app, add)
-            
+        self.render_Environment3(layout)
 
-    # Method to update the scene
-    def update(self):
-        pass
+        # Stand everything on the terrain
+        if self.heightmap is not None:
+            snap_to_ground(layout, self.heightmap)
 
-    """
-    POSITION & YAW GETTERS
-    """
-
-    # Get an X Value that exists within the BOUNDS
-    def get_x(self, min_val, max_val):
-        return random.randrange(min_val, max_val)
-
-    # Get a Z Value that exists with the BOUNDS
-    def get_z(self, min_val, max_val):
-        return random.randrange(min_val, max_val)
-
-    # Get a yaw Value to rotate around the Y-Axis for
-    def get_yaw(self):
-        return random.randrange(0.0, 360.0)
+        return layout
 
     """
     PLANE POSITIONS GETTERS
@@ -146,211 +483,195 @@ class Scene:
     POSITION GENERATORS
     """
 
-    # Generate the (X,Z) Coordinate for the Y-Value of -0.87
-    def generate_height_pos_1(self, min_val, max_val):
-        x,z = self.get_x(X_MIN, X_MAX), self.get_z(min_val, max_val)
-        return (x, -0.87, z)
-
-    # Genereate the (X,Z) Coordinate for the Y-Value for -0.75
-    def generate_height_pos_2(self, min_val, max_val):
-        x,z = self.get_x(X_MIN, X_MAX), self.get_z(min_val, max_val)
-        return (x, -0.75, z)
-
-    # Generate the Yaw-Value value for the Object to rotate to
-    def generate_rotation(self):
-        yaw = self.get_yaw()
-        return (0, yaw, 0)
+    # Generate a yaw value (rotation around the Y-Axis) for each of count objects
+    def generate_rotations(self, count):
+        rot = np.zeros((count, 3), dtype='f4')
+        rot[:, 1] = self.rng.integers(0, 360, count)
+        return rot
+
+    # Place instances (times the density) of a model type at height y, with footprints clear of
+    # everything placed before, and add them to the layout; returns their indices in the layout
+    def place(self, layout, model_type, instances, min_val, max_val, y, scale=None):
+        count = round(instances * self.density)
+        xz = scatter(self.rng, (X_MIN, X_MAX, min_val, max_val), count,
+                     FOOTPRINTS[model_type.__name__], self.spatial_hash)
+        pos = np.column_stack([xz[:, 0], np.full(len(xz), y, dtype='f4'), xz[:, 1]])
+        return layout.add_many(model_type, pos, rot=self.generate_rotations(len(xz)), scale=scale)
 
     """
     OBJECT GENERATORS
     """
 
     # Generate Patches of Grass
-    def generate_grass_patches(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            add(GrassPatch(app, pos=self.generate_height_pos_1(min_val, max_val), rot=self.generate_rotation()))
+    def generate_grass_patches(self, layout, instances, min_val, max_val):
+        self.place(layout, GrassPatch, instances, min_val, max_val, HEIGHT_1)
 
     # Generate Single Instances of Grass
-    def generate_grass(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            add(Grass(app, pos=self.generate_height_pos_1(min_val, max_val), rot=self.generate_rotation()))
+    def generate_grass(self, layout, instances, min_val, max_val):
+        self.place(layout, Grass, instances, min_val, max_val, HEIGHT_1)
 
     # Generate Small Rocks
-    def generate_small_rocks(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            add(SmallRock(app, pos=self.generate_height_pos_1(min_val, max_val), rot=self.generate_rotation()))
+    def generate_small_rocks(self, layout, instances, min_val, max_val):
+        self.place(layout, SmallRock, instances, min_val, max_val, HEIGHT_1)
 
     # Generate Trees
-    def generate_trees(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            
-            # Generate Positions
-            gen_pos = self.generate_height_pos_2(min_val, max_val)
-            gen_pos_offset = (gen_pos[0], 3-gen_pos[1], gen_pos[2])
+    def generate_trees(self, layout, instances, min_val, max_val):
 
-            # Generate Rotation
-            gen_rot = self.generate_rotation()
+        # Place the trunks
+        trees = self.place(layout, TreeBottom, instances, min_val, max_val, HEIGHT_2, scale=self.get_scale_1())
 
-            # Add Objects to Scene
-            add(TreeBottom(app, pos=gen_pos, rot=gen_rot, scale=self.get_scale_1()))
-            add(TreeTop(app, pos=gen_pos_offset, rot=gen_rot, scale=self.get_scale_1()))
+        # Add the tops (children of the trunks, so they follow the trunks' transforms)
+        tops = np.broadcast_to(np.asarray(TREE_TOP_OFFSET, dtype='f4'), (len(trees), 3))
+        layout.add_many(TreeTop, tops, rot=(0, 0, 0), scale=(1, 1, 1), parent=trees)
 
-# Generate Trees without any leaves
-    def generate_trees_no_tops(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            add(TreeBottom(app, pos=self.generate_height_pos_1(min_val, max_val), rot=self.generate_rotation(), scale=self.get_scale_1()))
+    # Generate Trees without any leaves
+    def generate_trees_no_tops(self, layout, instances, min_val, max_val):
+        self.place(layout, TreeBottom, instances, min_val, max_val, HEIGHT_1, scale=self.get_scale_1())
 
     # Generate Military Vehicles
-    def generate_military_vehicles(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            add(MilitaryVehicle(app, pos=self.generate_height_pos_1(min_val, max_val), rot=self.generate_rotation(), scale=self.get_scale_1()))
+    def generate_military_vehicles(self, layout, instances, min_val, max_val):
+        self.place(layout, MilitaryVehicle, instances, min_val, max_val, HEIGHT_1, scale=self.get_scale_1())
 
     # Generate the First Version of Stones
-    def generate_stones_A(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            add(Stone_A(app, pos=self.generate_height_pos_2(min_val, max_val), rot=self.generate_rotation(), scale=self.get_scale_2()))
+    def generate_stones_A(self, layout, instances, min_val, max_val):
+        self.place(layout, Stone_A, instances, min_val, max_val, HEIGHT_2, scale=self.get_scale_2())
 
     # Generate the Second Version of Stones
-    def generate_stones_B(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            add(Stone_B(app, pos=self.generate_height_pos_2(min_val, max_val), rot=self.generate_rotation(), scale=self.get_scale_2()))
+    def generate_stones_B(self, layout, instances, min_val, max_val):
+        self.place(layout, Stone_B, instances, min_val, max_val, HEIGHT_2, scale=self.get_scale_2())
 
     # Generate the Third Version of Stones
-    def generate_stones_C(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            add(Stone_C(app, pos=self.generate_height_pos_2(min_val, max_val), rot=self.generate_rotation(), scale=self.get_scale_2()))
+    def generate_stones_C(self, layout, instances, min_val, max_val):
+        self.place(layout, Stone_C, instances, min_val, max_val, HEIGHT_2, scale=self.get_scale_2())
 
     # Generate Tree Trunks
-    def generate_tree_trunks(self, add, app, instances, min_val, max_val):
-        for i in range(5):
-            add(TreeTrunk(app, pos=self.generate_height_pos_2(min_val, max_val), rot=self.generate_rotation()))
+    def generate_tree_trunks(self, layout, instances, min_val, max_val):
+        self.place(layout, TreeTrunk, instances, min_val, max_val, HEIGHT_2)
 
     # Generate Tents
-    def generate_tents(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            add(Tent(app, pos=self.generate_height_pos_2(min_val, max_val), rot=self.generate_rotation(), scale=self.get_scale_1()))
+    def generate_tents(self, layout, instances, min_val, max_val):
+        self.place(layout, Tent, instances, min_val, max_val, HEIGHT_2, scale=self.get_scale_1())
 
     # Generate Bushes
-    def generate_bushes(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            add(TreeTop(app, pos=self.generate_height_pos_2(min_val, max_val), rot=self.generate_rotation(),scale=self.get_scale_1()))
+    def generate_bushes(self, layout, instances, min_val, max_val):
+        self.place(layout, TreeTop, instances, min_val, max_val, HEIGHT_2, scale=self.get_scale_1())
 
     # Generate Cacti
-    def generate_cacti(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            add(Cactus(app, pos=self.generate_height_pos_2(min_val, max_val), rot=self.generate_rotation()))
+    def generate_cacti(self, layout, instances, min_val, max_val):
+        self.place(layout, Cactus, instances, min_val, max_val, HEIGHT_2)
 
     # Generate Pyramids
-    def generate_pyramids(self, add, app, instances, min_val, max_val):
-        for i in range(instances):
-            add(Pyramid(app, pos=self.generate_height_pos_2(min_val, max_val), rot=self.generate_rotation(), scale=self.get_scale_2()))
+    def generate_pyramids(self, layout, instances, min_val, max_val):
+        self.place(layout, Pyramid, instances, min_val, max_val, HEIGHT_2, scale=self.get_scale_2())
 
     # Generate Camels
-    def generate_camels(self, add, app, instances, min_val, max_val):
-        for i in range(5):
-            add(Camel(app, pos=self.generate_height_pos_2(min_val, max_val), rot=self.generate_rotation(), scale=self.get_scale_1()))
+    def generate_camels(self, layout, instances, min_val, max_val):
+        self.place(layout, Camel, instances, min_val, max_val, HEIGHT_2, scale=self.get_scale_1())
 
     """
     ENVIRONMENTS
     """
 
     # The Default Environment that will render upon start
-    def render_DefaultEnvironment(self, app, add):
-        add(Plane(app, pos=self.get_plane_pos_default(), scale=self.get_plane_scale()))
-
-    # The Default Environment that will render upon start
-    def render_Environment1(self, app, add):
-
-        # Plane that Environment 1 will Generate on
-        add(Plane_Grass(app, pos=self.get_plane_pos1(), scale=self.get_plane_scale()))
-
-        # Spawn Grass Patches into the Environment
-        self.generate_grass_patches(add, app, 500, ENV1_Z_MIN, ENV1_Z_MAX)
+    def render_DefaultEnvironment(self, layout):
+        if self.heightmap is None:
+            layout.add(Plane, pos=self.get_plane_pos_default(), scale=self.get_plane_scale())
 
-        # Spawn Grass into the Environment
-        self.generate_grass(add, app, 150, ENV1_Z_MIN, ENV1_Z_MAX)
+    # The Default Environment that will render upon start (the largest objects are placed first)
+    def render_Environment1(self, layout):
 
-        # Spawn Small Rocks into the Environment
-        self.generate_small_rocks(add, app, 20, ENV1_Z_MIN, ENV1_Z_MAX)
+        # Plane that Environment 1 will Generate on (the terrain replaces it)
+        if self.heightmap is None:
+            layout.add(Plane_Grass, pos=self.get_plane_pos1(), scale=self.get_plane_scale())
 
-        # Spawn Trees into the Environment
-        self.generate_trees(add, app, 20, ENV1_Z_MIN, ENV1_Z_MAX)
+        # Spawn Tents into the Environment
+        self.generate_tents(layout, 5, ENV1_Z_MIN, ENV1_Z_MAX)
 
-        # Spawn Military Vehicles into the Environment
-        self.generate_military_vehicles(add, app, 20, ENV1_Z_MIN, ENV1_Z_MAX)
+        # Spawn Tree Trunks inot the Environment
+        self.generate_tree_trunks(layout, 5, ENV1_Z_MIN, ENV1_Z_MAX)
 
         # Spawn First Type of Stones into the Enviornment
-        self.generate_stones_A(add, app, 20, ENV1_Z_MIN, ENV1_Z_MAX)
+        self.generate_stones_A(layout, 20, ENV1_Z_MIN, ENV1_Z_MAX)
 
-        # Spawn Second Type of Stones into the Environment
-        self.generate_stones_B(add, app, 20, ENV1_Z_MIN, ENV1_Z_MAX)
+        # Spawn Trees into the Environment
+        self.generate_trees(layout, 20, ENV1_Z_MIN, ENV1_Z_MAX)
 
         # Spawn Third Type of Stones into the Environment
-        self.generate_stones_C(add, app, 20, ENV1_Z_MIN, ENV1_Z_MAX)
+        self.generate_stones_C(layout, 20, ENV1_Z_MIN, ENV1_Z_MAX)
 
-        # Spawn Tree Trunks inot the Environment
-        self.generate_tree_trunks(add, app, 5, ENV1_Z_MIN, ENV1_Z_MAX)
-
-        # Spawn Tents into the Environment
-        self.generate_tents(add, app, 5, ENV1_Z_MIN, ENV1_Z_MAX)
+        # Spawn Small Rocks into the Environment
+        self.generate_small_rocks(layout, 20, ENV1_Z_MIN, ENV1_Z_MAX)
 
-    # The Default Environment that will render upon start
-    def render_Environment2(self, app, add):
+        # Spawn Military Vehicles into the Environment
+        self.generate_military_vehicles(layout, 20, ENV1_Z_MIN, ENV1_Z_MAX)
 
-        # Plane that Environment2 will Generate On
-        add(Plane_Dirt(app, pos=self.get_plane_pos2(), scale=self.get_plane_scale()))
+        # Spawn Second Type of Stones into the Environment
+        self.generate_stones_B(layout, 20, ENV1_Z_MIN, ENV1_Z_MAX)
 
-        # Generate all the Patches of Grass for the Environment
-        self.generate_grass_patches(add, app, 250, ENV2_Z_MIN, ENV2_Z_MAX)
+        # Spawn Grass Patches into the Environment
+        self.generate_grass_patches(layout, 500, ENV1_Z_MIN, ENV1_Z_MAX)
 
-        # Generate all Bushes
-        self.generate_bushes(add, app, 20, ENV2_Z_MIN, ENV2_Z_MAX)
+        # Spawn Grass into the Environment
+        self.generate_grass(layout, 150, ENV1_Z_MIN, ENV1_Z_MAX)
 
-        # Geneate all the Small Rocks for the Enviornment
-        self.generate_small_rocks(add, app, 20, ENV2_Z_MIN, ENV2_Z_MAX)
+    # The Default Environment that will render upon start (the largest objects are placed first)
+    def render_Environment2(self, layout):
 
-        # Generate all the Grass for the Environment
-        self.generate_grass(add, app, 20, ENV2_Z_MIN, ENV2_Z_MAX)
+        # Plane that Environment2 will Generate On (the terrain replaces it)
+        if self.heightmap is None:
+            layout.add(Plane_Dirt, pos=self.get_plane_pos2(), scale=self.get_plane_scale())
 
-        # Generate all the Trees for the Environment
-        self.generate_trees_no_tops(add, app, 20, ENV2_Z_MIN, ENV2_Z_MAX)
+        # Generate all Bushes
+        self.generate_bushes(layout, 20, ENV2_Z_MIN, ENV2_Z_MAX)
 
         # Generate all the Stone_As for the Environment
-        self.generate_stones_A(add, app, 5, ENV2_Z_MIN, ENV2_Z_MAX)
+        self.generate_stones_A(layout, 5, ENV2_Z_MIN, ENV2_Z_MAX)
 
-        # Generate all the Stone_Bs for the Environment
-        self.generate_stones_B(add, app, 5, ENV2_Z_MIN, ENV2_Z_MAX)
+        # Generate all the Trees for the Environment
+        self.generate_trees_no_tops(layout, 20, ENV2_Z_MIN, ENV2_Z_MAX)
 
         # Generate all the Stone_Cs for the Environment
-        self.generate_stones_C(add, app, 20, ENV2_Z_MIN, ENV2_Z_MAX)
+        self.generate_stones_C(layout, 20, ENV2_Z_MIN, ENV2_Z_MAX)
+
+        # Geneate all the Small Rocks for the Enviornment
+        self.generate_small_rocks(layout, 20, ENV2_Z_MIN, ENV2_Z_MAX)
 
         # Genereate all the Military Vehicles for the Environment
-        self.generate_military_vehicles(add, app, 20, ENV2_Z_MIN, ENV2_Z_MAX)
+        self.generate_military_vehicles(layout, 20, ENV2_Z_MIN, ENV2_Z_MAX)
 
-    # The Default Environment that will render upon start
-    def render_Environment3(self, app, add):
+        # Generate all the Stone_Bs for the Environment
+        self.generate_stones_B(layout, 5, ENV2_Z_MIN, ENV2_Z_MAX)
 
-        # Generate the Plane that will be needed for the Environment to Generate on
-        add(Plane_Sand(app, pos=self.get_plane_pos3(), scale=self.get_plane_scale()))
+        # Generate all the Patches of Grass for the Environment
+        self.generate_grass_patches(layout, 250, ENV2_Z_MIN, ENV2_Z_MAX)
 
-        # Generate all the Cacti for the Environment
-        self.generate_cacti(add, app, 20, ENV3_Z_MIN, ENV3_Z_MAX)
+        # Generate all the Grass for the Environment
+        self.generate_grass(layout, 20, ENV2_Z_MIN, ENV2_Z_MAX)
 
-        # Generate all the Small Rocks for the Environment
-        self.generate_small_rocks(add, app, 20, ENV3_Z_MIN, ENV3_Z_MAX)
+    # The Default Environment that will render upon start (the largest objects are placed first)
+    def render_Environment3(self, layout):
+
+        # Generate the Plane that will be needed for the Environment to Generate on (the terrain replaces it)
+        if self.heightmap is None:
+            layout.add(Plane_Sand, pos=self.get_plane_pos3(), scale=self.get_plane_scale())
+
+        # Generate all the Pyramid for the Environment
+        self.generate_pyramids(layout, 5, ENV3_Z_MIN, ENV3_Z_MAX)
 
         # Generate all the Stone_As for the Environment
-        self.generate_stones_A(add, app, 5, ENV3_Z_MIN, ENV3_Z_MAX)
+        self.generate_stones_A(layout, 5, ENV3_Z_MIN, ENV3_Z_MAX)
 
-        # Generate all the Stone_Bs for the Environment
-        self.generate_stones_B(add, app, 5, ENV3_Z_MIN, ENV3_Z_MAX)
+        # Generate all the Camels for the Environment
+        self.generate_camels(layout, 5, ENV3_Z_MIN, ENV3_Z_MAX)
 
         # Generate all the Stone_Cs for the Environment
-        self.generate_stones_C(add, app, 20, ENV3_Z_MIN, ENV3_Z_MAX)
+        self.generate_stones_C(layout, 20, ENV3_Z_MIN, ENV3_Z_MAX)
 
-        # Generate all the Pyramid for the Environment
-        self.generate_pyramids(add, app, 5, ENV3_Z_MIN, ENV3_Z_MAX)
+        # Generate all the Small Rocks for the Environment
+        self.generate_small_rocks(layout, 20, ENV3_Z_MIN, ENV3_Z_MAX)
 
-        # Generate all the Camels for the Environment
-        self.generate_camels(add, app, 5, ENV3_Z_MIN, ENV3_Z_MAX)
+        # Generate all the Cacti for the Environment
+        self.generate_cacti(layout, 20, ENV3_Z_MIN, ENV3_Z_MAX)
 
+        # Generate all the Stone_Bs for the Environment
+        self.generate_stones_B(layout, 5, ENV3_Z_MIN, ENV3_Z_MAX)
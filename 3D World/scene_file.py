@@ -0,0 +1,255 @@
+import argparse
+import inspect
+import json
+import numpy as np
+import model
+
+# Version written into every scene file
+SCENE_FILE_VERSION = 3
+
+
+# Look up a model class (e.g. 'TreeTop') by name
+def get_model_type(name):
+    model_type = getattr(model, name, None)
+    if not (inspect.isclass(model_type) and issubclass(model_type, model.BaseModel)):
+        raise ValueError(f'unknown model type {name!r} in scene file')
+    return model_type
+
+
+# Get the default value of a constructor argument of a model class (e.g. its scale)
+def get_model_default(model_type, arg):
+    return inspect.signature(model_type.__init__).parameters[arg].default
+
+
+# SceneLayout class
+class SceneLayout:
+
+    """
+    describes every placement of a scene as
+    packed arrays instead of Python objects.
+    Here's a summary of its key features:
+
+        * Packed Arrays: Each placement has a type id
+          (an index into self.types, the list of model
+          class names), a position, rotation angles (in
+          degrees), a scale and a parent. They are stored
+          as one uint16 array, three (N, 3) float32 arrays
+          and one int32 array.
+
+        * Parents: A placement with a parent (the index of
+          another placement, or -1 for none) is a child in
+          the scene graph, and its transform is relative to
+          its parent's. Composite objects like trees are one
+          trunk placement with the top attached to it.
+
+        * Building: The add method appends a single
+          placement, filling in the model class's own
+          default rotation and scale when they are not
+          given, and add_many appends a whole array of
+          placements of one type at once. Both return the
+          indices of the new placements, to be used as parents.
+
+        * Sorting: The get_sorted_arrays method returns the
+          placements sorted by model type (with the parents
+          remapped) and the range of each type, which is what
+          the renderer needs to bulk-load them as one instanced
+          draw per type.
+
+        * Persistence: Layouts are saved as .npz files (uncompressed,
+          so loading is a handful of array reads). Hand-written
+          layouts can also be loaded from JSON, as a list of
+          {"type", "pos", "rot", "scale", "parent"} records.
+          Version 1 files (without parents) still load.
+
+        * Terrain: self.terrain records whether the placements
+          already stand on the heightmap terrain of the layout's
+          seed (layouts generated with terrain=True). Version 2
+          files and layouts without it are flat, at the planes'
+          height.
+          to_arrays and from_arrays convert a layout to and
+          from the arrays of a file (the warm-start cache
+          keeps generated layouts the same way).
+    """
+
+    def __init__(self, seed=None, terrain=False):
+
+        # Seed the layout was generated with (None for hand-made layouts)
+        self.seed = seed
+
+        # Whether the placements stand on the heightmap terrain of the seed (instead of the flat planes)
+        self.terrain = terrain
+
+        # Names of the model classes, indexed by type id
+        self.types = []
+        self.type_index = {}
+
+        # Chunks of (type_ids, pos, rot, scale, parents) arrays and the pending single placements
+        self.chunks = []
+        self.pending = ([], [], [], [], [])
+
+    # Method to get (or assign) the type id of a model class
+    def get_type_id(self, model_type):
+        name = model_type if isinstance(model_type, str) else model_type.__name__
+        if name not in self.type_index:
+            self.type_index[name] = len(self.types)
+            self.types.append(name)
+        return self.type_index[name]
+
+    # Method to add a single placement and return its index (missing rotation or scale fall back to the class defaults)
+    def add(self, model_type, pos=None, rot=None, scale=None, parent=-1):
+        if isinstance(model_type, str):
+            model_type = get_model_type(model_type)
+        index = len(self)
+        type_ids, positions, rotations, scales, parents = self.pending
+        type_ids.append(self.get_type_id(model_type))
+        positions.append(get_model_default(model_type, 'pos') if pos is None else pos)
+        rotations.append(get_model_default(model_type, 'rot') if rot is None else rot)
+        scales.append(get_model_default(model_type, 'scale') if scale is None else scale)
+        parents.append(parent)
+        return index
+
+    # Method to add many placements of one type from (N, 3) arrays and return their indices
+    def add_many(self, model_type, pos, rot=None, scale=None, parent=-1):
+        if isinstance(model_type, str):
+            model_type = get_model_type(model_type)
+        pos = np.asarray(pos, dtype='f4').reshape(-1, 3)
+        count = len(pos)
+        rot = get_model_default(model_type, 'rot') if rot is None else rot
+        scale = get_model_default(model_type, 'scale') if scale is None else scale
+        self.flush()
+        start = len(self)
+        self.chunks.append((
+            np.full(count, self.get_type_id(model_type), dtype='u2'),
+            pos,
+            np.broadcast_to(np.asarray(rot, dtype='f4'), (count, 3)),
+            np.broadcast_to(np.asarray(scale, dtype='f4'), (count, 3)),
+            np.broadcast_to(np.asarray(parent, dtype='i4'), (count,)),
+        ))
+        return np.arange(start, start + count)
+
+    # Method to move the pending single placements into a chunk
+    def flush(self):
+        type_ids, positions, rotations, scales, parents = self.pending
+        if type_ids:
+            self.chunks.append((np.array(type_ids, dtype='u2'), np.array(positions, dtype='f4'),
+                                np.array(rotations, dtype='f4'), np.array(scales, dtype='f4'),
+                                np.array(parents, dtype='i4')))
+            self.pending = ([], [], [], [], [])
+
+    # Method to get the packed (type_ids, pos, rot, scale, parents) arrays of the whole layout
+    def get_arrays(self):
+        self.flush()
+        if not self.chunks:
+            empty = np.zeros((0, 3), dtype='f4')
+            return np.zeros(0, dtype='u2'), empty, empty, empty, np.zeros(0, dtype='i4')
+        if len(self.chunks) > 1:
+            self.chunks = [tuple(np.concatenate(arrays) for arrays in zip(*self.chunks))]
+        return self.chunks[0]
+
+    # Method to replace the whole layout with packed (type_ids, pos, rot, scale, parents) arrays
+    def set_arrays(self, type_ids, pos, rot, scale, parents):
+        self.pending = ([], [], [], [], [])
+        self.chunks = [(type_ids, pos, rot, scale, parents)]
+
+    # Number of placements in the layout
+    def __len__(self):
+        return sum(len(chunk[0]) for chunk in self.chunks) + len(self.pending[0])
+
+    # Method to get the (pos, rot, scale, parents) arrays sorted by model type
+    # and a list of (type name, start, end) ranges, one per model type present
+    def get_sorted_arrays(self):
+        type_ids, pos, rot, scale, parents = self.get_arrays()
+        order = np.argsort(type_ids, kind='stable')
+
+        # Parents point at the placements' new positions
+        new_index = np.empty_like(order)
+        new_index[order] = np.arange(len(order))
+        parents = parents[order]
+        parents = np.where(parents >= 0, new_index[np.maximum(parents, 0)], -1).astype('i4')
+
+        bounds = np.searchsorted(type_ids[order], np.arange(len(self.types) + 1))
+        ranges = [(name, int(bounds[type_id]), int(bounds[type_id + 1]))
+                  for type_id, name in enumerate(self.types) if bounds[type_id + 1] > bounds[type_id]]
+        return pos[order], rot[order], scale[order], parents, ranges
+
+    # Method to yield (type name, pos, rot, scale, parent) for every single placement, in order
+    def records(self):
+        type_ids, pos, rot, scale, parents = self.get_arrays()
+        for i in range(len(type_ids)):
+            yield self.types[type_ids[i]], pos[i], rot[i], scale[i], int(parents[i])
+
+    # Method to get the arrays a scene file holds (by name)
+    def to_arrays(self):
+        type_ids, pos, rot, scale, parents = self.get_arrays()
+        return {'version': np.array(SCENE_FILE_VERSION), 'seed': np.array(-1 if self.seed is None else self.seed),
+                'terrain': np.array(self.terrain),
+                'types': np.array(self.types, dtype=str), 'type_ids': type_ids, 'pos': pos, 'rot': rot,
+                'scale': scale, 'parents': parents}
+
+    # Method to make a layout from the arrays of a scene file (by name)
+    @classmethod
+    def from_arrays(cls, data, path='layout'):
+        if int(data['version']) > SCENE_FILE_VERSION:
+            raise ValueError(f'{path}: scene file version {int(data["version"])} is not supported')
+        seed = int(data['seed'])
+
+        # Version 2 files have no terrain flag (their placements are flat)
+        terrain = bool(data['terrain']) if 'terrain' in data else False
+        layout = cls(seed=None if seed < 0 else seed, terrain=terrain)
+        for name in data['types']:
+            layout.get_type_id(get_model_type(str(name)).__name__)
+        type_ids = data['type_ids']
+
+        # Version 1 files have no parents
+        parents = data['parents'] if 'parents' in data else np.full(len(type_ids), -1, dtype='i4')
+        layout.chunks.append((type_ids, data['pos'], data['rot'], data['scale'], parents))
+        return layout
+
+    # Method to save the layout as an .npz scene file
+    def save(self, path):
+        np.savez(path, **self.to_arrays())
+
+    # Method to load a layout from an .npz scene file (or a hand-written .json file)
+    @classmethod
+    def load(cls, path):
+        if path.endswith('.json'):
+            return cls.load_json(path)
+
+        with np.load(path) as data:
+            return cls.from_arrays(data, path)
+
+    # Method to load a hand-written layout from JSON
+    @classmethod
+    def load_json(cls, path):
+        with open(path) as file:
+            data = json.load(file)
+        layout = cls(seed=data.get('seed'), terrain=data.get('terrain', False))
+        for record in data['objects']:
+            layout.add(record['type'], record.get('pos'), record.get('rot'), record.get('scale'),
+                       record.get('parent', -1))
+        return layout
+
+
+def main(argv=None):
+    from scene import SceneGenerator, get_heightmap
+
+    parser = argparse.ArgumentParser(description='Write a scene file from the scene generators or a JSON layout.')
+    parser.add_argument('output', help='scene file to write (.npz)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the scene generators')
+    parser.add_argument('--from-json', metavar='FILE', help='convert a hand-written JSON layout instead')
+    parser.add_argument('--terrain', action='store_true', help='place the generated objects on the heightmap terrain')
+    parser.add_argument('--density', type=float, default=1.0, help='multiplier of the number of generated objects')
+    args = parser.parse_args(argv)
+
+    if args.from_json:
+        layout = SceneLayout.load_json(args.from_json)
+    else:
+        heightmap = get_heightmap(args.seed) if args.terrain else None
+        layout = SceneGenerator(args.seed, heightmap, density=args.density).generate()
+    layout.save(args.output)
+    print(f'wrote {len(layout)} placements of {len(layout.types)} types to {args.output}')
+
+
+# Entry point for writing scene files
+if __name__ == '__main__':
+    main()
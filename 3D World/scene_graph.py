@@ -0,0 +1,155 @@
+import glm
+from culling import OUTSIDE, INSIDE, transform_bounds, merge_bounds
+
+
+# SceneNode class
+class SceneNode:
+
+    """
+    a node of the scene graph. Every node has a
+    local transform relative to its parent, and
+    may carry a model that is drawn with the
+    node's world transform. Here's a summary of
+    its key features:
+
+        * Hierarchy: Nodes are linked with add_child.
+          A child's world matrix is its parent's world
+          matrix times its own local matrix, so moving a
+          parent (e.g. a tree trunk) moves everything
+          attached to it (e.g. its top).
+
+        * Dirty Flags: set_position, set_rotation and set_scale
+          only mark the node dirty, and every ancestor as having
+          a dirty descendant. update then walks only the dirty
+          parts of the tree and recomputes the matrices of the
+          changed nodes and their subtrees.
+
+        * World Bounds: A node with a model transforms the model's
+          mesh bounds into world space. The world bounds of every
+          node enclose its own bounds and those of its children,
+          and are refreshed on the way back up during update.
+
+        * Hierarchical Culling: collect_visible skips whole subtrees
+          whose bounds are outside the frustum, and stops testing
+          once a subtree is entirely inside it. Given a minimum
+          size, it collects the shadow casters instead: only the
+          models that cast shadows and whose world bounds are at
+          least that large.
+    """
+
+    def __init__(self, pos=(0, 0, 0), rot=(0, 0, 0), scale=(1, 1, 1), model=None):
+
+        # Local transform (rotation angles in degrees)
+        self.pos = glm.vec3(pos)
+        self.rot = glm.vec3(rot)
+        self.scale = glm.vec3(scale)
+
+        # Model drawn with this node's world matrix, and its mesh bounds
+        self.model = model
+        self.mesh_bounds = model.app.mesh.vao.vbo.vbos[model.vao_name].bounds if model else None
+
+        # Parent and children
+        self.parent = None
+        self.children = []
+
+        # Local and world matrices, and the world bounds of the node's own model and of the subtree
+        self.m_local = glm.mat4()
+        self.m_world = glm.mat4()
+        self.model_bounds = None
+        self.bounds = None
+
+        # Dirty flags: this node's transform changed / something below it changed
+        self.dirty = True
+        self.child_dirty = False
+
+    # Method to attach a child node
+    def add_child(self, node):
+        node.parent = self
+        self.children.append(node)
+        node.mark_dirty()
+        return node
+
+    # Method to detach a child node
+    def remove_child(self, node):
+        self.children.remove(node)
+        node.parent = None
+        self.mark_dirty()
+
+    # Method to flag the node as changed and let its ancestors know
+    def mark_dirty(self):
+        self.dirty = True
+        parent = self.parent
+        while parent is not None and not parent.child_dirty:
+            parent.child_dirty = True
+            parent = parent.parent
+
+    # Methods to change the local transform
+    def set_position(self, pos):
+        self.pos = glm.vec3(pos)
+        self.mark_dirty()
+
+    def set_rotation(self, rot):
+        self.rot = glm.vec3(rot)
+        self.mark_dirty()
+
+    def set_scale(self, scale):
+        self.scale = glm.vec3(scale)
+        self.mark_dirty()
+
+    # Method to calculate the local matrix (same order as BaseModel.get_model_matrix)
+    def get_local_matrix(self):
+        m_local = glm.translate(glm.mat4(), self.pos)
+        m_local = glm.rotate(m_local, glm.radians(self.rot.z), glm.vec3(0, 0, 1))
+        m_local = glm.rotate(m_local, glm.radians(self.rot.y), glm.vec3(0, 1, 0))
+        m_local = glm.rotate(m_local, glm.radians(self.rot.x), glm.vec3(1, 0, 0))
+        return glm.scale(m_local, self.scale)
+
+    # Method to bring the matrices and bounds of the dirty parts of the subtree up to date
+    def update(self, parent_changed=False):
+        changed = self.dirty or parent_changed
+        if not (changed or self.child_dirty):
+            return
+
+        if changed:
+            if self.dirty:
+                self.m_local = self.get_local_matrix()
+            self.m_world = self.parent.m_world * self.m_local if self.parent else self.m_local
+            if self.model:
+                self.model.m_model = self.m_world
+                self.model_bounds = transform_bounds(self.m_world, self.mesh_bounds)
+
+        # Recompute the subtree bounds from the node's own bounds and its children's
+        bounds = self.model_bounds
+        for child in self.children:
+            child.update(changed)
+            bounds = merge_bounds(bounds, child.bounds)
+        self.bounds = bounds
+
+        self.dirty = self.child_dirty = False
+
+    # Method to yield the node and every node below it
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    # Method to append the models of the subtree that may be visible in the frustum
+    # (with min_size, only the shadow casters whose largest side is at least min_size)
+    def collect_visible(self, frustum, visible, inside=False, min_size=None):
+        if not inside:
+            if self.bounds is None:
+                return
+            result = frustum.classify(self.bounds)
+            if result == OUTSIDE:
+                return
+            inside = result == INSIDE
+
+        if self.model and (min_size is None or self.is_caster(min_size)):
+            visible.append(self.model)
+        for child in self.children:
+            child.collect_visible(frustum, visible, inside, min_size)
+
+    # Method to tell whether the node's model casts shadows and is at least min_size across
+    def is_caster(self, min_size):
+        b_min, b_max = self.model_bounds
+        return self.model.casts_shadows and max(b_max - b_min) >= min_size
@@ -1,3 +1,57 @@
+from culling import Frustum
+from model import InstancedModel
+from resolution import DynamicResolution
+from gpu_memory import get_gpu_memory, MB
+
+# Objects whose world bounds are smaller than this across (their largest side) cast no shadows
+MIN_CASTER_SIZE = 0.25
+
+# Passes whose draw calls are counted separately in the frame statistics
+PASSES = ('shadow', 'main', 'skybox')
+
+
+# FramePacket class
+class FramePacket:
+
+    """
+    everything the OpenGL side of a frame
+    needs, worked out ahead of time by
+    SceneRenderer.prepare: the view, the
+    objects to draw in each pass with the
+    model matrix to draw them with, and the
+    instance data to upload. Because a packet
+    is a snapshot, it can be filled on one
+    thread while another submits the previous
+    one.
+    """
+
+    def __init__(self):
+
+        # View matrix and camera position the frame is drawn from
+        self.m_view = None
+        self.position = None
+
+        # (model, model matrix) pairs for the shadow and main passes (None for instanced models)
+        self.shadow_objects = []
+        self.objects = []
+
+        # (instanced model, first instance, matrices) uploads, and (instanced model, matrices) of the
+        # instances in view, drawn by the main pass
+        self.instance_uploads = []
+        self.visible_instances = []
+
+        # (terrain chunk, level of detail) pairs for the shadow and main passes
+        self.shadow_terrain = []
+        self.terrain = []
+
+        # Objects culled from the main pass, and from the shadow pass
+        self.culled = 0
+        self.shadow_culled = 0
+
+        # Lights binned into the clusters of the view: (first index, light count) per cluster, and light indices
+        self.light_grid = None
+        self.light_indices = None
+
 
 # SceneRenderer class
 class SceneRenderer:
@@ -22,17 +76,69 @@ class SceneRenderer:
 
         * Render Shadows: The render_shadow method 
         clears the depth framebuffer and iterates 
-        through each object in the scene, calling 
-        the render_shadow method for each object. 
+        through the shadow casters, calling the 
+        render_shadow method for each object. 
         This pass is responsible for rendering 
         shadows.
 
+        * Shadow Casters: prepare culls the objects and 
+        terrain chunks against the light's frustum (the 
+        projection and light view the shadow map is drawn 
+        with), and leaves out the objects that do not cast 
+        shadows (casts_shadows) or are smaller across than 
+        min_caster_size (MIN_CASTER_SIZE by default).
+
         * Main Rendering Pass: The main_render method 
         switches back to the screen framebuffer and 
-        renders each object in the scene and the skybox.
+        renders the objects of the scene that may be 
+        visible from the camera, followed by the skybox 
+        (render_skybox). Objects are culled against the 
+        camera frustum through the scene graph, a whole 
+        cell at a time where possible.
+
+        * Profiling: Each pass is wrapped in a CPU 
+        profiler scope and a GPU timer query scope 
+        (shadow, main, and skybox).
 
-        * Scene Update: The render method first updates 
-        the scene's state using the update method.
+        * Prepare and Submit: A frame is split in two. 
+        prepare updates the scene, culls and sorts the 
+        objects, and packs the instance data into a 
+        FramePacket without making any OpenGL calls, 
+        so it can run on a worker thread. submit then 
+        uploads the packet's instance data and issues 
+        the passes. render does both, one after the other.
+
+        * Lights: prepare bins the scene's point and spot 
+        lights into the clusters of the view (LightManager.bin) 
+        and submit uploads them before the passes.
+
+        * Terrain: If the scene has a terrain, prepare picks 
+        the level of detail of every chunk and the chunks 
+        visible from the camera, and both passes draw them 
+        after the objects. The triangles they submit are 
+        also counted in the stats (terrain_triangles).
+
+        * Dynamic Resolution: If the application asks 
+        for a frame time target, the main pass and skybox 
+        are rendered into a DynamicResolution target whose 
+        resolution follows the GPU frame time, and then 
+        upscaled to the screen.
+
+        * Frame Statistics: Every draw issued by the 
+        passes is counted in self.stats (draw calls 
+        and triangles, draw calls per pass as 
+        shadow_draw_calls, main_draw_calls and 
+        skybox_draw_calls, and the objects culled from 
+        the main and shadow passes), which is reset at the start of each 
+        frame and read by the benchmark. With dynamic 
+        resolution, the stats also hold the resolution 
+        scale and the share of frames meeting the target.
+        The totals of the GPU memory registry (gpu_memory.py) 
+        are copied in too (gpu_memory_mb, and gpu_buffer_mb, 
+        gpu_texture_mb and gpu_framebuffer_mb by kind), with 
+        the counts of the texture residency manager. submit 
+        starts by letting the residency manager bring the 
+        textures within their budget.
 
         * Resource Release: The destroy method is implemented 
         to release resources, such as the depth framebuffer 
@@ -46,41 +152,210 @@ class SceneRenderer:
         self.ctx = app.ctx
         self.mesh = app.mesh
         self.scene = app.scene
+        self.profiler = app.profiler
 
         # Depth buffer setup
         self.depth_texture = self.mesh.texture.textures['depth_texture']
         self.depth_fbo = self.ctx.framebuffer(depth_attachment=self.depth_texture)
+        self.gpu_memory = get_gpu_memory(self.ctx)
+        self.gpu_memory.add_framebuffer('shadow depth', self.depth_fbo)
+
+        # Frustum the shadow map is drawn with, and the smallest objects drawn into it
+        self.shadow_frustum = Frustum(app.camera.m_proj * app.light.m_view_light)
+        self.min_caster_size = MIN_CASTER_SIZE
+
+        # Per-frame statistics (draw calls and triangles submitted, in total and per pass, objects culled
+        # from the main and shadow passes, GPU memory in MB)
+        self.stats = {'draw_calls': 0, 'triangles': 0, 'culled': 0, 'shadow_culled': 0}
+        self.stats.update({f'{name}_draw_calls': 0 for name in PASSES})
+        self.record_memory()
+
+        # Packet reused by render when frames are not pipelined
+        self.packet = FramePacket()
+
+        # Offscreen target for dynamic resolution (if a frame time target is set)
+        self.resolution = None
+        if app.resolution_target is not None:
+            self.resolution = DynamicResolution(app, target_ms=app.resolution_target)
+            self.stats['resolution_scale'] = self.resolution.scale
+            self.stats['target_hit_rate'] = 1.0
+        if self.scene.terrain:
+            self.stats['terrain_triangles'] = 0
+
+    # Method to copy the GPU memory totals (in MB) into the frame statistics
+    def record_memory(self):
+        memory = self.gpu_memory
+        self.stats['gpu_memory_mb'] = memory.total / MB
+        for kind, size in memory.totals.items():
+            self.stats[f'gpu_{kind}_mb'] = size / MB
+
+        # Textures shrunk, evicted, restored and reloaded by the residency manager so far
+        for name, count in self.mesh.texture.residency.counts.items():
+            self.stats[f'textures_{name}'] = count
+
+    # Method to count a single draw of a vertex array by a pass in the frame statistics
+    def record_draw(self, name, vao, instances=1):
+        self.stats['draw_calls'] += 1
+        self.stats[f'{name}_draw_calls'] += 1
+        self.stats['triangles'] += vao.vertices // 3 * instances
+
+    # Method to count the draws of terrain chunks by a pass in the frame statistics
+    def record_terrain(self, name, chunks):
+        triangles = sum(self.scene.terrain.get_triangles(level) for chunk, level in chunks)
+        self.stats['draw_calls'] += len(chunks)
+        self.stats[f'{name}_draw_calls'] += len(chunks)
+        self.stats['triangles'] += triangles
+        self.stats['terrain_triangles'] += triangles
+
+    # Method to work out a frame from the given view, without any OpenGL calls
+    def prepare(self, packet, m_view, position):
+        profiler = self.profiler
+        scene = self.scene
+        packet.m_view, packet.position = m_view, position
+
+        # Update the scene's state and copy out the instance data that changed
+        with profiler.cpu('Scene.update'):
+            changed = scene.update()
+            packet.instance_uploads.clear()
+            for obj in scene.objects:
+                if isinstance(obj, InstancedModel):
+                    update = obj.get_instance_update(changed)
+                    if update is not None:
+                        packet.instance_uploads.append((obj, *update))
+
+        # Objects that may be visible from the camera, sorted by mesh so draws of the same mesh are adjacent
+        with profiler.cpu('cull'):
+            camera = self.app.camera
+            frustum = Frustum(camera.m_proj * m_view)
+            packet.visible_instances = []
+            visible = scene.get_visible_objects(frustum, packet.visible_instances)
+            visible.sort(key=lambda obj: obj.vao_name)
+            packet.objects = [(obj, None if isinstance(obj, InstancedModel) else obj.m_model) for obj in visible]
+            packet.culled = len(scene.objects) - len(visible)
+
+            # Shadow casters in the light's frustum
+            casters = scene.get_shadow_casters(self.shadow_frustum, self.min_caster_size)
+            casters.sort(key=lambda obj: obj.vao_name)
+            packet.shadow_objects = [(obj, None if isinstance(obj, InstancedModel) else obj.m_model)
+                                     for obj in casters]
+            packet.shadow_culled = len(scene.objects) - len(casters)
+
+        # Lights in the clusters of the view
+        with profiler.cpu('lights.bin'):
+            packet.light_grid, packet.light_indices = scene.lights.bin(m_view, self.app.camera.m_proj)
+
+        # Terrain chunks at their levels of detail
+        if scene.terrain:
+            with profiler.cpu('terrain.select'):
+                packet.terrain, packet.shadow_terrain = scene.terrain.select(frustum, position, self.shadow_frustum)
 
     # Method to render shadows using depth framebuffer
-    def render_shadow(self):
+    def render_shadow(self, packet):
 
         # Clear the depth framebuffer and render shadows for each object in the scene
         self.depth_fbo.clear()
         self.depth_fbo.use()
-        for obj in self.scene.objects:
+        for obj, m_model in packet.shadow_objects:
+            if m_model is not None:
+                obj.m_model = m_model
             obj.render_shadow()
+            self.record_draw('shadow', obj.shadow_vao, obj.instance_count)
+        if self.scene.terrain:
+            self.scene.terrain.render_shadow(packet.shadow_terrain)
+            self.record_terrain('shadow', packet.shadow_terrain)
 
     # Method for the main rendering pass
-    def main_render(self):
+    def main_render(self, packet):
 
-        # Switch back to the screen framebuffer and render each object in the scene and the skybox
-        self.app.ctx.screen.use()
-        for obj in self.scene.objects:
+        # Switch to the screen framebuffer (or the scaled offscreen one) and render each visible object
+        if self.resolution:
+            self.resolution.use(self.app.clear_color)
+        else:
+            self.app.framebuffer.use()
+        for obj, m_model in packet.objects:
+            if m_model is not None:
+                obj.m_model = m_model
             obj.render()
+            self.record_draw('main', obj.vao, obj.visible_count if isinstance(obj, InstancedModel) else 1)
+        if self.scene.terrain:
+            self.scene.terrain.render(packet.terrain)
+            self.record_terrain('main', packet.terrain)
+
+    # Method to render the skybox after the opaque objects
+    def render_skybox(self):
         self.scene.skybox.render()
+        self.record_draw('skybox', self.scene.skybox.vao)
+
+    # Method to upload a prepared frame and perform rendering passes
+    def submit(self, packet):
+
+        # Bring the textures within their budget for this frame
+        self.mesh.texture.residency.begin_frame()
+
+        # Reset the frame statistics
+        self.stats['draw_calls'] = 0
+        self.stats['triangles'] = 0
+        self.stats['culled'] = packet.culled
+        self.stats['shadow_culled'] = packet.shadow_culled
+        for name in PASSES:
+            self.stats[f'{name}_draw_calls'] = 0
+        self.record_memory()
+        if self.scene.terrain:
+            self.stats['terrain_triangles'] = 0
 
-    # Method to update the scene and perform rendering passes
-    def render(self):
+        profiler = self.profiler
+        resolution = self.resolution
+        if resolution:
+            resolution.begin_frame()
 
-        # Update the scene's state
-        self.scene.update()
+        # The models read the view (and the position it looks from) from the camera
+        camera = self.app.camera
+        camera.m_view, camera.view_position = packet.m_view, packet.position
+
+        # Upload the instance data that changed
+        with profiler.cpu('upload_instances'):
+            for obj, first, matrices in packet.instance_uploads:
+                obj.write_instances(first, matrices)
+            for obj, matrices in packet.visible_instances:
+                obj.write_visible_instances(matrices)
+
+        # Upload the binned lights and bind them for the programs shading with them
+        with profiler.cpu('upload_lights'):
+            lights = self.scene.lights
+            lights.upload(packet.light_grid, packet.light_indices)
+            lights.use(self.mesh.vao.program.cache.values())
 
         # Rendering pass 1: Render shadows
-        self.render_shadow()
+        with profiler.cpu('render_shadow'), profiler.gpu('shadow'):
+            self.render_shadow(packet)
 
         # Rendering pass 2: Main rendering
-        self.main_render()
+        with profiler.cpu('main_render'), profiler.gpu('main'):
+            self.main_render(packet)
+
+        # Rendering pass 3: Skybox
+        with profiler.cpu('render_skybox'), profiler.gpu('skybox'):
+            self.render_skybox()
+
+        # Stretch a scaled frame over the screen
+        if resolution:
+            with profiler.cpu('upscale'), profiler.gpu('upscale'):
+                resolution.present()
+            resolution.end_frame()
+            self.stats['resolution_scale'] = resolution.scale
+            self.stats['target_hit_rate'] = resolution.hit_rate
+
+    # Method to update the scene and perform rendering passes (or submit an already prepared frame)
+    def render(self, packet=None):
+        if packet is None:
+            camera = self.app.camera
+            packet = self.packet
+            self.prepare(packet, camera.m_view, camera.view_position)
+        self.submit(packet)
 
     # Method to release resources (e.g., framebuffer)
     def destroy(self):
+        self.gpu_memory.remove(self.depth_fbo)
         self.depth_fbo.release()
+        if self.resolution:
+            self.resolution.destroy()
@@ -1,3 +1,31 @@
+import os
+import re
+import moderngl as mgl
+from startup import get_startup_trace
+
+# Directory holding the shader sources (shared #include files end in .glsl)
+SHADER_DIR = 'shaders'
+
+# Matches an #include "file" line
+INCLUDE_PATTERN = re.compile(r'^[ \t]*#include[ \t]+"([^"]+)"[ \t]*$', re.MULTILINE)
+
+# Variants compiled up front by precompile, as (vertex shader, fragment shader, defines)
+PRECOMPILED_VARIANTS = [
+    ('default', 'default', {}),
+    ('default', 'default', {'INSTANCED': 1}),
+    ('default', 'default', {'CLUSTERED_LIGHTS': 1}),
+    ('default', 'default', {'CLUSTERED_LIGHTS': 1, 'INSTANCED': 1}),
+    ('default', 'default', {'SHADOW_FILTER': 1}),
+    ('default', 'default', {'SHADOW_FILTER': 4}),
+    ('default', 'default', {'SHADOW_FILTER': 64}),
+    ('shadow_map', 'shadow_map', {}),
+    ('shadow_map', 'shadow_map', {'INSTANCED': 1}),
+    ('skybox', 'skybox', {}),
+    ('advanced_skybox', 'advanced_skybox', {}),
+    ('upscale', 'upscale', {}),
+]
+
+
 # ShaderProgram class
 class ShaderProgram:
 
@@ -22,59 +50,208 @@ class ShaderProgram:
         shader program using the ctx.program method. The 
         compiled shader program is returned.
 
+        * Variants: get_program also takes a dictionary of 
+        defines. They are injected as #define lines right 
+        after the #version line of both shaders, so one 
+        source can be specialized with #ifdef / #if (e.g. 
+        INSTANCED, or SHADOW_FILTER to pick the number of 
+        shadow taps). Features that are switched off are 
+        removed by the preprocessor and cost nothing. The 
+        defines given to the constructor go into every 
+        default-shader program (e.g. CLUSTERED_LIGHTS, for 
+        scenes with point and spot lights).
+
+        * Includes: #include "file" lines are replaced by the 
+        contents of that file in the 'shaders' directory (each 
+        file is included once per shader).
+
+        * Error Lines: Every file gets a source string number 
+        (source_numbers), and #line directives around the 
+        injected defines and every included file keep the 
+        line numbers of compile errors pointing at the right 
+        line of the right file. The error lists which file 
+        each source string number stands for.
+
+        * Variant Cache: Compiled programs are cached by 
+        (vertex shader, fragment shader, defines), so asking 
+        for the same variant again returns the same program 
+        and it is only compiled the first time it is needed. 
+        precompile compiles a declared set of variants 
+        (PRECOMPILED_VARIANTS) up front, e.g. at startup.
+
+        * Reloading: The files each variant was built from 
+        (including its includes) are remembered, and reload 
+        recompiles the variants that depend on changed files. 
+        A variant that fails to compile keeps its old program 
+        and the error is printed; the uniforms of the old 
+        program are copied into the new one.
+
         * Shader Program Storage: The loaded shader programs are 
         stored in the programs dictionary with keys corresponding 
         to different shader types, such as 'default', 'skybox', 
-        'advanced_skybox', and 'shadow_map'.
+        'advanced_skybox', and 'shadow_map'. The 'instanced' and 
+        'shadow_instanced' programs are the INSTANCED variants of 
+        the default and shadow map shaders. The 'upscale' program 
+        stretches a frame rendered at a lower resolution over the 
+        screen.
 
         * Resource Release: The destroy method is implemented to 
         release resources for all loaded shader programs. It iterates 
         through the dictionary of shader programs and releases each program.
     """
 
-    def __init__(self, ctx):
+    def __init__(self, ctx, defines=None):
 
-        # Reference to the context and dictionary to store shader programs
+        # Reference to the context, dictionary to store shader programs, and the cache of compiled variants
+        # (with the defines of every program drawn with the default shaders)
         self.ctx = ctx
+        self.defines = dict(defines or {})
         self.programs = {}
+        self.cache = {}
+        self.dependencies = {}
+
+        # Source string number of every shader file read (the number compile errors report it by)
+        self.source_numbers = {}
 
         # Load and store default shader programs
-        self.programs['default'] = self.get_program('default')
+        self.programs['default'] = self.get_program('default', defines=self.defines)
         self.programs['skybox'] = self.get_program('skybox')
         self.programs['advanced_skybox'] = self.get_program('advanced_skybox')
         self.programs['shadow_map'] = self.get_program('shadow_map')
-        self.programs['plane'] = self.get_program('default')
-        self.programs['grasspatch'] = self.get_program('default')
-        self.programs['militaryvehicle'] = self.get_program('default')
-        self.programs['tree'] = self.get_program('default')
-        self.programs['treetop'] = self.get_program('default')
-        self.programs['cactus'] = self.get_program('default')
-        self.programs['treetrunk'] = self.get_program('default')
-        self.programs['smallrock'] = self.get_program('default')
-        self.programs['stone_a'] = self.get_program('default')
-        self.programs['stone_b'] = self.get_program('default')
-        self.programs['stone_c'] = self.get_program('default')
-        self.programs['camel'] = self.get_program('default')
-        self.programs['pyramid'] = self.get_program('default')
-        self.programs['plane_dirt'] = self.get_program('default')
-        self.programs['plane_grass'] = self.get_program('default')
-        self.programs['plane_sand'] = self.get_program('default')
+        self.programs['plane'] = self.get_program('default', defines=self.defines)
+        self.programs['grasspatch'] = self.get_program('default', defines=self.defines)
+        self.programs['militaryvehicle'] = self.get_program('default', defines=self.defines)
+        self.programs['tree'] = self.get_program('default', defines=self.defines)
+        self.programs['treetop'] = self.get_program('default', defines=self.defines)
+        self.programs['cactus'] = self.get_program('default', defines=self.defines)
+        self.programs['treetrunk'] = self.get_program('default', defines=self.defines)
+        self.programs['smallrock'] = self.get_program('default', defines=self.defines)
+        self.programs['stone_a'] = self.get_program('default', defines=self.defines)
+        self.programs['stone_b'] = self.get_program('default', defines=self.defines)
+        self.programs['stone_c'] = self.get_program('default', defines=self.defines)
+        self.programs['camel'] = self.get_program('default', defines=self.defines)
+        self.programs['pyramid'] = self.get_program('default', defines=self.defines)
+        self.programs['plane_dirt'] = self.get_program('default', defines=self.defines)
+        self.programs['plane_grass'] = self.get_program('default', defines=self.defines)
+        self.programs['plane_sand'] = self.get_program('default', defines=self.defines)
+        self.programs['instanced'] = self.get_program('default', defines={**self.defines, 'INSTANCED': 1})
+        self.programs['shadow_instanced'] = self.get_program('shadow_map', defines={'INSTANCED': 1})
+        self.programs['upscale'] = self.get_program('upscale')
+
+    # Method to get the key of a variant in the cache
+    def get_variant_key(self, shader_program_name, fragment_shader_name=None, defines=None):
+        defines = tuple(sorted((str(name), str(value)) for name, value in (defines or {}).items()))
+        return shader_program_name, fragment_shader_name or shader_program_name, defines
+
+    # Method to get a shader program variant, compiling it the first time it is asked for
+    # (the fragment shader defaults to the one with the same name as the vertex shader)
+    def get_program(self, shader_program_name, fragment_shader_name=None, defines=None):
+        key = self.get_variant_key(shader_program_name, fragment_shader_name, defines)
+        if key not in self.cache:
+            self.dependencies[key] = set()
+            self.cache[key] = self.compile_program(*key, self.dependencies[key])
+        return self.cache[key]
 
     # Method to load and compile vertex and fragment shaders, then create a shader program
-    def get_program(self, shader_program_name):
+    # (the names of the files read are added to dependencies)
+    def compile_program(self, shader_program_name, fragment_shader_name, defines, dependencies=None):
 
         # Read vertex shader code from file
-        with open(f'shaders/{shader_program_name}.vert') as file:
-            vertex_shader = file.read()
+        vertex_shader = self.get_source(f'{shader_program_name}.vert', defines, dependencies)
 
         # Read fragment shader code from file
-        with open(f'shaders/{shader_program_name}.frag') as file:
-            fragment_shader = file.read()
+        fragment_shader = self.get_source(f'{fragment_shader_name}.frag', defines, dependencies)
 
-        # Create and return the shader program
-        program = self.ctx.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
+        # Create and return the shader program (timed in the startup trace under the variant's name)
+        defines_text = ''.join(f' {key}={value}' for key, value in defines)
+        name = f'{shader_program_name}/{fragment_shader_name}{defines_text}'
+        with get_startup_trace(self.ctx).asset('shader compile', name):
+            try:
+                program = self.ctx.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
+            except mgl.Error as error:
+                sources = ', '.join(f'{number} = {file_name}' for file_name, number in self.source_numbers.items())
+                raise mgl.Error(f'{error}\n(source strings: {sources})') from error
         return program
 
+    # Method to read a shader source, resolve its includes and inject the defines after #version
+    def get_source(self, file_name, defines=(), dependencies=None):
+        included = set()
+        source = self.read_source(file_name, included)
+        if dependencies is not None:
+            dependencies.update(included)
+
+        # Keep the line numbers of compile errors matching the file (#line sets the next line's number)
+        version, _, body = source.partition('\n')
+        lines = [version] + [f'#define {name} {value}' for name, value in defines]
+        lines += [f'#line 2 {self.get_source_number(file_name)}', body]
+        return '\n'.join(lines)
+
+    # Method to get the source string number of a shader file (numbered in the order they are first read)
+    def get_source_number(self, file_name):
+        return self.source_numbers.setdefault(file_name, len(self.source_numbers))
+
+    # Method to read a shader file and replace its #include lines (each file is included once), wrapped in
+    # #line directives so the lines of the included file and of the rest of this one keep their numbers
+    def read_source(self, file_name, included):
+        included.add(file_name)
+        number = self.get_source_number(file_name)
+        with open(os.path.join(SHADER_DIR, file_name)) as file:
+            source = file.read()
+
+        def include(match):
+            name = match.group(1)
+            if name in included:
+                return ''
+            text = self.read_source(name, included)
+            next_line = source.count('\n', 0, match.start()) + 2
+            return f'#line 1 {self.get_source_number(name)}\n{text}\n#line {next_line} {number}'
+
+        return INCLUDE_PATTERN.sub(include, source)
+
+    # Method to compile a set of variants ahead of time (PRECOMPILED_VARIANTS by default)
+    def precompile(self, variants=PRECOMPILED_VARIANTS):
+        for shader_program_name, fragment_shader_name, defines in variants:
+            self.get_program(shader_program_name, fragment_shader_name, defines)
+
+    # Method to recompile every variant built from one of the changed files
+    # Returns the (old program, new program) pairs that were replaced
+    def reload(self, changed_files):
+        replaced = []
+        for key, program in list(self.cache.items()):
+            if not self.dependencies[key] & set(changed_files):
+                continue
+
+            # A broken shader keeps the old program running
+            dependencies = set()
+            try:
+                new_program = self.compile_program(*key, dependencies)
+            except (mgl.Error, OSError) as error:
+                print(f'shader reload failed for {key[0]}.vert/{key[1]}.frag {dict(key[2])}:\n{error}')
+                continue
+
+            self.copy_uniforms(program, new_program)
+            self.cache[key] = new_program
+            self.dependencies[key] = dependencies
+            replaced.append((program, new_program))
+
+        # Point the named programs at their new versions
+        new_programs = {old.glo: new for old, new in replaced}
+        for name, program in self.programs.items():
+            self.programs[name] = new_programs.get(program.glo, program)
+        return replaced
+
+    # Method to copy the values of the uniforms two programs have in common
+    def copy_uniforms(self, old_program, new_program):
+        for name in new_program:
+            member, old_member = new_program[name], old_program.get(name, None)
+            if isinstance(member, mgl.Uniform) and isinstance(old_member, mgl.Uniform):
+
+                # Uniforms whose type changed keep their default value
+                try:
+                    member.write(old_member.read())
+                except mgl.Error:
+                    pass
+
     # Method to release resources for all loaded shader programs
     def destroy(self):
-        [program.release() for program in self.programs.values()]
+        [program.release() for program in self.cache.values()]
@@ -0,0 +1,57 @@
+// Clustered point and spot lights for default.frag (expects clipPos, fragPos and camPos)
+// The lights, the clusters and their light indices come from LightManager (light_clusters.py)
+
+// Three texels per light: (position, radius), (color, cos of the outer angle), (direction, cos of the inner angle)
+uniform sampler2D u_lights;
+// (first index, light count) of every cluster: screen tiles along x, depth slices along y
+uniform usampler2D u_light_grid;
+// Light indices of all the clusters, one after the other
+uniform usampler2D u_light_indices;
+// Clusters along x, y and depth, and the near plane and log(far / near) the depth slices span
+uniform ivec3 u_cluster_grid;
+uniform vec2 u_cluster_depth;
+
+
+// Cluster of the fragment as its texel of the light grid
+ivec2 getCluster() {
+    vec2 ndc = clipPos.xy / clipPos.w;
+    ivec2 tile = clamp(ivec2((ndc * 0.5 + 0.5) * vec2(u_cluster_grid.xy)), ivec2(0), u_cluster_grid.xy - 1);
+    float depth = log(max(clipPos.w, u_cluster_depth.x) / u_cluster_depth.x) / u_cluster_depth.y;
+    int slice = clamp(int(depth * float(u_cluster_grid.z)), 0, u_cluster_grid.z - 1);
+    return ivec2(tile.y * u_cluster_grid.x + tile.x, slice);
+}
+
+
+// Diffuse and specular light of the lights in the fragment's cluster
+vec3 getClusteredLight(vec3 Normal, vec3 viewDir) {
+    // the uniforms stay zero until LightManager.use sets them, which it skips while there are no lights
+    if (u_cluster_grid.x == 0) {
+        return vec3(0.0);
+    }
+    uvec2 cluster = texelFetch(u_light_grid, getCluster(), 0).xy;
+    int width = textureSize(u_light_indices, 0).x;
+    vec3 result = vec3(0.0);
+
+    for (int i = 0; i < int(cluster.y); i++) {
+        int index = int(cluster.x) + i;
+        int light = int(texelFetch(u_light_indices, ivec2(index % width, index / width), 0).r);
+        vec4 positionRadius = texelFetch(u_lights, ivec2(0, light), 0);
+        vec4 colorOuter = texelFetch(u_lights, ivec2(1, light), 0);
+        vec4 directionInner = texelFetch(u_lights, ivec2(2, light), 0);
+
+        // falloff reaching zero at the light's radius
+        vec3 toLight = positionRadius.xyz - fragPos;
+        float distance = length(toLight);
+        vec3 lightDir = toLight / max(distance, 1e-4);
+        float falloff = clamp(1.0 - pow(distance / positionRadius.w, 4.0), 0.0, 1.0);
+        float attenuation = falloff * falloff / (distance * distance + 1.0);
+
+        // spot cone (point lights have an outer cosine below -1, so every direction is inside)
+        float spot = smoothstep(colorOuter.w, directionInner.w, dot(-lightDir, directionInner.xyz));
+
+        float diff = max(0, dot(lightDir, Normal));
+        float spec = pow(max(dot(viewDir, reflect(-lightDir, Normal)), 0), 32);
+        result += colorOuter.rgb * (diff + spec) * attenuation * spot;
+    }
+    return result;
+}
@@ -6,6 +6,7 @@ in vec2 uv_0;
 in vec3 normal;
 in vec3 fragPos;
 in vec4 shadowCoord;
+in vec4 clipPos;
 
 struct Light {
     vec3 position;
@@ -21,56 +22,10 @@ uniform sampler2DShadow shadowMap;
 uniform vec2 u_resolution;
 
 
-float lookup(float ox, float oy) {
-    vec2 pixelOffset = 1 / u_resolution;
-    return textureProj(shadowMap, shadowCoord + vec4(ox * pixelOffset.x * shadowCoord.w,
-                                                     oy * pixelOffset.y * shadowCoord.w, 0.0, 0.0));
-}
-
-
-float getSoftShadowX4() {
-    float shadow;
-    float swidth = 1.5;  // shadow spread
-    vec2 offset = mod(floor(gl_FragCoord.xy), 2.0) * swidth;
-    shadow += lookup(-1.5 * swidth + offset.x, 1.5 * swidth - offset.y);
-    shadow += lookup(-1.5 * swidth + offset.x, -0.5 * swidth - offset.y);
-    shadow += lookup( 0.5 * swidth + offset.x, 1.5 * swidth - offset.y);
-    shadow += lookup( 0.5 * swidth + offset.x, -0.5 * swidth - offset.y);
-    return shadow / 4.0;
-}
-
-
-
-float getSoftShadowX16() {
-    float shadow;
-    float swidth = 1.0;
-    float endp = swidth * 1.5;
-    for (float y = -endp; y <= endp; y += swidth) {
-        for (float x = -endp; x <= endp; x += swidth) {
-            shadow += lookup(x, y);
-        }
-    }
-    return shadow / 16.0;
-}
-
-
-float getSoftShadowX64() {
-    float shadow;
-    float swidth = 0.6;
-    float endp = swidth * 3.0 + swidth / 2.0;
-    for (float y = -endp; y <= endp; y += swidth) {
-        for (float x = -endp; x <= endp; x += swidth) {
-            shadow += lookup(x, y);
-        }
-    }
-    return shadow / 64;
-}
-
-
-float getShadow() {
-    float shadow = textureProj(shadowMap, shadowCoord);
-    return shadow;
-}
+#include "shadow_filter.glsl"
+#ifdef CLUSTERED_LIGHTS
+#include "clustered_lights.glsl"
+#endif
 
 
 vec3 getLight(vec3 color) {
@@ -90,11 +45,17 @@ vec3 getLight(vec3 color) {
     float spec = pow(max(dot(viewDir, reflectDir), 0), 32);
     vec3 specular = spec * light.Is;
 
-    // shadow
-//    float shadow = getShadow();
-    float shadow = getSoftShadowX16();
+    // shadow (filtered with SHADOW_FILTER taps)
+    float shadow = getFilteredShadow();
+
+    // point and spot lights of the fragment's cluster (in the CLUSTERED_LIGHTS variant)
+#ifdef CLUSTERED_LIGHTS
+    vec3 clustered = getClusteredLight(Normal, viewDir);
+#else
+    vec3 clustered = vec3(0.0);
+#endif
 
-    return color * (ambient + (diffuse + specular) * shadow);
+    return color * (ambient + (diffuse + specular) * shadow + clustered);
 }
 
 
@@ -3,16 +3,22 @@
 layout (location = 0) in vec2 in_texcoord_0;
 layout (location = 1) in vec3 in_normal;
 layout (location = 2) in vec3 in_position;
+#ifdef INSTANCED
+layout (location = 3) in mat4 in_instance_model;
+#endif
 
 out vec2 uv_0;
 out vec3 normal;
 out vec3 fragPos;
 out vec4 shadowCoord;
+out vec4 clipPos;
 
 uniform mat4 m_proj;
 uniform mat4 m_view;
 uniform mat4 m_view_light;
+#ifndef INSTANCED
 uniform mat4 m_model;
+#endif
 
 mat4 m_shadow_bias = mat4(
     0.5, 0.0, 0.0, 0.0,
@@ -23,10 +29,14 @@ mat4 m_shadow_bias = mat4(
 
 
 void main() {
+#ifdef INSTANCED
+    mat4 m_model = in_instance_model;
+#endif
     uv_0 = in_texcoord_0;
     fragPos = vec3(m_model * vec4(in_position, 1.0));
     normal = mat3(transpose(inverse(m_model))) * normalize(in_normal);
     gl_Position = m_proj * m_view * m_model * vec4(in_position, 1.0);
+    clipPos = gl_Position;
 
     mat4 shadowMVP = m_proj * m_view_light * m_model;
     shadowCoord = m_shadow_bias * shadowMVP * vec4(in_position, 1.0);
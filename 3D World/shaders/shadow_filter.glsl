@@ -0,0 +1,70 @@
+// Shadow map lookups for default.frag (expects shadowMap, shadowCoord and u_resolution)
+// SHADOW_FILTER picks the number of taps: 1 (hard shadows), 4, 16 or 64
+#ifndef SHADOW_FILTER
+#define SHADOW_FILTER 16
+#endif
+
+
+float lookup(float ox, float oy) {
+    vec2 pixelOffset = 1 / u_resolution;
+    return textureProj(shadowMap, shadowCoord + vec4(ox * pixelOffset.x * shadowCoord.w,
+                                                     oy * pixelOffset.y * shadowCoord.w, 0.0, 0.0));
+}
+
+
+float getSoftShadowX4() {
+    float shadow;
+    float swidth = 1.5;  // shadow spread
+    vec2 offset = mod(floor(gl_FragCoord.xy), 2.0) * swidth;
+    shadow += lookup(-1.5 * swidth + offset.x, 1.5 * swidth - offset.y);
+    shadow += lookup(-1.5 * swidth + offset.x, -0.5 * swidth - offset.y);
+    shadow += lookup( 0.5 * swidth + offset.x, 1.5 * swidth - offset.y);
+    shadow += lookup( 0.5 * swidth + offset.x, -0.5 * swidth - offset.y);
+    return shadow / 4.0;
+}
+
+
+
+float getSoftShadowX16() {
+    float shadow;
+    float swidth = 1.0;
+    float endp = swidth * 1.5;
+    for (float y = -endp; y <= endp; y += swidth) {
+        for (float x = -endp; x <= endp; x += swidth) {
+            shadow += lookup(x, y);
+        }
+    }
+    return shadow / 16.0;
+}
+
+
+float getSoftShadowX64() {
+    float shadow;
+    float swidth = 0.6;
+    float endp = swidth * 3.0 + swidth / 2.0;
+    for (float y = -endp; y <= endp; y += swidth) {
+        for (float x = -endp; x <= endp; x += swidth) {
+            shadow += lookup(x, y);
+        }
+    }
+    return shadow / 64;
+}
+
+
+float getShadow() {
+    float shadow = textureProj(shadowMap, shadowCoord);
+    return shadow;
+}
+
+
+float getFilteredShadow() {
+#if SHADOW_FILTER == 1
+    return getShadow();
+#elif SHADOW_FILTER == 4
+    return getSoftShadowX4();
+#elif SHADOW_FILTER == 64
+    return getSoftShadowX64();
+#else
+    return getSoftShadowX16();
+#endif
+}
@@ -1,12 +1,20 @@
 #version 330 core
 
 layout (location = 2) in vec3 in_position;
+#ifdef INSTANCED
+layout (location = 3) in mat4 in_instance_model;
+#endif
 
 uniform mat4 m_proj;
 uniform mat4 m_view_light;
+#ifndef INSTANCED
 uniform mat4 m_model;
+#endif
 
 void main() {
+#ifdef INSTANCED
+    mat4 m_model = in_instance_model;
+#endif
     mat4 mvp = m_proj * m_view_light * m_model;
     gl_Position = mvp * vec4(in_position, 1.0);
 }
\ No newline at end of file
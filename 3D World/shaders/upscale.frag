@@ -0,0 +1,13 @@
+#version 330 core
+out vec4 fragColor;
+
+in vec2 uv;
+
+uniform sampler2D u_texture_0;
+uniform vec2 u_scale;
+
+
+void main() {
+    // The frame only covers the bottom-left u_scale part of the texture
+    fragColor = vec4(texture(u_texture_0, uv * u_scale).rgb, 1.0);
+}
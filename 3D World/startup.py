@@ -0,0 +1,314 @@
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+import numpy as np
+
+# Warm-start cache settings
+CACHE_DIR = '.warm_cache'  # Directory of the warm-start cache (relative to the working directory)
+CACHE_VERSION = 1  # Bumped whenever a cached artifact changes format (every older entry is then ignored)
+
+# Categories of the per-asset timings, in report order
+CATEGORIES = ('obj parse', 'numpy', 'mesh optimize', 'buffer upload', 'png decode', 'mipmaps', 'shader compile',
+              'construct', 'cache read', 'cache write')
+
+# Assets listed per category in the report
+REPORT_ASSETS = 5
+
+# Thread ids used for the Chrome trace
+PHASE_TID = 1
+ASSET_TID = 2
+
+
+# Scope timing a startup phase (category None) or one category of work on an asset
+class StartupScope:
+
+    def __init__(self, trace, category, name):
+        self.trace = trace
+        self.category = category
+        self.name = name
+        self.start = 0.0
+        self.record = None
+
+    def __enter__(self):
+        if self.category is None:
+            self.record = self.trace.begin_phase(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add_sample(self, self.start, time.perf_counter())
+        return False
+
+
+# Get the startup trace of a context (the engine installs its own, otherwise a new one is started)
+def get_startup_trace(ctx):
+    if not isinstance(ctx.extra, dict):
+        ctx.extra = {}
+    if 'startup_trace' not in ctx.extra:
+        ctx.extra['startup_trace'] = StartupTrace()
+    return ctx.extra['startup_trace']
+
+
+# Get the warm-start cache of a context (a disabled one, unless the engine installed one)
+def get_warm_cache(ctx):
+    if not isinstance(ctx.extra, dict):
+        ctx.extra = {}
+    if 'warm_cache' not in ctx.extra:
+        ctx.extra['warm_cache'] = WarmStartCache(None, get_startup_trace(ctx))
+    return ctx.extra['warm_cache']
+
+
+# Give a context the startup trace and warm-start cache of an engine
+def install_startup(ctx, trace, cache):
+    if not isinstance(ctx.extra, dict):
+        ctx.extra = {}
+    ctx.extra['startup_trace'] = trace
+    ctx.extra['warm_cache'] = cache
+
+
+# StartupTrace class
+class StartupTrace:
+
+    """
+    records where the time goes while the engine
+    starts. Here's a summary of its key features:
+
+        * Phases: phase returns a context manager timing
+          a step of the startup (creating the context,
+          the mesh, the scene, ...). Phases nest, and are
+          reported in the order they started, indented
+          under the phase they ran in.
+
+        * Assets: asset times one category of work
+          (CATEGORIES: OBJ parsing, NumPy conversion,
+          mesh optimization, buffer uploads, PNG decoding,
+          mipmap building, shader compilation, object
+          construction, and warm-start cache reads and
+          writes) on one asset, e.g. 'png decode' of
+          'textures/tree.png'. The times of the same asset
+          and category add up.
+
+        * Report: print_report writes the phases as a tree
+          with their times and share of the startup, then
+          the total of every category and its slowest
+          assets. export_chrome_trace writes every scope as
+          Chrome trace-event JSON, like the frame profiler.
+
+        * Always On: A scope costs two perf_counter calls,
+          so the trace records every startup.
+    """
+
+    def __init__(self):
+
+        # Start of the startup, its end (set by finish), and the depth of the phase being timed
+        self.origin = time.perf_counter()
+        self.end = None
+        self.depth = 0
+
+        # Phases as [name, depth, duration ms] in the order they started
+        self.phases = []
+
+        # Total milliseconds and number of scopes per (category, asset), and every scope as a trace event
+        self.assets = defaultdict(lambda: [0.0, 0])
+        self.events = []
+
+    # Method to get a scope timing a startup phase
+    def phase(self, name):
+        return StartupScope(self, None, name)
+
+    # Method to get a scope timing one category of work on an asset
+    def asset(self, category, name):
+        return StartupScope(self, category, name)
+
+    # Method to open a phase (in the tree under the phases still open)
+    # Returns its record
+    def begin_phase(self, name):
+        record = [name, self.depth, 0.0]
+        self.phases.append(record)
+        self.depth += 1
+        return record
+
+    # Method to record a finished scope
+    def add_sample(self, scope, start, end):
+        duration_ms = (end - start) * 1000.0
+        if scope.category is None:
+            self.depth -= 1
+            scope.record[2] = duration_ms
+        else:
+            entry = self.assets[scope.category, scope.name]
+            entry[0] += duration_ms
+            entry[1] += 1
+        self.events.append({
+            'name': scope.name, 'cat': scope.category or 'phase', 'ph': 'X', 'pid': 1,
+            'tid': PHASE_TID if scope.category is None else ASSET_TID,
+            'ts': (start - self.origin) * 1e6, 'dur': duration_ms * 1000.0,
+        })
+
+    # Method to mark the end of the startup
+    def finish(self):
+        self.end = time.perf_counter()
+
+    # Milliseconds from the start of the startup to its end (or to now, while it runs)
+    @property
+    def total_ms(self):
+        return ((self.end or time.perf_counter()) - self.origin) * 1000.0
+
+    # Method to get the total milliseconds and scope count of every category, with its assets slowest first
+    def get_categories(self):
+        categories = {}
+        for (category, name), (total_ms, count) in self.assets.items():
+            entry = categories.setdefault(category, {'ms': 0.0, 'count': 0, 'assets': []})
+            entry['ms'] += total_ms
+            entry['count'] += count
+            entry['assets'].append((name, total_ms))
+        for entry in categories.values():
+            entry['assets'].sort(key=lambda asset: -asset[1])
+        return categories
+
+    # Method to print the phases and the per-category and per-asset times
+    def print_report(self, assets=REPORT_ASSETS):
+        total_ms = self.total_ms
+        print(f'--- startup: {total_ms:.1f} ms ---')
+        print(f"{'phase':<40} {'ms':>9} {'share':>7}")
+        for name, depth, duration_ms in self.phases:
+            print(f"{'  ' * depth + name:<40} {duration_ms:>9.1f} {duration_ms / total_ms:>7.1%}")
+
+        categories = self.get_categories()
+        print(f"{'category / asset':<40} {'ms':>9} {'count':>7}")
+        order = list(CATEGORIES) + sorted(set(categories) - set(CATEGORIES))
+        for category in order:
+            entry = categories.get(category)
+            if entry is None:
+                continue
+            print(f"{category:<40} {entry['ms']:>9.1f} {entry['count']:>7}")
+            for name, asset_ms in entry['assets'][:assets]:
+                print(f"{'  ' + name[-38:]:<40} {asset_ms:>9.1f}")
+
+    # Method to write the recorded scopes as Chrome trace-event JSON
+    def export_chrome_trace(self, path):
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': PHASE_TID, 'args': {'name': 'Phases'}},
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': ASSET_TID, 'args': {'name': 'Assets'}},
+        ]
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms'}, file)
+
+
+# WarmStartCache class
+class WarmStartCache:
+
+    """
+    keeps what the engine derives from its asset
+    files on disk, so the next launch reads it back
+    instead of deriving it again. Here's a summary
+    of its key features:
+
+        * Artifacts: get returns the arrays of an artifact
+          (a dictionary of NumPy arrays), read from the cache
+          when they are there, and otherwise made by a build
+          function and written to it. The engine caches the
+          vertex arrays parsed from the OBJ files, the optimized
+          meshes, the decoded and flipped pixels of the PNG files,
+          the generated scene layouts and the meshes' triangle BVHs.
+
+        * Keys: Every entry is named after the artifact and a
+          hash of CACHE_VERSION, its parameters and the size
+          and modification time of the source files it was
+          derived from. Editing a source (or changing how it
+          is derived) gives a new key, so stale entries are
+          never read, only left behind (clear removes them).
+
+        * Raw Files: Entries are uncompressed .npz files, so
+          reading one is little more than a file read. They are
+          written to a temporary file and renamed into place,
+          so workers sharing the cache (e.g. the render farm's)
+          never read a half written entry. An entry that cannot
+          be read is built again.
+
+        * Disabled Cache: With no directory, get always builds.
+          Reads, writes and misses are counted, and timed in the
+          startup trace as 'cache read' and 'cache write'.
+    """
+
+    def __init__(self, directory=CACHE_DIR, trace=None):
+
+        # Directory of the entries (None disables the cache) and the trace the reads and writes are timed in
+        self.directory = directory
+        self.trace = trace or StartupTrace()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        # Entries read, built and written, and the bytes read
+        self.counts = {'hits': 0, 'misses': 0, 'writes': 0}
+        self.bytes_read = 0
+
+    # Whether entries are read and written
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    # Method to get the file of an artifact of a kind, derived from source files with parameters
+    def get_path(self, kind, name, sources=(), params=()):
+        digest = hashlib.sha1(repr((CACHE_VERSION, kind, name, tuple(params))).encode())
+        for source in sources:
+            stat = os.stat(source) if os.path.exists(source) else None
+            digest.update(repr((source, stat and stat.st_size, stat and stat.st_mtime_ns)).encode())
+        label = ''.join(char if char.isalnum() else '_' for char in os.path.basename(str(name)))
+        return os.path.join(self.directory, f'{kind}-{label}-{digest.hexdigest()[:16]}.npz')
+
+    # Method to get the arrays of an artifact from the cache, or from build() (then caching them)
+    def get(self, kind, name, build, sources=(), params=()):
+        if not self.enabled:
+            return build()
+
+        path = self.get_path(kind, name, sources, params)
+        if os.path.exists(path):
+            with self.trace.asset('cache read', name):
+                arrays = self.read(path)
+            if arrays is not None:
+                self.counts['hits'] += 1
+                return arrays
+
+        self.counts['misses'] += 1
+        arrays = build()
+        with self.trace.asset('cache write', name):
+            self.write(path, arrays)
+        return arrays
+
+    # Method to read an entry (None if it cannot be read)
+    def read(self, path):
+        try:
+            with np.load(path) as data:
+                arrays = {key: data[key] for key in data.files}
+        except (OSError, ValueError, EOFError):
+            return None
+        self.bytes_read += os.path.getsize(path)
+        return arrays
+
+    # Method to write an entry (through a temporary file renamed into place)
+    def write(self, path, arrays):
+        temporary = f'{path[:-len(".npz")]}.{os.getpid()}.tmp.npz'
+        try:
+            np.savez(temporary, **arrays)
+            os.replace(temporary, path)
+            self.counts['writes'] += 1
+        except OSError as error:
+            print(f'warm-start cache: could not write {path} ({error})')
+
+    # Method to remove every entry
+    def clear(self):
+        if not self.enabled:
+            return
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith('.npz'):
+                os.remove(os.path.join(self.directory, file_name))
+
+    # Method to print the cache's counters
+    def print_report(self):
+        if not self.enabled:
+            print('warm-start cache: disabled')
+            return
+        print(f"warm-start cache ({self.directory}): {self.counts['hits']} hits, {self.counts['misses']} misses, "
+              f"{self.counts['writes']} writes, {self.bytes_read / 2 ** 20:.1f} MB read")
@@ -0,0 +1,430 @@
+import numpy as np
+import glm
+from camera import FAR
+from gpu_memory import get_gpu_memory
+
+# Terrain settings
+CHUNK_CELLS = 32  # Grid cells along each side of a chunk (a power of two)
+LOD_LEVELS = 4  # Levels of detail per chunk; level k skips 2 ** k - 1 of every 2 ** k grid lines
+LOD_DISTANCE = 24  # Distance from the camera at which chunks drop to level 1 (level k starts at LOD_DISTANCE * 2 ** (k - 1))
+SKIRT_DEPTH = 2.0  # How far the skirts around each chunk hang below its edges (hides cracks between levels)
+TEXTURE_TILE = 16  # World units covered by one repeat of a chunk's texture
+
+
+# Heightmap class
+class Heightmap:
+
+    """
+    a regular grid of ground heights. Here's a
+    summary of its key features:
+
+        * Grid: heights[row, column] is the ground height
+          at x = origin[0] + column * spacing and z =
+          origin[1] + row * spacing.
+
+        * Generation: generate builds a heightmap from
+          a few octaves of seeded value noise around a base
+          height, entirely with NumPy. from_image reads the
+          heights from the brightness of an image instead.
+
+        * Height Queries: get_height takes scalars or whole
+          arrays of x and z coordinates and interpolates the
+          heights across the same two triangles per cell that
+          the terrain mesh is made of, so objects snapped with
+          it sit exactly on the full-detail ground.
+
+        * Normals: get_normals derives per-vertex normals from
+          the height gradients.
+
+        * Raycasts: raycast samples the ground under a ray every
+          half cell in one batch, then refines the first crossing
+          below the surface with a few secant steps.
+    """
+
+    def __init__(self, heights, origin=(0, 0), spacing=1.0):
+
+        # Heights (rows along z, columns along x), position of the first sample and distance between samples
+        self.heights = np.ascontiguousarray(heights, dtype='f4')
+        self.origin = origin
+        self.spacing = spacing
+
+        # Lowest and highest ground (the vertical bounds raycasts are marched within)
+        self.min_height, self.max_height = float(self.heights.min()), float(self.heights.max())
+
+    # Number of grid cells along x and z
+    @property
+    def cells(self):
+        return self.heights.shape[1] - 1, self.heights.shape[0] - 1
+
+    # Method to generate a heightmap from octaves of value noise (wavelengths in world units)
+    @classmethod
+    def generate(cls, cells, origin=(0, 0), spacing=1.0, seed=None, base=0.0, amplitude=2.0,
+                 wavelengths=(64, 32, 16, 8)):
+        rng = np.random.default_rng(seed)
+        shape = (cells[1] + 1, cells[0] + 1)
+        heights = np.zeros(shape, dtype='f4')
+
+        # Each octave has half the weight of the one before, and the weights add up to one
+        weights = 0.5 ** np.arange(len(wavelengths))
+        weights /= weights.sum()
+        for wavelength, weight in zip(wavelengths, weights):
+            heights += weight * cls.value_noise(rng, shape, wavelength / spacing)
+        return cls(base + amplitude * heights, origin, spacing)
+
+    # Method to make smoothly interpolated random values in [-1, 1] on a grid, varying over period samples
+    @staticmethod
+    def value_noise(rng, shape, period):
+        lattice = rng.uniform(-1, 1, (int(shape[0] / period) + 2, int(shape[1] / period) + 2))
+        rows, cols = np.arange(shape[0]) / period, np.arange(shape[1]) / period
+        row_i, col_i = rows.astype(int), cols.astype(int)
+
+        # Smoothstep weights between neighbouring lattice points
+        t_row, t_col = rows - row_i, cols - col_i
+        t_row = (t_row * t_row * (3 - 2 * t_row))[:, None]
+        t_col = (t_col * t_col * (3 - 2 * t_col))[None, :]
+
+        top = lattice[row_i][:, col_i] * (1 - t_col) + lattice[row_i][:, col_i + 1] * t_col
+        bottom = lattice[row_i + 1][:, col_i] * (1 - t_col) + lattice[row_i + 1][:, col_i + 1] * t_col
+        return top * (1 - t_row) + bottom * t_row
+
+    # Method to read a heightmap from the brightness of an image (black is base, white is base + amplitude)
+    @classmethod
+    def from_image(cls, path, origin=(0, 0), spacing=1.0, base=0.0, amplitude=2.0):
+        import pygame as pg
+        pixels = pg.surfarray.array3d(pg.image.load(path)).astype('f4').mean(axis=2).T
+        return cls(base + amplitude * pixels / 255.0, origin, spacing)
+
+    # Method to get the ground height at x and z (scalars or arrays of the same shape)
+    # Points outside the heightmap get the height of its nearest edge
+    def get_height(self, x, z):
+        heights = self.heights
+        cols, rows = self.cells
+        fx = np.clip((np.asarray(x, dtype='f4') - self.origin[0]) / self.spacing, 0, cols)
+        fz = np.clip((np.asarray(z, dtype='f4') - self.origin[1]) / self.spacing, 0, rows)
+        ix = np.minimum(fx.astype(int), cols - 1)
+        iz = np.minimum(fz.astype(int), rows - 1)
+        tx, tz = fx - ix, fz - iz
+
+        h00, h10 = heights[iz, ix], heights[iz, ix + 1]
+        h01, h11 = heights[iz + 1, ix], heights[iz + 1, ix + 1]
+
+        # Each cell is split along its (x + 1, z) - (x, z + 1) diagonal, like the mesh
+        lower = h00 + (h10 - h00) * tx + (h01 - h00) * tz
+        upper = h11 + (h01 - h11) * (1 - tx) + (h10 - h11) * (1 - tz)
+        return np.where(tx + tz <= 1, lower, upper)
+
+    # Method to get the ground normal at x and z (numerically, from the heights around it)
+    def get_normal(self, x, z):
+        d = self.spacing * 0.25
+        h = self.get_height(np.array([x + d, x - d, x, x]), np.array([z, z, z + d, z - d]))
+        dh_dx, dh_dz = (h[0] - h[1]) / (2 * d), (h[2] - h[3]) / (2 * d)
+        normal = glm.vec3(-float(dh_dx), 1.0, -float(dh_dz))
+        return glm.normalize(normal)
+
+    # Method to intersect a ray (origin, unit direction) with the ground inside the heightmap
+    # Returns (distance, normal) of the first hit before t_max, or None
+    def raycast(self, origin, direction, t_max, refine_samples=16):
+        origin, direction = np.asarray(origin, dtype='f4'), np.asarray(direction, dtype='f4')
+
+        # Only the part of the ray inside the heightmap's bounds (up to its highest ground) is sampled
+        cols, rows = self.cells
+        lo = (self.origin[0], self.min_height, self.origin[1])
+        hi = (self.origin[0] + cols * self.spacing, self.max_height, self.origin[1] + rows * self.spacing)
+        t_enter, t_exit = 0.0, float(t_max)
+        for o, d, a, b in zip(origin.tolist(), direction.tolist(), lo, hi):
+            if d:
+                t0, t1 = sorted(((a - o) / d, (b - o) / d))
+                t_enter, t_exit = max(t_enter, t0), min(t_exit, t1)
+            elif not a <= o <= b:
+                return None
+        if t_enter > t_exit:
+            return None
+        t = np.append(np.arange(t_enter, t_exit, self.spacing * 0.5, dtype='f4'), np.float32(t_exit))
+        points = origin + t[:, None] * direction
+
+        # Height above the ground of every sample over the heightmap
+        inside = ((points[:, 0] >= self.origin[0]) & (points[:, 0] <= self.origin[0] + cols * self.spacing) &
+                  (points[:, 2] >= self.origin[1]) & (points[:, 2] <= self.origin[1] + rows * self.spacing))
+        above = points[:, 1] - self.get_height(points[:, 0], points[:, 2])
+        below = inside & (above <= 0)
+        if not below.any():
+            return None
+
+        # The crossing lies between the last sample above the ground and the first one below it; that
+        # span is sampled again more finely (in one batch), and the crossing interpolated between the two
+        # samples around it
+        i = int(np.argmax(below))
+        if i > 0:
+            t = np.linspace(t[i - 1], t[i], refine_samples + 1, dtype='f4')
+            points = origin + t[:, None] * direction
+            above = points[:, 1] - self.get_height(points[:, 0], points[:, 2])
+            above[-1] = min(above[-1], 0.0)
+            i = max(int(np.argmax(above <= 0)), 1)
+        t0, t1, f0, f1 = float(t[max(i - 1, 0)]), float(t[i]), float(above[max(i - 1, 0)]), float(above[i])
+        distance = t0 + (t1 - t0) * f0 / (f0 - f1) if f0 > 0 else t1
+        x, y, z = origin + distance * direction
+        return distance, self.get_normal(x, z)
+
+    # Method to get the (rows, columns, 3) array of vertex normals
+    def get_normals(self):
+        dh_dz, dh_dx = np.gradient(self.heights, self.spacing)
+        normals = np.stack([-dh_dx, np.ones_like(dh_dx), -dh_dz], axis=-1)
+        return normals / np.linalg.norm(normals, axis=-1, keepdims=True)
+
+
+# Terrain class
+class Terrain:
+
+    """
+    renders a Heightmap as a grid of chunks
+    with distance-based levels of detail
+    (geomipmapping). Here's a summary of its
+    key features:
+
+        * Chunks: The heightmap is cut into chunks of
+          CHUNK_CELLS x CHUNK_CELLS cells. Every chunk has
+          its own vertex buffer in the same layout as the
+          object meshes (texcoord, normal, position), so it
+          is drawn with the default and shadow map programs.
+
+        * Levels of Detail: Every chunk has the same vertex
+          layout, so one shared index buffer holds the
+          triangles of all LOD_LEVELS levels one after the
+          other, and drawing a chunk at a level is a draw of
+          that level's range. Each level halves the grid
+          resolution, so it has a quarter of the triangles.
+
+        * Skirts: A strip of triangles hangs down from the
+          edges of every chunk, hiding the cracks that open
+          between neighbouring chunks drawn at different levels.
+
+        * Selection: select computes the level of every chunk
+          from its distance to the camera (level k from
+          LOD_DISTANCE * 2 ** (k - 1) on) and culls the chunks
+          against the view frustum, all with NumPy and without
+          OpenGL calls. As the ring of chunks at each level
+          grows with distance while their triangles shrink by
+          four, and the far plane bounds the rings (the shadow
+          pass only draws chunks within the far plane's distance
+          too, and only those in the light's frustum), the terrain costs roughly the same number of
+          triangles whatever its size.
+
+        * Textures: Each chunk uses the texture of the region
+          (a range of z) nearest to its center.
+    """
+
+    def __init__(self, app, heightmap, regions, default_tex_id='plane'):
+
+        # Reference to the application, the camera and the heightmap
+        self.app = app
+        self.ctx = app.ctx
+        self.camera = app.camera
+        self.heightmap = heightmap
+        cols, rows = heightmap.cells
+        if cols % CHUNK_CELLS or rows % CHUNK_CELLS:
+            raise ValueError(f'terrain of {cols}x{rows} cells does not divide into chunks of {CHUNK_CELLS} cells')
+
+        # Index buffer shared by all chunks, holding the (first, count) range of every level
+        indices, self.lod_ranges = self.get_lod_indices()
+        self.index_buffer = self.ctx.buffer(indices)
+
+        # Chunks and their world bounds (as arrays for batched selection)
+        normals = heightmap.get_normals()
+        vao = app.mesh.vao
+        textures = app.mesh.texture.textures
+        self.chunks = []
+        for row in range(0, rows, CHUNK_CELLS):
+            for col in range(0, cols, CHUNK_CELLS):
+                vertex_data, bounds = self.get_chunk_data(row, col, normals)
+                center_z = (bounds[0][2] + bounds[1][2]) / 2
+                tex_id = min(regions, key=lambda region: max(region[0][0] - center_z, center_z - region[0][1], 0),
+                             default=(None, default_tex_id))[1]
+                positions = np.ascontiguousarray(vertex_data[:, 5:])
+                self.chunks.append(TerrainChunk(vao, self.ctx.buffer(vertex_data), self.ctx.buffer(positions),
+                                                self.index_buffer, bounds, textures[tex_id]))
+        memory = get_gpu_memory(self.ctx)
+        memory.add_buffer('terrain indices', self.index_buffer)
+        for chunk in self.chunks:
+            memory.add_buffer('terrain chunks', chunk.vbo)
+            memory.add_buffer('terrain chunk positions', chunk.position_vbo)
+        self.bounds_min = np.array([chunk.bounds[0] for chunk in self.chunks], dtype='f4')
+        self.bounds_max = np.array([chunk.bounds[1] for chunk in self.chunks], dtype='f4')
+
+        # Programs shared by the chunks
+        self.program = self.chunks[0].program
+        self.shadow_program = self.chunks[0].shadow_program
+        self.on_init()
+
+    # Method to build the vertex data of the chunk whose first cell is at (row, col), and its bounds
+    def get_chunk_data(self, row, col, normals):
+        heightmap = self.heightmap
+        n = CHUNK_CELLS
+        heights = heightmap.heights[row:row + n + 1, col:col + n + 1]
+        z, x = np.mgrid[row:row + n + 1, col:col + n + 1] * heightmap.spacing
+        x, z = x + heightmap.origin[0], z + heightmap.origin[1]
+
+        # Grid vertices as (u, v, normal, position) rows
+        grid = np.empty((n + 1, n + 1, 8), dtype='f4')
+        grid[..., 0], grid[..., 1] = x / TEXTURE_TILE, z / TEXTURE_TILE
+        grid[..., 2:5] = normals[row:row + n + 1, col:col + n + 1]
+        grid[..., 5], grid[..., 6], grid[..., 7] = x, heights, z
+
+        # Skirt vertices: copies of the edge vertices (z = first, z = last, x = first, x = last), lowered
+        skirt = np.concatenate([grid[0], grid[n], grid[:, 0], grid[:, n]])
+        skirt[:, 6] -= SKIRT_DEPTH
+
+        vertex_data = np.concatenate([grid.reshape(-1, 8), skirt])
+        positions = vertex_data[:, 5:]
+        return vertex_data, (positions.min(axis=0), positions.max(axis=0))
+
+    # Method to build the triangles of every level of detail (for the vertex layout of get_chunk_data)
+    # Returns the concatenated indices and the (first, count) range of each level
+    @staticmethod
+    def get_lod_indices():
+        n = CHUNK_CELLS
+        side = n + 1
+        levels, ranges, first = [], [], 0
+        for level in range(LOD_LEVELS):
+            step = 2 ** level
+
+            # Two counter-clockwise (seen from above) triangles per cell of the level's grid
+            j, i = np.mgrid[0:n:step, 0:n:step]
+            v00 = (j * side + i).ravel()
+            v10, v01, v11 = v00 + step, v00 + step * side, v00 + step * side + step
+            triangles = [np.stack([v00, v01, v10], axis=1), np.stack([v10, v01, v11], axis=1)]
+
+            # Skirt quads along each edge, wound to face away from the chunk
+            k = np.arange(0, n, step)
+            edges = [(k, step, side * side + k, False),                              # z = first
+                     (n * side + k, step, side * side + side + k, True),             # z = last
+                     (k * side, step * side, side * side + 2 * side + k, True),      # x = first
+                     (k * side + n, step * side, side * side + 3 * side + k, False)]  # x = last
+            for a, stride, a_low, flip in edges:
+                b, b_low = a + stride, a_low + step
+                if flip:
+                    triangles += [np.stack([a, a_low, b], axis=1), np.stack([b, a_low, b_low], axis=1)]
+                else:
+                    triangles += [np.stack([a, b, a_low], axis=1), np.stack([b, b_low, a_low], axis=1)]
+
+            indices = np.concatenate(triangles).astype('u4').ravel()
+            levels.append(indices)
+            ranges.append((first, len(indices)))
+            first += len(indices)
+        return np.concatenate(levels), ranges
+
+    # Method to choose the level of every chunk and the chunks visible in a frustum (no OpenGL calls)
+    # Returns the visible (chunk, level) pairs, and the pairs of the chunks within the far plane's
+    # distance (for the shadow pass, as shadows further away are never seen) and in the light's frustum
+    def select(self, frustum, position, shadow_frustum=None):
+        position = np.array(position, dtype='f4')
+        nearest = np.clip(position, self.bounds_min, self.bounds_max)
+        distance = np.maximum(np.linalg.norm(nearest - position, axis=1), 1e-6)
+        levels = np.clip(np.floor(np.log2(distance / LOD_DISTANCE)) + 1, 0, LOD_LEVELS - 1).astype(int)
+        visible = frustum.cull_boxes(self.bounds_min, self.bounds_max)
+
+        chunks = list(zip(self.chunks, levels.tolist()))
+        in_range = distance < FAR
+        if shadow_frustum is not None:
+            in_range &= shadow_frustum.cull_boxes(self.bounds_min, self.bounds_max)
+        return ([chunk for chunk, is_visible in zip(chunks, visible) if is_visible],
+                [chunk for chunk, is_near in zip(chunks, in_range) if is_near])
+
+    # Method to get the number of triangles drawn for a chunk at a level
+    def get_triangles(self, level):
+        return self.lod_ranges[level][1] // 3
+
+    # Method to render chunks at their levels
+    def render(self, chunks):
+        self.program['camPos'].write(self.camera.view_position)
+        self.program['m_view'].write(self.camera.m_view)
+        self.program['m_model'].write(self.m_model)
+        texture = None
+        for chunk, level in chunks:
+            if chunk.texture is not texture:
+                texture = chunk.texture
+                texture.use(location=0)
+            first, count = self.lod_ranges[level]
+            chunk.vao.render(first=first, vertices=count)
+
+    # Method to render chunks at their levels for shadow mapping
+    def render_shadow(self, chunks):
+        self.shadow_program['m_model'].write(self.m_model)
+        for chunk, level in chunks:
+            first, count = self.lod_ranges[level]
+            chunk.shadow_vao.render(first=first, vertices=count)
+
+    # Method to perform additional initialization (the same uniforms the models set)
+    def on_init(self):
+
+        # The chunks are built in world space
+        self.m_model = glm.mat4()
+
+        # Light and shadow uniforms for the main rendering program
+        self.program['m_view_light'].write(self.app.light.m_view_light)
+        self.program['u_resolution'].write(glm.vec2(self.app.WIN_SIZE))
+        self.program['shadowMap'] = 1
+        self.app.mesh.texture.textures['depth_texture'].use(location=1)
+
+        # Shadow mapping program
+        self.shadow_program['m_proj'].write(self.camera.m_proj)
+        self.shadow_program['m_view_light'].write(self.app.light.m_view_light)
+
+        # Texture unit and projection for the main rendering program
+        self.program['u_texture_0'] = 0
+        self.program['m_proj'].write(self.camera.m_proj)
+
+        # Light-related shader uniforms
+        self.program['light.position'].write(self.app.light.position)
+        self.program['light.Ia'].write(self.app.light.Ia)
+        self.program['light.Id'].write(self.app.light.Id)
+        self.program['light.Is'].write(self.app.light.Is)
+
+    # Method to release the chunks' buffers and VAOs
+    def destroy(self):
+        memory = get_gpu_memory(self.ctx)
+        for chunk in self.chunks:
+            memory.remove(chunk.vbo)
+            memory.remove(chunk.position_vbo)
+            chunk.destroy()
+        memory.remove(self.index_buffer)
+        self.index_buffer.release()
+
+
+# TerrainChunk class
+class TerrainChunk:
+
+    """
+    one chunk of the terrain: its vertex buffer
+    (and a position-only copy of it, for the
+    shadow pass), the main and shadow VAOs
+    drawing them through the terrain's shared
+    index buffer, its world bounds and its
+    texture.
+    """
+
+    # Vertex layout of the chunk's vertex buffer
+    format = '2f 3f 3f'
+    attribs = ['in_texcoord_0', 'in_normal', 'in_position']
+
+    def __init__(self, vao, vbo, position_vbo, index_buffer, bounds, texture):
+
+        # Vertex buffers (all attributes, and positions only), bounds and texture
+        self.vbo = vbo
+        self.position_vbo = position_vbo
+        self.bounds = bounds
+        self.texture = texture
+
+        # VAOs for the main and shadow passes
+        buffers = [(vbo, self.format, *self.attribs)]
+        self.vao = vao.get_vertex_array(vao.program.programs['default'], buffers, index_buffer)
+        self.shadow_vao = vao.get_vertex_array(vao.program.programs['shadow_map'], [(position_vbo, '3f', 'in_position')],
+                                               index_buffer)
+        self.program = self.vao.program
+        self.shadow_program = self.shadow_vao.program
+
+    # Method to release the vertex buffer and VAOs
+    def destroy(self):
+        self.vao.release()
+        self.shadow_vao.release()
+        self.vbo.release()
+        self.position_vbo.release()
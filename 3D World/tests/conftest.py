@@ -0,0 +1,18 @@
+import os
+import sys
+import pytest
+
+# Import the engine's modules (which live next to main.py) from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Headless OpenGL context for the tests that need one (skipped where none can be created)
+@pytest.fixture(scope='module')
+def ctx():
+    import moderngl as mgl
+    try:
+        context = mgl.create_standalone_context(require=330, backend='egl')
+    except Exception as error:
+        pytest.skip(f'no headless OpenGL context: {error}')
+    yield context
+    context.release()
@@ -0,0 +1,77 @@
+import numpy as np
+from arena import MeshArena
+
+# Floats and bytes per vertex of the test meshes
+COMPONENTS = 3
+STRIDE = COMPONENTS * 4
+
+
+# Get the vertex data and triangle indices of a mesh of count vertices, filled with a seed
+def get_mesh(count, seed):
+    rng = np.random.default_rng(seed)
+    data = rng.random((count, COMPONENTS), dtype='f4')
+    indices = rng.integers(0, count, size=(count // 3) * 3, dtype='u4')
+    return data.tobytes(), indices
+
+
+# Get the indices of a mesh read back from the arena's index buffer, relative to its first vertex
+def read_indices(arena, name):
+    start, count = arena.get_index_range(name)
+    packed = np.frombuffer(arena.index_buffer.read(size=count * 4, offset=start * 4), dtype='u4')
+    return packed - arena.ranges[name][0]
+
+
+# Check every mesh still has its vertex data and indices, and that the ranges do not overlap
+def check_meshes(arena, meshes):
+    for name, (data, indices) in meshes.items():
+        assert arena.read(name) == data
+        assert np.array_equal(read_indices(arena, name), indices)
+    ranges = sorted(arena.ranges.values())
+    for (first, count), (next_first, next_count) in zip(ranges, ranges[1:]):
+        assert first + count <= next_first
+    free = sum(size for first, size in arena.free)
+    assert free + arena.used == arena.capacity
+
+
+def test_allocate_release_and_defragment_preserve_meshes(ctx):
+    arena = MeshArena(ctx, '3f', ['in_position'], STRIDE, capacity=64)
+    meshes = {name: get_mesh(count, seed) for seed, (name, count) in
+              enumerate([('a', 12), ('b', 9), ('c', 15), ('d', 6), ('e', 18)])}
+    for name, (data, indices) in meshes.items():
+        arena.allocate(name, data, indices)
+    check_meshes(arena, meshes)
+
+    # Freed ranges merge with their free neighbours and are reused
+    arena.release('b')
+    arena.release('d')
+    del meshes['b'], meshes['d']
+    check_meshes(arena, meshes)
+    meshes['f'] = get_mesh(9, 10)
+    assert arena.allocate('f', *meshes['f']) == 12
+    check_meshes(arena, meshes)
+
+    # A mesh that only fits in the free space as a whole packs the meshes to the front
+    arena.release('a')
+    del meshes['a']
+    meshes['g'] = get_mesh(18, 11)
+    capacity = arena.capacity
+    arena.allocate('g', *meshes['g'])
+    assert arena.capacity == capacity
+    check_meshes(arena, meshes)
+
+    arena.defragment()
+    assert arena.free == [(arena.used, arena.capacity - arena.used)]
+    check_meshes(arena, meshes)
+    arena.destroy()
+
+
+def test_allocate_grows_the_buffers(ctx):
+    arena = MeshArena(ctx, '3f', ['in_position'], STRIDE, capacity=16, index_capacity=4)
+    meshes = {name: get_mesh(count, seed) for seed, (name, count) in enumerate([('a', 12), ('b', 30)])}
+    for name, (data, indices) in meshes.items():
+        arena.allocate(name, data, indices)
+    meshes['c'] = (get_mesh(6, 5)[0], np.arange(6, dtype='u4'))
+    arena.allocate('c', meshes['c'][0])
+    assert arena.capacity >= 48
+    check_meshes(arena, meshes)
+    arena.destroy()
@@ -0,0 +1,41 @@
+import pytest
+from gpu_memory import get_gpu_memory, get_kind
+
+
+# Get a buffer and a texture that share an OpenGL name (names are only unique within a kind)
+def get_same_name_pair(ctx):
+    buffers = [ctx.buffer(reserve=64) for i in range(8)]
+    textures = [ctx.texture((4, 4), 4) for i in range(8)]
+    for buffer in buffers:
+        for texture in textures:
+            if buffer.glo == texture.glo:
+                return buffer, texture
+    pytest.skip('no buffer and texture with the same OpenGL name')
+
+
+def test_remove_keeps_other_kinds_with_the_same_name(ctx):
+    memory = get_gpu_memory(ctx)
+    buffer, texture = get_same_name_pair(ctx)
+    memory.add_buffer('vertices', buffer)
+    memory.add_texture('pixels', texture)
+    buffer_bytes, texture_bytes = memory.totals['buffer'], memory.totals['texture']
+    assert buffer_bytes >= 64 and texture_bytes >= 64
+
+    memory.remove(texture)
+    assert memory.totals['texture'] == texture_bytes - 64
+    assert memory.totals['buffer'] == buffer_bytes
+    assert ('buffer', buffer.glo) in memory.resources
+
+    memory.remove(buffer)
+    assert memory.totals['buffer'] == buffer_bytes - 64
+    assert ('buffer', buffer.glo) not in memory.resources
+
+
+def test_get_kind(ctx):
+    texture = ctx.texture((2, 2), 4)
+    assert get_kind(ctx.buffer(reserve=4)) == 'buffer'
+    assert get_kind(texture) == 'texture'
+    assert get_kind(ctx.texture_cube((2, 2), 4)) == 'texture'
+    assert get_kind(ctx.framebuffer(color_attachments=[texture])) == 'framebuffer'
+    with pytest.raises(TypeError):
+        get_kind(object())
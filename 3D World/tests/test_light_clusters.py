@@ -0,0 +1,67 @@
+import math
+import glm
+import numpy as np
+from camera import FOV
+from light_clusters import LightManager
+
+# Points sampled along each axis of a cluster
+SAMPLES = 6
+
+
+# Get points sampled through every cluster of a light manager's grid (in view space), indexed
+# [cluster, sample, axis] in the order bin numbers the clusters
+def get_cluster_points(lights, m_proj):
+    cols, rows, slices = lights.grid
+    steps = np.linspace(0, 1, SAMPLES)
+    x = (np.arange(cols)[:, None] + steps) / cols * 2 - 1
+    y = (np.arange(rows)[:, None] + steps) / rows * 2 - 1
+    z = lights.near * (lights.far / lights.near) ** ((np.arange(slices)[:, None] + steps) / slices)
+
+    # Every (slice, row, column) cluster, and every (depth, y, x) sample of it
+    depth = z[:, None, None, :, None, None]
+    ndc_x = x[None, None, :, None, None, :]
+    ndc_y = y[None, :, None, None, :, None]
+    shape = (slices, rows, cols, SAMPLES, SAMPLES, SAMPLES)
+    points = np.stack([np.broadcast_to(ndc_x * depth / m_proj[0][0], shape),
+                       np.broadcast_to(ndc_y * depth / m_proj[1][1], shape),
+                       np.broadcast_to(-depth, shape)], axis=-1)
+    return points.reshape(slices * rows * cols, SAMPLES ** 3, 3)
+
+
+# Get the (light, cluster) pairs of a bin
+def get_binned_pairs(grid, indices):
+    pairs = set()
+    for cluster, (first, count) in enumerate(grid.reshape(-1, 2).tolist()):
+        pairs.update((int(light), cluster) for light in indices[first:first + count])
+    return pairs
+
+
+def test_bin_matches_brute_force_overlap(ctx):
+    lights = LightManager(ctx, grid=(8, 6, 12))
+    rng = np.random.default_rng(3)
+    for i in range(40):
+        position = rng.uniform((-30, 0, -30), (30, 10, 30))
+        if i % 2:
+            lights.add_spot_light(position, rng.normal(size=3), radius=rng.uniform(1, 12))
+        else:
+            lights.add_point_light(position, radius=rng.uniform(1, 12))
+
+    m_view = glm.lookAt(glm.vec3(2, 4, 20), glm.vec3(0, 2, 0), glm.vec3(0, 1, 0))
+    m_proj = glm.perspective(glm.radians(FOV), 16 / 9, lights.near, lights.far)
+    grid, indices = lights.bin(m_view, m_proj)
+    binned = get_binned_pairs(grid, indices)
+
+    # A light is in every cluster a point within its radius was sampled in
+    view = np.array(m_view, dtype='f4')
+    points = get_cluster_points(lights, m_proj)
+    positions = lights.positions[:len(lights)] @ view[:3, :3].T + view[:3, 3]
+    overlapping = set()
+    for light, (position, radius) in enumerate(zip(positions, lights.radii)):
+        inside = (np.square(points - position).sum(axis=2) <= radius * radius).any(axis=1)
+        overlapping.update((light, int(cluster)) for cluster in np.flatnonzero(inside))
+
+    # No light is missing from a cluster it reaches, and the bins (bounds of each sphere's box) stay close
+    assert overlapping
+    assert overlapping <= binned
+    assert len(binned) <= 4 * len(overlapping)
+    lights.destroy()
@@ -0,0 +1,50 @@
+import numpy as np
+from mesh_optimizer import get_acmr, get_report, optimize_mesh
+
+# Floats per vertex of the test meshes (texture coordinates, normal and position)
+COMPONENTS = 8
+
+
+# Get a triangle list of a size x size grid of quads, in a shuffled triangle order
+def get_grid_mesh(size, seed):
+    u, v = np.meshgrid(np.arange(size + 1), np.arange(size + 1), indexing='ij')
+    positions = np.stack([u, np.sin(u + v), v], axis=-1).reshape(-1, 3)
+    vertices = np.concatenate([positions[:, [0, 2]] / size, np.tile((0, 1, 0), (len(positions), 1)), positions], axis=1)
+    corners = (u * (size + 1) + v)[:-1, :-1].ravel()
+    triangles = np.concatenate([np.stack([corners, corners + 1, corners + size + 1], axis=1),
+                                np.stack([corners + 1, corners + size + 2, corners + size + 1], axis=1)])
+    triangles = np.random.default_rng(seed).permutation(triangles)
+    return vertices[triangles].astype('f4').ravel()
+
+
+# Get the triangles of a mesh (each as its three vertices' data) in a sorted order
+def get_triangle_set(triangles):
+    triangles = triangles.reshape(-1, 3 * COMPONENTS)
+    return triangles[np.lexsort(triangles.T[::-1])]
+
+
+def test_optimize_mesh_keeps_triangles_and_lowers_acmr():
+    for size, seed in ((4, 0), (12, 1), (30, 2)):
+        vertex_data = get_grid_mesh(size, seed)
+        vertices, indices, report = optimize_mesh(vertex_data, COMPONENTS)
+        report = get_report(report)
+
+        # The same triangles (corners in the same winding), each vertex stored once
+        assert np.array_equal(get_triangle_set(vertices[indices]), get_triangle_set(vertex_data))
+        assert len(vertices) == (size + 1) ** 2
+        assert report['triangles'] == 2 * size * size
+        assert report['source_vertices'] == 6 * size * size
+        assert report['vertices'] == len(vertices)
+
+        # The vertex cache misses no more often than in the source order
+        assert report['acmr_after'] == get_acmr(indices)
+        assert report['acmr_after'] <= report['acmr_before']
+        assert report['acmr_after'] < 1.0
+
+
+def test_optimize_mesh_keeps_degenerate_and_repeated_triangles():
+    vertex_data = np.concatenate([get_grid_mesh(3, 4), get_grid_mesh(3, 4)[:3 * COMPONENTS],
+                                  np.tile(get_grid_mesh(3, 5)[:COMPONENTS], 3)])
+    vertices, indices, report = optimize_mesh(vertex_data, COMPONENTS)
+    assert np.array_equal(get_triangle_set(vertices[indices]), get_triangle_set(vertex_data))
+    assert get_report(report)['acmr_after'] <= get_report(report)['acmr_before']
@@ -0,0 +1,58 @@
+import numpy as np
+from placement import SpatialHash, scatter
+
+
+# Get the mask of footprints that overlap another one, testing every pair
+def get_overlapping(points, radii):
+    delta = points[:, None] - points[None]
+    distance = np.sqrt((delta * delta).sum(axis=2))
+    overlapping = distance < (radii[:, None] + radii[None]) - 1e-4
+    np.fill_diagonal(overlapping, False)
+    return overlapping.any(axis=1)
+
+
+def test_scatter_has_no_overlaps():
+    rng = np.random.default_rng(5)
+    spatial_hash = SpatialHash()
+    bounds = (-50.0, 50.0, -40.0, 40.0)
+    points, radii = [], []
+
+    # Large footprints first, then smaller ones that must avoid them (like the generators)
+    for count, radius in ((30, 4.0), (200, 1.5), (600, 0.6), (1500, 0.2)):
+        xz = scatter(rng, bounds, count, radius, spatial_hash)
+        assert 0 < len(xz) <= count
+        assert (xz[:, 0] >= bounds[0]).all() and (xz[:, 0] <= bounds[1]).all()
+        assert (xz[:, 1] >= bounds[2]).all() and (xz[:, 1] <= bounds[3]).all()
+        points.append(xz)
+        radii.append(np.full(len(xz), radius, dtype='f4'))
+
+    points, radii = np.concatenate(points).astype('f8'), np.concatenate(radii).astype('f8')
+    assert len(spatial_hash) == len(points)
+    assert not get_overlapping(points, radii).any()
+
+
+def test_scatter_stops_when_full():
+    rng = np.random.default_rng(1)
+    xz = scatter(rng, (0.0, 10.0, 0.0, 10.0), 1000, 1.0)
+
+    assert len(xz) < 1000
+    assert not get_overlapping(xz.astype('f8'), np.full(len(xz), 1.0)).any()
+
+
+def test_overlaps_matches_brute_force():
+    rng = np.random.default_rng(2)
+    spatial_hash = SpatialHash()
+    placed = rng.uniform(-20, 20, (300, 2)).astype('f4')
+    placed_radii = rng.choice([0.1, 0.5, 2.0, 5.0], 300).astype('f4')
+    spatial_hash.insert(placed, placed_radii)
+
+    for radius in (0.1, 1.0, 3.0):
+        points = rng.uniform(-25, 25, (500, 2)).astype('f4')
+        delta = points[:, None].astype('f8') - placed[None]
+        expected = ((delta * delta).sum(axis=2) < (radius + placed_radii[None].astype('f8')) ** 2).any(axis=1)
+        hits = spatial_hash.overlaps(points, radius)
+
+        # Pairs within float32 rounding of touching may go either way
+        distance = np.sqrt((delta * delta).sum(axis=2)) - (radius + placed_radii[None])
+        borderline = (np.abs(distance) < 1e-4).any(axis=1)
+        np.testing.assert_array_equal(hits[~borderline], expected[~borderline])
@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+import glm
+import numpy as np
+from bvh import EPSILON, MeshBVH
+from raycast import BATCHED_RAYS, Raycaster
+
+
+# Get the distance of the closest front-face hit of every ray with every triangle of (T, 3, 3)
+# triangles, testing them all (np.inf for a miss)
+def get_brute_force_hits(triangles, origins, directions):
+    v0, e1, e2 = triangles[:, 0], triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]
+    d = directions[:, None]
+    p = np.cross(d, e2[None])
+    det = (e1[None] * p).sum(axis=2)
+    front = det >= EPSILON
+    inv_det = 1.0 / np.where(front, det, 1.0)
+    s = origins[:, None] - v0[None]
+    u = (s * p).sum(axis=2) * inv_det
+    q = np.cross(s, e1[None])
+    v = (d * q).sum(axis=2) * inv_det
+    t = (e2[None] * q).sum(axis=2) * inv_det
+    hit = front & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > EPSILON)
+    return np.where(hit, t, np.inf).min(axis=1)
+
+
+# Mesh of a scene, with the bounds and triangle BVH a Raycaster reads from a VBO
+class Mesh:
+
+    def __init__(self, triangles):
+        positions = triangles.reshape(-1, 3)
+        self.triangles = triangles
+        self.bounds = (positions.min(axis=0), positions.max(axis=0))
+        self.bvh = MeshBVH(positions)
+
+    def get_bvh(self):
+        return self.bvh
+
+
+# Get random triangles around the origin (a few crossing each other, like a real mesh)
+def get_triangles(rng, count):
+    centers = rng.uniform(-1, 1, (count, 1, 3))
+    return (centers + rng.uniform(-0.3, 0.3, (count, 3, 3))).astype('f4')
+
+
+# Get rays from around a box towards random points inside it
+def get_rays(rng, count, extent=1.5):
+    origins = rng.uniform(-extent, extent, (count, 3)) * 3
+    directions = rng.uniform(-extent, extent, (count, 3)) - origins
+    return origins, directions / np.linalg.norm(directions, axis=1, keepdims=True)
+
+
+def test_mesh_intersect_matches_brute_force():
+    rng = np.random.default_rng(0)
+    triangles = get_triangles(rng, 300)
+    mesh = MeshBVH(triangles.reshape(-1, 3))
+    origins, directions = get_rays(rng, 400)
+    expected = get_brute_force_hits(triangles.astype('f8'), origins, directions)
+
+    # One ray at a time, through the BVH
+    for i in range(len(origins)):
+        hit = mesh.intersect(origins[i].tolist(), directions[i].tolist(), np.inf)
+        if np.isinf(expected[i]):
+            assert hit is None
+        else:
+            assert hit is not None and abs(hit[0] - expected[i]) < 1e-5
+
+    # All rays at once
+    distances, hits = mesh.intersect_many(origins, directions, np.inf)
+    np.testing.assert_allclose(distances, expected, rtol=1e-6, atol=1e-6)
+    assert ((hits >= 0) == np.isfinite(expected)).all()
+
+
+def test_mesh_intersect_many_respects_t_max():
+    rng = np.random.default_rng(1)
+    mesh = MeshBVH(get_triangles(rng, 100).reshape(-1, 3))
+    origins, directions = get_rays(rng, 200)
+    distances = mesh.intersect_many(origins, directions, np.inf)[0]
+    t_max = np.where(np.isfinite(distances), distances * 0.5, 10.0)
+
+    assert np.isinf(mesh.intersect_many(origins, directions, t_max)[0][np.isfinite(distances)]).all()
+
+
+def test_raycast_matches_brute_force():
+    rng = np.random.default_rng(2)
+
+    # Two meshes, one shared by enough placements to be intersected as a batch
+    meshes = {'rock': Mesh(get_triangles(rng, 40)), 'bush': Mesh(get_triangles(rng, 120))}
+    objects = []
+    for i in range(4 * BATCHED_RAYS + 6):
+        m_model = glm.translate(glm.mat4(), glm.vec3(*rng.uniform(-6, 6, 3)))
+        m_model = glm.rotate(m_model, float(rng.uniform(0, 6.28)), glm.normalize(glm.vec3(*rng.uniform(-1, 1, 3))))
+        m_model = glm.scale(m_model, glm.vec3(*rng.uniform(0.5, 2.0, 3)))
+        objects.append(SimpleNamespace(vao_name='bush' if i % 3 else 'rock', m_model=m_model))
+    app = SimpleNamespace(mesh=SimpleNamespace(vao=SimpleNamespace(vbo=SimpleNamespace(vbos=meshes))))
+    raycaster = Raycaster(SimpleNamespace(app=app, objects=objects, terrain=None))
+
+    # Every placement's triangles in world space
+    world = []
+    for obj in objects:
+        m = np.array(obj.m_model, dtype='f8').T
+        corners = meshes[obj.vao_name].triangles.reshape(-1, 3).astype('f8')
+        world.append((corners @ m[:3, :3] + m[3, :3]).reshape(-1, 3, 3))
+    origins, directions = get_rays(rng, 300, extent=6.0)
+
+    for origin, direction in zip(origins, directions):
+        distances = [get_brute_force_hits(triangles, origin[None], direction[None])[0] for triangles in world]
+        hit = raycaster.raycast(origin.tolist(), direction.tolist())
+        if np.isinf(min(distances)):
+            assert hit is None
+        else:
+            assert hit is not None
+            assert abs(hit.distance - min(distances)) < 1e-4
+            assert abs(distances[objects.index(hit.obj)] - hit.distance) < 1e-4
@@ -0,0 +1,36 @@
+import glm
+import numpy as np
+from transform import get_model_matrices
+
+
+# Get the model matrix of one placement the way BaseModel.get_model_matrix builds it
+def get_glm_matrix(pos, rot, scale):
+    rot = glm.vec3([glm.radians(a) for a in rot])
+    m_model = glm.translate(glm.mat4(), glm.vec3(pos))
+    m_model = glm.rotate(m_model, rot.z, glm.vec3(0, 0, 1))
+    m_model = glm.rotate(m_model, rot.y, glm.vec3(0, 1, 0))
+    m_model = glm.rotate(m_model, rot.x, glm.vec3(1, 0, 0))
+    return glm.scale(m_model, glm.vec3(scale))
+
+
+def test_model_matrices_match_glm():
+    rng = np.random.default_rng(0)
+    pos = rng.uniform(-100, 100, (200, 3)).astype('f4')
+    rot = rng.uniform(-360, 360, (200, 3)).astype('f4')
+    scale = rng.uniform(0.1, 5, (200, 3)).astype('f4')
+
+    matrices = get_model_matrices(pos, rot, scale)
+
+    assert matrices.shape == (200, 4, 4) and matrices.dtype == np.float32
+    for i in range(len(pos)):
+        expected = np.frombuffer(get_glm_matrix(pos[i], rot[i], scale[i]).to_bytes(), dtype='f4').reshape(4, 4)
+        np.testing.assert_allclose(matrices[i], expected, rtol=1e-5, atol=1e-4)
+
+
+def test_model_matrices_out():
+    out = np.zeros((3, 4, 4), dtype='f4')
+    result = get_model_matrices([(1, 2, 3)] * 3, [(0, 90, 0)] * 3, [(2, 2, 2)] * 3, out=out)
+
+    assert result is out
+    expected = np.frombuffer(get_glm_matrix((1, 2, 3), (0, 90, 0), (2, 2, 2)).to_bytes(), dtype='f4').reshape(4, 4)
+    np.testing.assert_allclose(out, np.broadcast_to(expected, (3, 4, 4)), atol=1e-5)
@@ -1,6 +1,10 @@
+import numpy as np
 import pygame as pg
 import moderngl as mgl
 import glm
+from gpu_memory import get_gpu_memory
+from residency import ResidentTexture, TextureResidency
+from startup import get_startup_trace, get_warm_cache
 
 
 # Texture class
@@ -37,6 +41,23 @@ class Texture:
           a file, flips it, and configures properties such as mipmaps 
           and anisotropic filtering.
 
+        * Warm Start: load_image keeps the decoded and flipped 
+          pixels of every image file in the warm-start cache 
+          (startup.py), so the next launch reads them back 
+          instead of decoding the PNG files again.
+
+        * Residency: Textures loaded from files are stored as 
+          ResidentTexture handles, bound with use like the textures 
+          themselves. The residency manager (self.residency) shrinks 
+          or evicts the least recently used ones to stay within the 
+          application's texture_budget, and reloads them when they 
+          are used again (residency.py).
+
+        * Memory Accounting: Every texture is recorded 
+          in the context's GPU memory registry, the 2D 
+          textures with the mip chains build_mipmaps adds 
+          (and at their current size, when shrunk).
+
         * Destroy Method: The destroy method is responsible for releasing 
           resources associated with all loaded textures. It iterates over the 
           textures in the dictionary and calls the release method to free up 
@@ -75,6 +96,16 @@ class Texture:
         self.textures['plane_sand'] = self.get_texture(path='textures/plane_sand.png')
         self.textures['depth_texture'] = self.get_depth_texture()
 
+        # Textures loaded from files are kept within the texture budget (if any) by the residency manager,
+        # which records them in the GPU memory registry; the skybox and the depth texture stay resident
+        self.residency = TextureResidency(self, budget_mb=app.texture_budget)
+        memory = get_gpu_memory(self.ctx)
+        for name, texture in self.textures.items():
+            if isinstance(texture, ResidentTexture):
+                self.residency.add(f'texture {name}', texture)
+            else:
+                memory.add_texture(f'texture {name}', texture)
+
 
     # Method to create and configure a depth texture
     def get_depth_texture(self):
@@ -92,38 +123,56 @@ class Texture:
 
         # Load face textures and flip them accordingly
         for face in faces:
-            texture = pg.image.load(dir_path + f'{face}.{ext}').convert()
-            if face in ['right', 'left', 'front', 'back']:
-                texture = pg.transform.flip(texture, flip_x=True, flip_y=False)
-            else:
-                texture = pg.transform.flip(texture, flip_x=False, flip_y=True)
-            textures.append(texture)
+            sides = face in ['right', 'left', 'front', 'back']
+            textures.append(self.load_image(dir_path + f'{face}.{ext}', flip_x=sides, flip_y=not sides))
 
-        size = textures[0].get_size()
-        texture_cube = self.ctx.texture_cube(size=size, components=3, data=None)
+        size = textures[0][0]
+        with get_startup_trace(self.ctx).asset('buffer upload', dir_path):
+            texture_cube = self.ctx.texture_cube(size=size, components=3, data=None)
 
-        # Write face texture data to the cube texture
-        for i in range(6):
-            texture_data = pg.image.tostring(textures[i], 'RGB')
-            texture_cube.write(face=i, data=texture_data)
+            # Write face texture data to the cube texture
+            for i in range(6):
+                texture_cube.write(face=i, data=textures[i][1])
 
         return texture_cube
 
-    # Method to create and configure a regular 2D texture
+    # Method to create and configure a regular 2D texture (managed by the residency manager)
     def get_texture(self, path):
-
-        texture = pg.image.load(path).convert()
-        texture = pg.transform.flip(texture, flip_x=False, flip_y=True)
-        texture = self.ctx.texture(size=texture.get_size(), components=3,
-                                   data=pg.image.tostring(texture, 'RGB'))
+        return ResidentTexture(path, self.create_texture(*self.load_image(path), name=path))
+
+    # Method to load an image file as its size and flipped RGB pixels (decoded, or read from the
+    # warm-start cache when an earlier launch decoded the same file)
+    def load_image(self, path, flip_x=False, flip_y=True):
+
+        def decode():
+            with get_startup_trace(self.ctx).asset('png decode', path):
+                image = pg.image.load(path).convert()
+                image = pg.transform.flip(image, flip_x=flip_x, flip_y=flip_y)
+                pixels = np.frombuffer(pg.image.tostring(image, 'RGB'), dtype='u1')
+            return {'size': np.array(image.get_size()), 'pixels': pixels}
+
+        image = get_warm_cache(self.ctx).get('image', path, decode, [path], (flip_x, flip_y))
+        return tuple(image['size'].tolist()), image['pixels']
+
+    # Method to create a 2D texture from RGB pixels (named in the startup trace)
+    def create_texture(self, size, data, name='texture'):
+        trace = get_startup_trace(self.ctx)
+        with trace.asset('buffer upload', name):
+            texture = self.ctx.texture(size=size, components=3, data=data)
         
         # Configure mipmaps and anisotropic filtering
         texture.filter = (mgl.LINEAR_MIPMAP_LINEAR, mgl.LINEAR)
-        texture.build_mipmaps()
+        with trace.asset('mipmaps', name):
+            texture.build_mipmaps()
         texture.anisotropy = 32.0
 
         return texture
 
     # Method to release resources for all loaded textures
     def destroy(self):
-        [tex.release() for tex in self.textures.values()]
\ No newline at end of file
+        self.residency.destroy()
+        memory = get_gpu_memory(self.ctx)
+        for tex in self.textures.values():
+            if not isinstance(tex, ResidentTexture):
+                memory.remove(tex)
+                tex.release()
\ No newline at end of file
@@ -0,0 +1,212 @@
+import numpy as np
+
+
+# Initial capacity of a TransformStore
+INITIAL_CAPACITY = 64
+
+
+# Compute model matrices for many objects at once
+def get_model_matrices(pos, rot, scale, out=None):
+
+    """
+    vectorized equivalent of BaseModel.get_model_matrix.
+    Takes (N, 3) arrays of positions, rotation angles
+    (in degrees) and scales and returns an (N, 4, 4)
+    float32 array of model matrices computed as
+    translate * rotate_z * rotate_y * rotate_x * scale.
+    Each matrix is stored column-major (like glm), so
+    the array can be written straight into an instance
+    buffer. If out is given, the matrices are written
+    into it instead of a new array.
+    """
+
+    pos = np.asarray(pos, dtype='f4').reshape(-1, 3)
+    rot = np.radians(np.asarray(rot, dtype='f4').reshape(-1, 3))
+    scale = np.asarray(scale, dtype='f4').reshape(-1, 3)
+
+    cx, cy, cz = np.cos(rot[:, 0]), np.cos(rot[:, 1]), np.cos(rot[:, 2])
+    sx, sy, sz = np.sin(rot[:, 0]), np.sin(rot[:, 1]), np.sin(rot[:, 2])
+
+    # Rotation matrix Rz * Ry * Rx, indexed [n, row, column]
+    r = np.empty((len(pos), 3, 3), dtype='f4')
+    r[:, 0, 0] = cz * cy
+    r[:, 0, 1] = cz * sy * sx - sz * cx
+    r[:, 0, 2] = cz * sy * cx + sz * sx
+    r[:, 1, 0] = sz * cy
+    r[:, 1, 1] = sz * sy * sx + cz * cx
+    r[:, 1, 2] = sz * sy * cx - cz * sx
+    r[:, 2, 0] = -sy
+    r[:, 2, 1] = cy * sx
+    r[:, 2, 2] = cy * cx
+
+    # Column-major model matrices, indexed [n, column, row]
+    m_model = np.empty((len(pos), 4, 4), dtype='f4') if out is None else out
+    m_model[:, :3, :3] = r.transpose(0, 2, 1) * scale[:, :, None]
+    m_model[:, :3, 3] = 0.0
+    m_model[:, 3, :3] = pos
+    m_model[:, 3, 3] = 1.0
+    return m_model
+
+
+# TransformStore class
+class TransformStore:
+
+    """
+    keeps the transforms of many objects as a 
+    struct of arrays instead of one Python object 
+    per transform. Here's a summary of its key 
+    features:
+
+        * Arrays: Positions, rotation angles (in degrees) 
+          and scales are (N, 3) float32 arrays, and the 
+          resulting model matrices an (N, 4, 4) float32 
+          array in column-major order, ready to be written 
+          into an instance buffer.
+
+        * Adding Transforms: add appends a single transform 
+          and add_many appends whole arrays at once. Both 
+          return the indices of the new transforms, and the 
+          arrays grow by doubling.
+
+        * Dirty Flags: Changing a transform through set_position, 
+          set_rotation or set_scale (with a single index or an 
+          array of indices) only marks it dirty.
+
+        * Parents: A transform may have a parent (the index of 
+          another transform in the store, or -1). Its local matrix 
+          is then relative to its parent's world matrix, and it is 
+          recomputed whenever its parent changes.
+
+        * Batched Update: update recomputes the local matrices of 
+          every dirty transform in one vectorized pass, then the 
+          world matrices one hierarchy level at a time, and returns 
+          the range of indices that changed, so only that part of 
+          an instance buffer needs to be uploaded.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+
+        # Number of transforms in use
+        self.count = 0
+
+        # Struct-of-arrays storage (matrices holds the world matrices)
+        self.pos = np.zeros((capacity, 3), dtype='f4')
+        self.rot = np.zeros((capacity, 3), dtype='f4')
+        self.scale = np.ones((capacity, 3), dtype='f4')
+        self.local = np.zeros((capacity, 4, 4), dtype='f4')
+        self.matrices = np.zeros((capacity, 4, 4), dtype='f4')
+        self.dirty = np.zeros(capacity, dtype=bool)
+
+        # Hierarchy: parent index (-1 for roots) and depth below the root of every transform
+        self.parent = np.full(capacity, -1, dtype='i4')
+        self.depth = np.zeros(capacity, dtype='i4')
+        self.max_depth = 0
+
+    # Number of transforms in the store
+    def __len__(self):
+        return self.count
+
+    # Method to make room for at least the given number of transforms
+    def reserve(self, capacity):
+        if capacity <= len(self.pos):
+            return
+        capacity = max(capacity, 2 * len(self.pos))
+        for name in ('pos', 'rot', 'scale', 'local', 'matrices', 'dirty', 'parent', 'depth'):
+            old = getattr(self, name)
+            fill = {'scale': 1, 'parent': -1}.get(name, 0)
+            new = np.full((capacity,) + old.shape[1:], fill, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    # Method to add a single transform and return its index
+    def add(self, pos=(0, 0, 0), rot=(0, 0, 0), scale=(1, 1, 1), parent=-1):
+        return self.add_many([pos], [rot], [scale], parent)[0]
+
+    # Method to add many transforms from (N, 3) arrays and return their indices
+    # (parent is one index or an array of indices into the store, -1 for none)
+    def add_many(self, pos, rot=(0, 0, 0), scale=(1, 1, 1), parent=-1):
+        pos = np.asarray(pos, dtype='f4').reshape(-1, 3)
+        start, end = self.count, self.count + len(pos)
+        self.reserve(end)
+        self.pos[start:end] = pos
+        self.rot[start:end] = rot
+        self.scale[start:end] = scale
+        self.parent[start:end] = parent
+        self.dirty[start:end] = True
+        self.count = end
+        self.update_depths(start, end)
+        return np.arange(start, end)
+
+    # Method to compute the depth of new transforms (parents may be among the new transforms themselves)
+    def update_depths(self, start, end):
+        parent = self.parent[start:end]
+        has_parent = parent >= 0
+        depth = np.zeros(end - start, dtype='i4')
+        for _ in range(end - start + 1):
+            self.depth[start:end] = depth
+            depth = np.where(has_parent, self.depth[np.maximum(parent, 0)] + 1, 0)
+            if np.array_equal(depth, self.depth[start:end]):
+                break
+        else:
+            raise ValueError('transform parents form a cycle')
+        self.max_depth = max(self.max_depth, int(depth.max(initial=0)))
+
+    # Methods to change transforms (index may be a single index, a slice or an array of indices)
+    def set_position(self, index, pos):
+        self.pos[index] = pos
+        self.dirty[index] = True
+
+    def set_rotation(self, index, rot):
+        self.rot[index] = rot
+        self.dirty[index] = True
+
+    def set_scale(self, index, scale):
+        self.scale[index] = scale
+        self.dirty[index] = True
+
+    # Method to recompute the model matrices of all dirty transforms (and of their children)
+    # Returns the (start, end) range of indices that changed, or None if nothing was dirty
+    def update(self):
+        count = self.count
+        flags = self.dirty[:count]
+        if not flags.any():
+            return None
+        local_dirty = np.flatnonzero(flags)
+
+        # Children of changed transforms change too, one level at a time
+        parent, depth = self.parent[:count], self.depth[:count]
+        levels = [np.flatnonzero(depth == level) for level in range(1, self.max_depth + 1)]
+        for level in levels:
+            flags[level] |= flags[parent[level]]
+        dirty = np.flatnonzero(flags)
+        start, end = int(dirty[0]), int(dirty[-1]) + 1
+
+        # Local matrices; a contiguous run of dirty transforms is updated in place through slices
+        first, last = int(local_dirty[0]), int(local_dirty[-1]) + 1
+        if last - first == len(local_dirty):
+            get_model_matrices(self.pos[first:last], self.rot[first:last], self.scale[first:last],
+                               out=self.local[first:last])
+        else:
+            self.local[local_dirty] = get_model_matrices(self.pos[local_dirty], self.rot[local_dirty],
+                                                         self.scale[local_dirty])
+
+        # World matrices: roots copy their local matrix, children multiply by their parent's world matrix
+        # (for column-major storage, parent * local is local @ parent)
+        if not self.max_depth:
+            if end - start == len(dirty):
+                self.matrices[start:end] = self.local[start:end]
+            else:
+                self.matrices[dirty] = self.local[dirty]
+        else:
+            roots = dirty[depth[dirty] == 0]
+            self.matrices[roots] = self.local[roots]
+            for level in levels:
+                level = level[flags[level]]
+                self.matrices[level] = np.matmul(self.local[level], self.matrices[parent[level]])
+
+        self.dirty[dirty] = False
+        return start, end
+
+    # Method to get the model matrices of all transforms in use
+    def get_matrices(self):
+        return self.matrices[:self.count]
@@ -1,5 +1,7 @@
 from vbo import VBO
 from shader_program import ShaderProgram
+from arena import MeshRange
+from startup import get_startup_trace
 
 # VAO class
 class VAO:
@@ -21,86 +23,142 @@ class VAO:
           a VAO. It takes a program (ShaderProgram) and a vbo (VBO) as parameters. It uses 
           the context to create a vertex array, associating it with the provided program and VBO.
 
+        * Rebuilding VAOs: A vertex array is bound to its program for 
+          life, so every VAO keeps its buffer layout (and index buffer) in vao.extra and 
+          rebuild_vao creates a copy bound to another program (used 
+          when shaders are reloaded).
+
+        * Arena Ranges: Meshes living in a MeshArena get MeshRange objects instead 
+          of their own vertex arrays: they render like vertex arrays, out of the vertex 
+          array the arena shares between all its meshes for the program.
+
+        * Depth-Only VAOs: The shadow_* VAOs are created with get_depth_vao, which 
+          draws from the mesh's position-only stream (12 bytes a vertex) when it has one.
+
+        * Instanced VAOs: The get_instanced_vaos method pairs a mesh's VBO with an instance 
+          buffer of model matrices, for the main ('instanced') and shadow ('shadow_instanced') 
+          programs.
+
         * Destroy Method: The destroy method is responsible for releasing resources associated with 
           the VAO object. It calls the destroy methods of the VBO and ShaderProgram objects, ensuring 
           that allocated OpenGL resources are properly released.
     """
 
-    def __init__(self, ctx):
+    def __init__(self, ctx, defines=None):
 
-        # Reference to the context, VBO, and ShaderProgram
+        # Reference to the context, VBO, and ShaderProgram (the default programs compiled with defines)
         self.ctx = ctx
-        self.vbo = VBO(ctx)
-        self.program = ShaderProgram(ctx)
+        with get_startup_trace(ctx).phase('vbo'):
+            self.vbo = VBO(ctx)
+        with get_startup_trace(ctx).phase('shaders'):
+            self.program = ShaderProgram(ctx, defines)
         self.vaos = {}
 
         # Create and store VAOs for different objects with associated programs and VBOs
 
         self.vaos['cube'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['cube'])
-        self.vaos['shadow_cube'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['cube'])
+        self.vaos['shadow_cube'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['cube'])
 
         self.vaos['skybox'] = self.get_vao(program=self.program.programs['skybox'], vbo=self.vbo.vbos['skybox'])
         self.vaos['advanced_skybox'] = self.get_vao(program=self.program.programs['advanced_skybox'], vbo=self.vbo.vbos['advanced_skybox'])
+        self.vaos['upscale'] = self.get_vao(program=self.program.programs['upscale'], vbo=self.vbo.vbos['advanced_skybox'])
 
         self.vaos['plane'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['plane'])
-        self.vaos['shadow_plane'] = self.get_vao(program=self.program.programs['shadow_map'],vbo=self.vbo.vbos['plane'])
+        self.vaos['shadow_plane'] = self.get_depth_vao(program=self.program.programs['shadow_map'],vbo=self.vbo.vbos['plane'])
 
         self.vaos['grasspatch'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['grasspatch'])
-        self.vaos['shadow_grasspatch'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['grasspatch'])
+        self.vaos['shadow_grasspatch'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['grasspatch'])
 
         self.vaos['tent'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['tent'])
-        self.vaos['shadow_tent'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['tent'])
+        self.vaos['shadow_tent'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['tent'])
 
         self.vaos['grass'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['grass'])
-        self.vaos['shadow_grass'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['grass'])
+        self.vaos['shadow_grass'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['grass'])
 
         self.vaos['militaryvehicle'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['militaryvehicle'])
-        self.vaos['shadow_militaryvehicle'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['militaryvehicle'])
+        self.vaos['shadow_militaryvehicle'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['militaryvehicle'])
 
         self.vaos['tree'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['tree'])
-        self.vaos['shadow_tree'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['tree'])
+        self.vaos['shadow_tree'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['tree'])
 
         self.vaos['treetop'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['treetop'])
-        self.vaos['shadow_treetop'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['treetop'])
+        self.vaos['shadow_treetop'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['treetop'])
 
         self.vaos['cactus'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['cactus'])
-        self.vaos['shadow_cactus'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['cactus'])
+        self.vaos['shadow_cactus'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['cactus'])
 
         self.vaos['treetrunk'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['treetrunk'])
-        self.vaos['shadow_treetrunk'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['treetrunk'])
+        self.vaos['shadow_treetrunk'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['treetrunk'])
 
         self.vaos['smallrock'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['smallrock'])
-        self.vaos['shadow_smallrock'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['smallrock'])
+        self.vaos['shadow_smallrock'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['smallrock'])
 
         self.vaos['stone_a'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['stone_a'])
-        self.vaos['shadow_stone_a'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['stone_a'])
+        self.vaos['shadow_stone_a'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['stone_a'])
 
         self.vaos['stone_b'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['stone_b'])
-        self.vaos['shadow_stone_b'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['stone_b'])
+        self.vaos['shadow_stone_b'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['stone_b'])
 
         self.vaos['stone_c'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['stone_c'])
-        self.vaos['shadow_stone_c'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['stone_c'])
+        self.vaos['shadow_stone_c'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['stone_c'])
 
         self.vaos['camel'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['camel'])
-        self.vaos['shadow_camel'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['camel'])
+        self.vaos['shadow_camel'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['camel'])
 
         self.vaos['pyramid'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['pyramid'])
-        self.vaos['shadow_pyramid'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['pyramid'])
+        self.vaos['shadow_pyramid'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['pyramid'])
 
         self.vaos['plane_dirt'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['plane_dirt'])
-        self.vaos['shadow_plane_dirt'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['plane_dirt'])
+        self.vaos['shadow_plane_dirt'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['plane_dirt'])
 
         self.vaos['plane_grass'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['plane_grass'])
-        self.vaos['shadow_plane_grass'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['plane_grass'])
+        self.vaos['shadow_plane_grass'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['plane_grass'])
 
         self.vaos['plane_sand'] = self.get_vao(program=self.program.programs['default'], vbo=self.vbo.vbos['plane_sand'])
-        self.vaos['shadow_plane_sand'] = self.get_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['plane_sand'])
+        self.vaos['shadow_plane_sand'] = self.get_depth_vao(program=self.program.programs['shadow_map'], vbo=self.vbo.vbos['plane_sand'])
 
-    # Method to create and configure a VAO
+    # Method to create and configure a VAO (a range of the arena for meshes moved into one)
     def get_vao(self, program, vbo):
-        vao = self.ctx.vertex_array(program, [(vbo.vbo, vbo.format, *vbo.attribs)], skip_errors=True)
+        if vbo.arena is not None:
+            return vbo.arena.get_range(vbo.name, program)
+        return self.get_vertex_array(program, [(vbo.vbo, vbo.format, *vbo.attribs)], vbo.ibo)
+
+    # Method to create a vertex array (its buffer layout is kept in vao.extra, so it can be rebuilt)
+    def get_vertex_array(self, program, buffers, index_buffer=None, index_element_size=4):
+        vao = self.ctx.vertex_array(program, buffers, index_buffer, index_element_size, skip_errors=True)
+        vao.extra = (buffers, index_buffer, index_element_size)
         return vao
 
+    # Method to create a VAO for a depth-only program (from the mesh's position-only stream, if it has one),
+    # with an instance buffer of model matrices if given
+    def get_depth_vao(self, program, vbo, instance_buffer=None):
+        if vbo.position_arena is not None:
+            return vbo.position_arena.get_range(f'{vbo.name} positions', program, instance_buffer)
+        if vbo.arena is not None:
+            return vbo.arena.get_range(vbo.name, program, instance_buffer)
+        buffers = [(vbo.vbo, vbo.format, *vbo.attribs)]
+        if instance_buffer is not None:
+            buffers.append((instance_buffer, '16f/i', 'in_instance_model'))
+        return self.get_vertex_array(program, buffers, vbo.ibo)
+
+    # Method to create a copy of a vertex array (or arena range) bound to another program
+    def rebuild_vao(self, vao, program):
+        if isinstance(vao, MeshRange):
+            return vao.arena.get_range(vao.name, program, vao.instance_buffer)
+        return self.get_vertex_array(program, *vao.extra)
+
+    # Method to create the instanced main and shadow VAOs of a mesh for an instance buffer of model matrices
+    # (the shadow VAO reads a buffer of its own, if given)
+    def get_instanced_vaos(self, vbo_name, instance_buffer, shadow_instance_buffer=None):
+        vbo = self.vbo.vbos[vbo_name]
+        shadow_vao = self.get_depth_vao(self.program.programs['shadow_instanced'], vbo,
+                                        shadow_instance_buffer or instance_buffer)
+        if vbo.arena is not None:
+            return vbo.arena.get_range(vbo.name, self.program.programs['instanced'], instance_buffer), shadow_vao
+        buffers = [(vbo.vbo, vbo.format, *vbo.attribs), (instance_buffer, '16f/i', 'in_instance_model')]
+        vao = self.get_vertex_array(self.program.programs['instanced'], buffers, vbo.ibo)
+        return vao, shadow_vao
+
     # Method to release resources for the VAO, associated VBO, and ShaderProgram
     def destroy(self):
         self.vbo.destroy()
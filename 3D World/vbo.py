@@ -1,6 +1,16 @@
+import hashlib
+import inspect
 import numpy as np
 import moderngl as mgl
 import pywavefront
+from bvh import BVH, MeshBVH
+from arena import MeshArena
+from startup import get_startup_trace, get_warm_cache
+from mesh_optimizer import CACHE_SIZE, optimize_mesh, get_report, print_reports
+
+# Vertex layout of the position-only streams (and the meshes holding only positions)
+POSITION_FORMAT = '3f'
+POSITION_ATTRIBS = ['in_position']
 
 # VBO class
 class VBO:
@@ -23,6 +33,22 @@ class VBO:
         and an advanced skybox ('advanced_skybox'). Each VBO is 
         an instance of a specific VBO class.
 
+        * Mesh Arenas: Once loaded, the meshes are moved 
+        into a MeshArena per vertex format (arena.py): one 
+        vertex buffer they are sub-allocated from, drawn by 
+        their first vertex and vertex count (self.arenas).
+
+        * Position Streams: Every mesh with more than 
+        positions also gets a tightly packed copy of just 
+        its positions (12 bytes a vertex instead of 32) in 
+        the '3f' arena. The shadow pass draws from it, so 
+        it fetches less than half the vertex data.
+
+        * Mesh Optimization: Every mesh is drawn through 
+        indices ordered by mesh_optimizer.py. 
+        print_optimization_report prints each mesh's 
+        vertex cache miss ratio (ACMR) before and after.
+
         * Destroy Method: The destroy method is responsible for 
         releasing resources associated with all loaded VBOs. It 
         iterates over the VBOs in the dictionary and calls the 
@@ -55,9 +81,32 @@ class VBO:
         self.vbos['plane_dirt'] = Plane_DirtVBO(ctx)
         self.vbos['plane_sand'] = Plane_SandVBO(ctx)
 
+        # Move the meshes into one arena per vertex format (sized to hold them all), and give every mesh
+        # with more than positions a position-only stream in the positions' arena, for the depth-only passes
+        layouts = {POSITION_FORMAT: (POSITION_ATTRIBS, 12)}
+        capacities = dict.fromkeys([POSITION_FORMAT], 0)
+        index_capacities = dict.fromkeys([POSITION_FORMAT], 0)
+        for vbo in self.vbos.values():
+            layouts.setdefault(vbo.format, (vbo.attribs, vbo.components * 4))
+            capacities[vbo.format] = capacities.get(vbo.format, 0) + vbo.vertex_count
+            index_capacities[vbo.format] = index_capacities.get(vbo.format, 0) + vbo.index_count
+            if vbo.format != POSITION_FORMAT:
+                capacities[POSITION_FORMAT] += vbo.vertex_count
+                index_capacities[POSITION_FORMAT] += vbo.index_count
+        self.arenas = {format: MeshArena(ctx, format, *layouts[format], capacity, index_capacities[format])
+                       for format, capacity in capacities.items()}
+        for name, vbo in self.vbos.items():
+            positions = self.arenas[POSITION_FORMAT] if vbo.format != POSITION_FORMAT else None
+            vbo.move_to_arena(self.arenas[vbo.format], name, positions)
+
+    # Method to print the vertex cache miss ratio (ACMR) of every mesh before and after its optimization
+    def print_optimization_report(self):
+        print_reports({name: vbo.optimization for name, vbo in self.vbos.items()})
+
     # Method to release resources for all loaded VBOs
     def destroy(self):
         [vbo.destroy() for vbo in self.vbos.values()]
+        [arena.destroy() for arena in self.arenas.values()]
 
 # BaseVBO class
 class BaseVBO:
@@ -88,15 +137,65 @@ class BaseVBO:
         a VBO using the vertex data obtained from 
         the get_vertex_data method.
 
+        * Bounds: While creating the VBO, the 
+        axis-aligned bounding box of the vertex 
+        positions is stored in self.bounds as a 
+        (min, max) pair of arrays, used for culling.
+
+        * Mesh Optimization: optimize turns the 
+        triangle list into deduplicated vertices and 
+        indices (self.indices, uploaded to self.ibo), 
+        with the triangles reordered for the GPU's 
+        post-transform vertex cache (Tipsify), their 
+        clusters sorted to reduce overdraw, and the 
+        vertices renumbered in the order they are 
+        fetched. Its ACMR before and after is kept in 
+        self.optimization, and the result in the 
+        warm-start cache (keyed by the vertex data 
+        and mesh_optimizer.py).
+
+        * Triangle BVH: get_bvh builds a MeshBVH 
+        from the vertex positions read back from 
+        the VBO the first time a ray is cast at 
+        the mesh, and keeps it with the VBO, so 
+        every object using the mesh shares it.
+
+        * Warm Start: load_obj parses an .obj file 
+        into a float32 array, which is kept in the 
+        warm-start cache (startup.py) with the BVH 
+        built for the mesh, so the next launch reads 
+        both back instead of parsing and building them.
+
+        * Arena: move_to_arena copies the vertices 
+        and indices into a shared MeshArena and releases 
+        the VBO's own buffers (self.vbo becomes None). 
+        read gets the vertex data of every triangle 
+        corner back from wherever it lives. 
+        Given a position arena, it also stores a copy 
+        of only the positions there (position_arena), 
+        for the passes that need nothing else.
+
         * Resource Release: The destroy method 
         releases resources associated with the 
         VBO. It calls the release method on the 
-        VBO, freeing up OpenGL resources.
+        VBO, freeing up OpenGL resources (or frees 
+        its range of the arena).
     """
 
+    # Number of floats per vertex (positions are always the last three)
+    components = 8
+
     def __init__(self, ctx):
         # Reference to the context, VBO, and attributes for vertex format
         self.ctx = ctx
+        self.bounds = None
+        self.bvh = None
+        self.arena = None
+        self.name = None
+        self.position_arena = None
+        self.indices = None
+        self.ibo = None
+        self.optimization = None
         self.vbo = self.get_vbo()
         self.format: str = None
         self.attribs: list = None
@@ -104,15 +203,108 @@ class BaseVBO:
     # Abstract method to get vertex data (to be implemented in derived classes)
     def get_vertex_data(self): ...
 
-    # Method to create and configure a VBO using vertex data
+    # Method to load the vertex data of a Wavefront .obj file, or read it from the warm-start cache
+    # (keyed by the .obj and .mtl files) when an earlier launch parsed the same file
+    def load_obj(self, path):
+        trace = get_startup_trace(self.ctx)
+
+        def parse():
+            with trace.asset('obj parse', path):
+                objs = pywavefront.Wavefront(path, cache=True, parse=True)
+                vertex_data = objs.materials.popitem()[1].vertices
+            with trace.asset('numpy', path):
+                return {'vertex_data': np.array(vertex_data, dtype='f4')}
+
+        sources = [path, path[:-len('.obj')] + '.mtl']
+        return get_warm_cache(self.ctx).get('mesh', path, parse, sources)['vertex_data']
+
+    # Method to create and configure a VBO using vertex data (optimized, with its index buffer in self.ibo)
     def get_vbo(self):
         vertex_data = self.get_vertex_data()
-        vbo = self.ctx.buffer(vertex_data)
+        self.bounds = self.get_bounds(vertex_data)
+        vertex_data, self.indices = self.optimize(vertex_data)
+        with get_startup_trace(self.ctx).asset('buffer upload', type(self).__name__):
+            vbo = self.ctx.buffer(vertex_data)
+            self.ibo = self.ctx.buffer(self.indices)
         return vbo
 
+    # Method to turn a triangle list into deduplicated vertices and indices ordered for the vertex cache,
+    # overdraw and vertex fetch, or read them from the warm-start cache (keyed by the vertex data and the
+    # optimizer's source)
+    # Returns the vertices and indices
+    def optimize(self, vertex_data):
+        vertex_data = np.ascontiguousarray(vertex_data, dtype='f4')
+        name = type(self).__name__
+
+        def build():
+            with get_startup_trace(self.ctx).asset('mesh optimize', name):
+                vertices, indices, report = optimize_mesh(vertex_data, self.components)
+            return {'vertices': vertices, 'indices': indices, 'report': report}
+
+        sources = [inspect.getsourcefile(optimize_mesh)]
+        params = (hashlib.sha1(vertex_data).hexdigest(), CACHE_SIZE)
+        arrays = get_warm_cache(self.ctx).get('optimized', name, build, sources, params)
+        self.optimization = get_report(arrays['report'])
+        return arrays['vertices'], arrays['indices']
+
+    # Method to compute the axis-aligned bounds (min, max) of the vertex positions
+    def get_bounds(self, vertex_data):
+        positions = np.asarray(vertex_data, dtype='f4').reshape(-1, self.components)[:, -3:]
+        return positions.min(axis=0), positions.max(axis=0)
+
+    # Number of indices (three per triangle)
+    @property
+    def index_count(self):
+        return len(self.indices)
+
+    # Number of (deduplicated) vertices
+    @property
+    def vertex_count(self):
+        return (self.vbo.size if self.arena is None else self.arena.ranges[self.name][1] * self.arena.stride) \
+            // (self.components * 4)
+
+    # Method to move the vertex data and indices into an arena (under a name) and release the VBO's own buffers
+    # With a position arena, a position-only copy of the vertices goes there too (as '<name> positions',
+    # drawn with the same indices)
+    def move_to_arena(self, arena, name, position_arena=None):
+        vertex_data = self.vbo.read()
+        arena.allocate(name, vertex_data, self.indices)
+        if position_arena is not None:
+            positions = np.frombuffer(vertex_data, dtype='f4').reshape(-1, self.components)[:, -3:]
+            position_arena.allocate(f'{name} positions', np.ascontiguousarray(positions), self.indices)
+            self.position_arena = position_arena
+        self.vbo.release()
+        self.ibo.release()
+        self.vbo = self.ibo = None
+        self.arena, self.name = arena, name
+
+    # Method to read back the vertex data of every triangle corner, in drawing order (from the VBO or the arena)
+    def read(self):
+        vertex_data = self.vbo.read() if self.arena is None else self.arena.read(self.name)
+        return np.frombuffer(vertex_data, dtype='f4').reshape(-1, self.components)[self.indices].tobytes()
+
+    # Method to get the BVH of the mesh's triangles (built on first use, or read from the warm-start cache,
+    # keyed by the vertex data it was built from and the BVH builder's source)
+    def get_bvh(self):
+        if self.bvh is None:
+            vertex_data = self.read()
+            positions = np.frombuffer(vertex_data, dtype='f4').reshape(-1, self.components)[:, -3:]
+            sources = [inspect.getsourcefile(BVH)]
+            params = (hashlib.sha1(vertex_data).hexdigest(),)
+            arrays = get_warm_cache(self.ctx).get('bvh', type(self).__name__,
+                                                  lambda: MeshBVH.build_bvh(positions).get_arrays(), sources, params)
+            self.bvh = MeshBVH(positions, BVH.from_arrays(**arrays))
+        return self.bvh
+
     # Method to release resources for the VBO
     def destroy(self):
+        if self.position_arena is not None:
+            self.position_arena.release(f'{self.name} positions')
+        if self.arena is not None:
+            self.arena.release(self.name)
+            return
         self.vbo.release()
+        self.ibo.release()
 
 # Define a class named CactusVBO that inherits from BaseVBO
 class CactusVBO(BaseVBO):
@@ -129,18 +321,8 @@ class CactusVBO(BaseVBO):
 
     # Method to retrieve vertex data for the plane from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/cactus.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/cactus.obj')
 
 # Define a class named CamelVBO that inherits from BaseVBO
 class CamelVBO(BaseVBO):
@@ -157,18 +339,8 @@ class CamelVBO(BaseVBO):
 
     # Method to retrieve vertex data for the plane from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/camel.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/camel.obj')
 
 # Define a class named GrassVBO that inherits from BaseVBO
 class GrassVBO(BaseVBO):
@@ -185,18 +357,8 @@ class GrassVBO(BaseVBO):
 
     # Method to retrieve vertex data for the plane from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/grass.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/grass.obj')
 
 # Define a class named GrassPatchVBO that inherits from BaseVBO
 class GrassPatchVBO(BaseVBO):
@@ -213,18 +375,8 @@ class GrassPatchVBO(BaseVBO):
 
     # Method to retrieve vertex data for the grasspatch from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the grasspatch and parse its contents
-        objs = pywavefront.Wavefront('objects/grasspatch.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the grasspatch (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/grasspatch.obj')
 
 # Define a class named TentVBO that inherits from BaseVBO
 class MilitaryVehicleVBO(BaseVBO):
@@ -241,18 +393,8 @@ class MilitaryVehicleVBO(BaseVBO):
 
     # Method to retrieve vertex data for the militaryvehicle from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the grasspatch and parse its contents
-        objs = pywavefront.Wavefront('objects/militaryvehicle.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the grasspatch (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/militaryvehicle.obj')
 
 # Define a class named PlaneVBO that inherits from BaseVBO
 class PlaneVBO(BaseVBO):
@@ -269,18 +411,8 @@ class PlaneVBO(BaseVBO):
 
     # Method to retrieve vertex data for the plane from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/plane.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/plane.obj')
 
 # Define a class named Plane_GrassVBO that inherits from BaseVBO
 class Plane_GrassVBO(BaseVBO):
@@ -297,18 +429,8 @@ class Plane_GrassVBO(BaseVBO):
 
     # Method to retrieve vertex data for the plane from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/plane_grass.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/plane_grass.obj')
 
 # Define a class named Plane_SandVBO that inherits from BaseVBO
 class Plane_SandVBO(BaseVBO):
@@ -325,18 +447,8 @@ class Plane_SandVBO(BaseVBO):
 
     # Method to retrieve vertex data for the plane from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/plane_sand.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/plane_sand.obj')
 
 # Define a class named Plane_DirtVBO that inherits from BaseVBO
 class Plane_DirtVBO(BaseVBO):
@@ -353,18 +465,8 @@ class Plane_DirtVBO(BaseVBO):
 
     # Method to retrieve vertex data for the plane from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/plane_dirt.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/plane_dirt.obj')
 
 # Define a class named PyramidVBO that inherits from BaseVBO
 class PyramidVBO(BaseVBO):
@@ -381,18 +483,8 @@ class PyramidVBO(BaseVBO):
 
     # Method to retrieve vertex data for the plane from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/pyramid.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/pyramid.obj')
 
 # Define a class named SmallRockVBO that inherits from BaseVBO
 class SmallRockVBO(BaseVBO):
@@ -409,18 +501,8 @@ class SmallRockVBO(BaseVBO):
 
     # Method to retrieve vertex data for the plane from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/smallrock.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/smallrock.obj')
 
 # Define a class named Stone_A_VBO that inherits from BaseVBO
 class Stone_A_VBO(BaseVBO):
@@ -437,18 +519,8 @@ class Stone_A_VBO(BaseVBO):
 
     # Method to retrieve vertex data for stone_a from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/stone_a.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/stone_a.obj')
 
 # Define a class named Stone_B_VBO that inherits from BaseVBO
 class Stone_B_VBO(BaseVBO):
@@ -465,18 +537,8 @@ class Stone_B_VBO(BaseVBO):
 
     # Method to retrieve vertex data for stone_a from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/stone_b.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/stone_b.obj')
 
 # Define a class named Stone_C_VBO that inherits from BaseVBO
 class Stone_C_VBO(BaseVBO):
@@ -493,18 +555,8 @@ class Stone_C_VBO(BaseVBO):
 
     # Method to retrieve vertex data for stone_a from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/stone_c.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/stone_c.obj')
 
 # Define a class named TentVBO that inherits from BaseVBO
 class TentVBO(BaseVBO):
@@ -521,18 +573,8 @@ class TentVBO(BaseVBO):
 
     # Method to retrieve vertex data for the grasspatch from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the grasspatch and parse its contents
-        objs = pywavefront.Wavefront('objects/tent.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the grasspatch (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/tent.obj')
 
 # Define a class named TreeVBO that inherits from BaseVBO
 class TreeVBO(BaseVBO):
@@ -549,18 +591,8 @@ class TreeVBO(BaseVBO):
 
     # Method to retrieve vertex data for the tree from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the tree and parse its contents
-        objs = pywavefront.Wavefront('objects/tree.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the tree (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/tree.obj')
 
 # Define a class named TreeTopVBO that inherits from BaseVBO
 class TreeTopVBO(BaseVBO):
@@ -577,18 +609,8 @@ class TreeTopVBO(BaseVBO):
 
     # Method to retrieve vertex data for the tree from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the tree and parse its contents
-        objs = pywavefront.Wavefront('objects/treetop.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the tree (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/treetop.obj')
 
 # Define a class named TreeTrunkVBO that inherits from BaseVBO
 class TreeTrunkVBO(BaseVBO):
@@ -605,18 +627,8 @@ class TreeTrunkVBO(BaseVBO):
 
     # Method to retrieve vertex data for the TreeTrunk from an external Wavefront .obj file
     def get_vertex_data(self):
-        # Load the Wavefront .obj file representing the plane and parse its contents
-        objs = pywavefront.Wavefront('objects/treetrunk.obj', cache=True, parse=True)
-        
-        # Extract the vertex data from the parsed object's materials
-        obj = objs.materials.popitem()[1]
-        vertex_data = obj.vertices
-        
-        # Convert the vertex data to a NumPy array with float32 data type
-        vertex_data = np.array(vertex_data, dtype='f4')
-        
-        # Return the processed vertex data
-        return vertex_data
+        # Load the Wavefront .obj file representing the plane (parsed, or read from the warm-start cache)
+        return self.load_obj('objects/treetrunk.obj')
 
 
 # CubeVBO class, derived from BaseVBO
@@ -756,6 +768,9 @@ class SkyBoxVBO(BaseVBO):
         graphics library.
     """
 
+    # Vertices only hold a position
+    components = 3
+
     # Constructor for SkyBoxVBO class, derived from BaseVBO
     def __init__(self, ctx):
 
@@ -824,6 +839,9 @@ class AdvancedSkyBoxVBO(BaseVBO):
         array is returned as the final vertex data.
     """
 
+    # Vertices only hold a position
+    components = 3
+
     # Constructor for AdvancedSkyBoxVBO class, derived from BaseVBO
     def __init__(self, ctx):
         # Call the constructor of the base class (BaseVBO)